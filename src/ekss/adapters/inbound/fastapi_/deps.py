@@ -15,10 +15,28 @@
 
 """FastAPI dependencies (used with the `Depends` feature)"""
 
-from fastapi import Depends
+from concurrent.futures import ThreadPoolExecutor
 
-from ekss.adapters.outbound.vault import VaultAdapter
-from ekss.config import CONFIG, VaultConfig
+from fastapi import Depends, Request
+
+from ekss.adapters.outbound.derived import DerivedSecretStore
+from ekss.adapters.outbound.secret_store import (
+    CachingSecretStore,
+    CoalescingSecretStore,
+    SyncStoreBridge,
+)
+from ekss.adapters.outbound.sqlite import SQLiteSecretStore
+from ekss.adapters.outbound.vault import (
+    AsyncVaultAdapter,
+    TransitVaultAdapter,
+    VaultAdapter,
+)
+from ekss.adapters.outbound.wrapped import WrappedSecretStore
+from ekss.config import CONFIG, Config, SecretStoreConfig
+from ekss.core.crypto import CryptoExecutor
+from ekss.core.envelope_cache import EnvelopeCache
+from ekss.offload import BoundedExecutor
+from ekss.ports.outbound.secret_store import SecretStore, SyncSecretStore
 
 
 def config_injector():
@@ -26,6 +44,105 @@ def config_injector():
     return CONFIG
 
 
-def get_vault(config: VaultConfig = Depends(config_injector)) -> VaultAdapter:
-    """Get VaultAdapter for config"""
-    return VaultAdapter(config=config)
+def create_vault(config: SecretStoreConfig) -> SecretStore:
+    """Create the secret store and vault adapter selected in the config"""
+    vault: SecretStore
+    if config.storage_backend == "vault" and config.vault_client == "async":
+        vault = AsyncVaultAdapter(config=config)
+    else:
+        executor = None
+        if config.vault_offload_threads:
+            executor = BoundedExecutor(
+                ThreadPoolExecutor(
+                    max_workers=config.vault_offload_threads,
+                    thread_name_prefix="vault",
+                ),
+                workers=config.vault_offload_threads,
+                max_queue_depth=config.vault_offload_max_queue,
+            )
+        store: SyncSecretStore
+        if config.storage_backend == "sqlite":
+            store = SQLiteSecretStore(config=config)
+        elif config.storage_backend == "wrapped":
+            store = WrappedSecretStore(config=config)
+        elif config.storage_backend == "transit":
+            store = TransitVaultAdapter(config=config)
+        elif config.storage_backend == "derived":
+            store = DerivedSecretStore(config=config)
+        else:
+            store = VaultAdapter(config=config)
+        vault = SyncStoreBridge(store, executor=executor)
+
+    if config.vault_coalesce_reads:
+        vault = CoalescingSecretStore(vault)
+    if config.vault_secret_cache_size:
+        vault = CachingSecretStore(
+            vault,
+            max_entries=config.vault_secret_cache_size,
+            ttl=config.vault_secret_cache_ttl,
+        )
+    return vault
+
+
+async def get_vault(
+    request: Request, config: SecretStoreConfig = Depends(config_injector)
+) -> SecretStore:
+    """
+    Get the long-lived vault adapter of this worker.
+
+    The adapter is created on startup and shared by all requests, so that pooled
+    connections and the vault login are reused. It is only replaced if the injected
+    config changes, e.g. when the config is overridden in tests.
+    """
+    state = request.app.state
+    vault = getattr(state, "vault", None)
+    if vault is None or state.vault_config != config:
+        if vault is not None:
+            await vault.close()
+        state.vault = vault = create_vault(config)
+        state.vault_config = config
+    return vault
+
+
+def create_crypto(config: Config) -> CryptoExecutor:
+    """Create the executor for envelope cryptography selected in the config"""
+    return CryptoExecutor(config)
+
+
+def get_crypto(request: Request) -> CryptoExecutor:
+    """
+    Get the executor for envelope cryptography of this worker.
+
+    It is created on startup from the config the app was set up with, or on first use
+    if the app is used without running its lifespan.
+    """
+    state = request.app.state
+    crypto = getattr(state, "crypto", None)
+    if crypto is None:
+        state.crypto = crypto = create_crypto(state.config)
+    return crypto
+
+
+def create_envelope_cache(config: Config) -> EnvelopeCache:
+    """Create the envelope cache configured in the config"""
+    return EnvelopeCache(
+        max_entries=config.crypto_envelope_cache_size,
+        ttl=config.crypto_envelope_cache_ttl,
+    )
+
+
+def get_envelope_cache(request: Request) -> EnvelopeCache:
+    """
+    Get the envelope cache of this worker, created on startup or on first use if the
+    app is used without running its lifespan
+    """
+    state = request.app.state
+    envelope_cache = getattr(state, "envelope_cache", None)
+    if envelope_cache is None:
+        state.envelope_cache = envelope_cache = create_envelope_cache(state.config)
+    return envelope_cache
+
+
+def get_internal_recipients(request: Request) -> list[bytes]:
+    """Get the public keys of internal recipients the app was set up with"""
+    return request.app.state.internal_recipients
@@ -101,3 +101,54 @@ class HttpSecretNotFoundError(HttpCustomExceptionBase):
             description="The secret for the given id was not found.",
             data={},
         )
+
+
+class HttpVaultOverloadedError(HttpCustomExceptionBase):
+    """Thrown when too many requests to the vault are already waiting"""
+
+    exception_id = "vaultOverloadedError"
+
+    class DataModel(BaseModel):
+        """Model for exception data"""
+
+    def __init__(self, *, status_code: int = 503):
+        """Construct message and init the exception."""
+        super().__init__(
+            status_code=status_code,
+            description="Too many requests to the vault are pending, try again later.",
+            data={},
+        )
+
+
+class HttpInvalidPublicKeyError(HttpCustomExceptionBase):
+    """Thrown when the given public key is not a valid Crypt4GH public key"""
+
+    exception_id = "invalidPublicKeyError"
+
+    class DataModel(BaseModel):
+        """Model for exception data"""
+
+    def __init__(self, *, status_code: int = 400):
+        """Construct message and init the exception."""
+        super().__init__(
+            status_code=status_code,
+            description="The given public key is invalid.",
+            data={},
+        )
+
+
+class HttpCryptoOverloadedError(HttpCustomExceptionBase):
+    """Thrown when too many envelope operations are already waiting for a worker"""
+
+    exception_id = "cryptoOverloadedError"
+
+    class DataModel(BaseModel):
+        """Model for exception data"""
+
+    def __init__(self, *, status_code: int = 503):
+        """Construct message and init the exception."""
+        super().__init__(
+            status_code=status_code,
+            description="Too many envelope operations are pending, try again later.",
+            data={},
+        )
@@ -19,16 +19,41 @@ Additional endpoints might be structured in dedicated modules
 (each of them having a sub-router).
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from ghga_service_commons.api import ApiConfigBase, configure_app
+from ghga_service_commons.api import configure_app
 
 from ekss.adapters.inbound.fastapi_.custom_openapi import get_openapi_schema
+from ekss.adapters.inbound.fastapi_.deps import (
+    create_crypto,
+    create_envelope_cache,
+    create_vault,
+)
 from ekss.adapters.inbound.fastapi_.router import router
+from ekss.config import Config
+from ekss.core.keyring import decode_public_keys
 
 
-def setup_app(config: ApiConfigBase):
+def setup_app(config: Config):
     """Configure and return app"""
-    app = FastAPI()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Share one pooled vault adapter, crypto executor and envelope cache per worker"""
+        app.state.vault = create_vault(config)
+        app.state.vault_config = config
+        app.state.crypto = create_crypto(config)
+        app.state.envelope_cache = create_envelope_cache(config)
+        yield
+        await app.state.vault.close()
+        app.state.crypto.shutdown()
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.config = config
+    app.state.internal_recipients = decode_public_keys(
+        config.internal_recipient_public_keys
+    )
     configure_app(app, config=config)
 
     app.include_router(router)
@@ -15,14 +15,47 @@
 
 """Defines dataclasses for holding business-logic data"""
 
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+MAX_BATCH_SIZE = 1000
+MAX_RECIPIENTS = 100
 
 
 class InboundEnvelopeQuery(BaseModel):
-    """Request object containing first file part and a public key."""
+    """
+    Request object containing first file part and a public key.
+    Only the Crypt4GH header at the start of the file part is needed.
+    Envelopes of the new secret are created for the optional recipient public keys.
+    """
 
     file_part: str
     public_key: str
+    recipient_public_keys: list[str] = Field(default=[], max_length=MAX_RECIPIENTS)
+
+
+class HeaderLengthQuery(BaseModel):
+    """Request object containing the first bytes of a Crypt4GH file."""
+
+    file_start: str
+
+
+class HeaderLength(BaseModel):
+    """
+    Contains the length of the Crypt4GH header, if complete is true. Otherwise, the
+    number of leading bytes needed to determine it.
+    """
+
+    length: int
+    complete: bool
+
+
+class RecipientEnvelope(BaseModel):
+    """Contains the header envelope for one of several requested public keys"""
+
+    public_key: str
+    content: str
 
 
 class InboundEnvelopeContent(BaseModel):
@@ -30,12 +63,42 @@ class InboundEnvelopeContent(BaseModel):
     Contains file encryption/decryption secret extracted from file envelope, the ID
     generated for this secret and the file content offset, i.e. the location of the
     encrypted file content within the file.
+    Contains envelopes of the new secret for the requested recipient public keys.
     """
 
     submitter_secret: str
     new_secret: str
     secret_id: str
     offset: int
+    envelopes: list[RecipientEnvelope] = []
+
+
+class BatchInboundEnvelopeQuery(BaseModel):
+    """Request object containing many first file parts, each with a public key."""
+
+    items: list[InboundEnvelopeQuery] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_SIZE
+    )
+
+
+class BatchInboundEnvelopeItem(BaseModel):
+    """
+    Contains either the InboundEnvelopeContent for one envelope or the ID of the error
+    that prevented its extraction or the storage of the new secret
+    """
+
+    submitter_secret: Optional[str] = None
+    new_secret: Optional[str] = None
+    secret_id: Optional[str] = None
+    offset: Optional[int] = None
+    envelopes: Optional[list[RecipientEnvelope]] = None
+    error: Optional[str] = None
+
+
+class BatchInboundEnvelopeContent(BaseModel):
+    """Contains one item per envelope, in the order of the request"""
+
+    results: list[BatchInboundEnvelopeItem]
 
 
 class OutboundEnvelopeContent(BaseModel):
@@ -45,3 +108,33 @@ class OutboundEnvelopeContent(BaseModel):
     """
 
     content: str
+
+
+class RecipientEnvelopeContent(BaseModel):
+    """Contains one envelope per requested public key, in the order of the request"""
+
+    envelopes: list[RecipientEnvelope]
+
+
+class BatchEnvelopeQuery(BaseModel):
+    """Request object containing the IDs of many secrets and one public key."""
+
+    secret_ids: list[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    public_key: str
+
+
+class BatchEnvelopeItem(BaseModel):
+    """
+    Contains either the header envelope for one secret or the ID of the error that
+    prevented its creation
+    """
+
+    secret_id: str
+    content: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchEnvelopeContent(BaseModel):
+    """Contains one item per requested secret, in the order of the request"""
+
+    envelopes: list[BatchEnvelopeItem]
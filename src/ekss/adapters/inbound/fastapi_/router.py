@@ -14,23 +14,52 @@
 # limitations under the License.
 """Contains routes and associated data for the upload path"""
 
+import asyncio
 import base64
-import os
+from collections.abc import Sequence
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Union
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, status
+from ghga_service_commons.httpyexpect.server import HttpCustomExceptionBase
 from requests.exceptions import RequestException
 
 from ekss.adapters.inbound.fastapi_ import exceptions, models
-from ekss.adapters.inbound.fastapi_.deps import get_vault
-from ekss.adapters.outbound.vault import VaultAdapter
-from ekss.adapters.outbound.vault.exceptions import (
+from ekss.adapters.inbound.fastapi_.deps import (
+    config_injector,
+    get_crypto,
+    get_envelope_cache,
+    get_internal_recipients,
+    get_vault,
+)
+from ekss.config import VaultConfig
+from ekss.core.crypto import CryptoExecutor
+from ekss.core.envelope_cache import EnvelopeCache
+from ekss.core.envelope_decryption import (
+    NO_SUPPORTED_METHOD,
+    extract_envelope_content,
+    extract_envelope_content_from_stream,
+    get_header_length,
+)
+from ekss.core.envelope_encryption import (
+    create_ingest_envelopes,
+    get_envelope,
+    get_envelopes,
+    get_recipient_envelopes,
+)
+from ekss.offload import ExecutorSaturatedError
+from ekss.ports.outbound.secret_store import (
     SecretInsertionError,
     SecretRetrievalError,
+    SecretStore,
+    SecretStoreError,
+    StoreConnectionError,
+    StoreOverloadedError,
 )
-from ekss.core.envelope_decryption import extract_envelope_content
-from ekss.core.envelope_encryption import get_envelope
 
 router = APIRouter(tags=["EncryptionKeyStoreService"])
+OCTET_STREAM = "application/octet-stream"
 ERROR_RESPONSES = {
     "malformedOrMissingEnvelope": {
         "description": (""),
@@ -52,9 +81,26 @@ ERROR_RESPONSES = {
         "description": (""),
         "model": exceptions.HttpSecretNotFoundError.get_body_model(),
     },
+    "vaultOverloadedError": {
+        "description": (""),
+        "model": exceptions.HttpVaultOverloadedError.get_body_model(),
+    },
+    "invalidPublicKeyError": {
+        "description": (""),
+        "model": exceptions.HttpInvalidPublicKeyError.get_body_model(),
+    },
 }
 
 
+def _batch_error_id(error: SecretStoreError) -> str:
+    """Map a store error for a single batch item to the ID of the matching HTTP error"""
+    if isinstance(error, SecretRetrievalError):
+        return exceptions.HttpSecretNotFoundError.exception_id
+    if isinstance(error, StoreOverloadedError):
+        return exceptions.HttpVaultOverloadedError.exception_id
+    return exceptions.HttpVaultConnectionError.exception_id
+
+
 @router.get(
     "/health",
     summary="health",
@@ -65,6 +111,47 @@ async def health():
     return {"status": "OK"}
 
 
+@router.get(
+    "/metrics",
+    summary="Internal metrics, e.g. for tuning pool and queue sizes",
+    operation_id="getMetrics",
+    status_code=status.HTTP_200_OK,
+    response_model=dict[str, dict[str, float]],
+)
+async def metrics(
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+    envelope_cache: EnvelopeCache = Depends(get_envelope_cache),
+):
+    """Report metrics of the components used by this worker"""
+    return {**vault.metrics(), **crypto.metrics(), **envelope_cache.metrics()}
+
+
+@router.post(
+    "/secrets/header-length",
+    summary="Determine how many leading bytes of a file make up the Crypt4GH header",
+    operation_id="getHeaderLength",
+    status_code=status.HTTP_200_OK,
+    response_model=models.HeaderLength,
+    response_description="",
+    responses={
+        status.HTTP_400_BAD_REQUEST: ERROR_RESPONSES["malformedOrMissingEnvelope"],
+    },
+)
+async def header_length(*, header_query: models.HeaderLengthQuery):
+    """
+    Report the header length of a Crypt4GH file, so that clients only need to send the
+    header to POST /secrets. If the given bytes are too few to tell, report how many
+    leading bytes are needed to make progress.
+    """
+    try:
+        file_start = base64.b64decode(header_query.file_start)
+        length = get_header_length(file_start)
+    except ValueError as error:
+        raise exceptions.HttpMalformedOrMissingEnvelopeError() from error
+    return {"length": length, "complete": length <= len(file_start)}
+
+
 @router.post(
     "/secrets",
     summary="Extract file encryption/decryption secret and file content offset from enevelope",
@@ -76,37 +163,196 @@ async def health():
         status.HTTP_400_BAD_REQUEST: ERROR_RESPONSES["malformedOrMissingEnvelope"],
         status.HTTP_403_FORBIDDEN: ERROR_RESPONSES["envelopeDecryptionError"],
         status.HTTP_502_BAD_GATEWAY: ERROR_RESPONSES["secretInsertionError"],
+        status.HTTP_503_SERVICE_UNAVAILABLE: ERROR_RESPONSES["vaultOverloadedError"],
         status.HTTP_504_GATEWAY_TIMEOUT: ERROR_RESPONSES["vaultConnectionError"],
     },
 )
 async def post_encryption_secrets(
     *,
     envelope_query: models.InboundEnvelopeQuery,
-    vault: VaultAdapter = Depends(get_vault),
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+    internal_recipients: list[bytes] = Depends(get_internal_recipients),
 ):
     """Extract file encryption/decryption secret, create secret ID and extract
     file content offset
     """
-    client_pubkey = base64.b64decode(envelope_query.public_key)
-    file_part = base64.b64decode(envelope_query.file_part)
-    try:
+    return await _ingest_envelope(
+        envelope_query=envelope_query,
+        vault=vault,
+        crypto=crypto,
+        internal_recipients=internal_recipients,
+    )
+
+
+@router.post(
+    "/secrets/stream",
+    summary="Extract file encryption/decryption secret and file content offset from"
+    + " the envelope at the start of a binary request body",
+    operation_id="postEncryptionDataStream",
+    status_code=status.HTTP_200_OK,
+    response_model=models.InboundEnvelopeContent,
+    response_description="",
+    responses={
+        status.HTTP_400_BAD_REQUEST: ERROR_RESPONSES["malformedOrMissingEnvelope"],
+        status.HTTP_403_FORBIDDEN: ERROR_RESPONSES["envelopeDecryptionError"],
+        status.HTTP_502_BAD_GATEWAY: ERROR_RESPONSES["secretInsertionError"],
+        status.HTTP_503_SERVICE_UNAVAILABLE: ERROR_RESPONSES["vaultOverloadedError"],
+        status.HTTP_504_GATEWAY_TIMEOUT: ERROR_RESPONSES["vaultConnectionError"],
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                OCTET_STREAM: {"schema": {"type": "string", "format": "binary"}}
+            },
+        }
+    },
+)
+async def post_encryption_secrets_stream(
+    *,
+    request: Request,
+    client_public_key: str = Header(
+        ..., description="Base64 encoded Crypt4GH public key of the client"
+    ),
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+    internal_recipients: list[bytes] = Depends(get_internal_recipients),
+):
+    """Like POST /secrets, but reading the envelope directly from the raw file bytes.
+    Reading stops after the header, so the rest of the file may but need not be sent.
+    """
+    with _envelope_errors():
+        submitter_secret, offset = await extract_envelope_content_from_stream(
+            chunks=request.stream(),
+            client_pubkey=base64.b64decode(client_public_key),
+            crypto=crypto,
+        )
+    return await _store_new_secret(
+        submitter_secret=submitter_secret,
+        offset=offset,
+        vault=vault,
+        crypto=crypto,
+        internal_recipients=internal_recipients,
+    )
+
+
+@router.post(
+    "/secrets/batch",
+    summary="Extract file encryption/decryption secrets and file content offsets from"
+    + " many envelopes",
+    operation_id="postEncryptionDataBatch",
+    status_code=status.HTTP_200_OK,
+    response_model=models.BatchInboundEnvelopeContent,
+    response_description="One item per envelope, containing the extracted data or an"
+    + " error ID, e.g. envelopeDecryptionError",
+)
+async def post_encryption_secrets_batch(
+    *,
+    envelope_query: models.BatchInboundEnvelopeQuery,
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+    config: VaultConfig = Depends(config_injector),
+    internal_recipients: list[bytes] = Depends(get_internal_recipients),
+):
+    """Process many envelopes like POST /secrets, reporting errors per envelope"""
+    semaphore = asyncio.Semaphore(config.vault_batch_concurrency)
+    crypto = crypto.for_batches()
+
+    async def ingest(item: models.InboundEnvelopeQuery) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                return await _ingest_envelope(
+                    envelope_query=item,
+                    vault=vault,
+                    crypto=crypto,
+                    internal_recipients=internal_recipients,
+                )
+            except HttpCustomExceptionBase as error:
+                return {"error": error.exception_id}
+
+    results = await asyncio.gather(*map(ingest, envelope_query.items))
+    return {"results": results}
+
+
+async def _ingest_envelope(
+    *,
+    envelope_query: models.InboundEnvelopeQuery,
+    vault: SecretStore,
+    crypto: CryptoExecutor,
+    internal_recipients: Sequence[bytes],
+) -> dict[str, Any]:
+    """Extract the envelope content and store a new secret, raising HTTP errors"""
+    with _envelope_errors():
+        client_pubkey = base64.b64decode(envelope_query.public_key)
+        file_part = base64.b64decode(envelope_query.file_part)
         submitter_secret, offset = await extract_envelope_content(
             file_part=file_part,
             client_pubkey=client_pubkey,
+            crypto=crypto,
         )
+    return await _store_new_secret(
+        submitter_secret=submitter_secret,
+        offset=offset,
+        vault=vault,
+        crypto=crypto,
+        internal_recipients=internal_recipients,
+        recipient_public_keys=envelope_query.recipient_public_keys,
+    )
+
+
+@contextmanager
+def _envelope_errors():
+    """Translate errors raised while parsing or decrypting an envelope"""
+    try:
+        yield
+    except ExecutorSaturatedError as error:
+        raise exceptions.HttpCryptoOverloadedError() from error
     except ValueError as error:
         # Everything in envelope decryption is a ValueError... try to distinguish based on message
-        if str(error) == "No supported encryption method":
+        if str(error) == NO_SUPPORTED_METHOD:
             raise exceptions.HttpEnvelopeDecryptionError() from error
         raise exceptions.HttpMalformedOrMissingEnvelopeError() from error
 
-    # generate a new secret for re-encryption
-    new_secret = os.urandom(32)
+
+async def _store_new_secret(  # noqa: PLR0913
+    *,
+    submitter_secret: bytes,
+    offset: int,
+    vault: SecretStore,
+    crypto: CryptoExecutor,
+    internal_recipients: Sequence[bytes],
+    recipient_public_keys: Sequence[str] = (),
+) -> dict[str, Any]:
+    """
+    Store a new secret for re-encryption along with the envelopes of the internal
+    recipients and assemble the response, including envelopes of the new secret for
+    the given recipients. Secrets derived by the vault adapter are not stored, and
+    envelopes are only created for internal recipients if the adapter stores them.
+    """
+    secret_id, new_secret = await vault.new_secret()
     try:
-        secret_id = vault.store_secret(secret=new_secret)
+        envelopes, stored_envelopes = await create_ingest_envelopes(
+            file_secret=new_secret,
+            recipient_pubkeys=[base64.b64decode(key) for key in recipient_public_keys],
+            internal_recipients=internal_recipients if vault.stores_envelopes else (),
+            crypto=crypto,
+        )
+    except ExecutorSaturatedError as error:
+        raise exceptions.HttpCryptoOverloadedError() from error
+    except ValueError as error:
+        raise exceptions.HttpInvalidPublicKeyError() from error
+
+    try:
+        if secret_id is None:
+            secret_id = await vault.store_secret(
+                secret=new_secret, envelopes=stored_envelopes
+            )
     except SecretInsertionError as error:
         raise exceptions.HttpSecretInsertionError() from error
-    except RequestException as error:
+    except StoreOverloadedError as error:
+        raise exceptions.HttpVaultOverloadedError() from error
+    except (RequestException, StoreConnectionError) as error:
         raise exceptions.HttpVaultConnectionError() from error
 
     return {
@@ -114,6 +360,10 @@ async def post_encryption_secrets(
         "new_secret": base64.b64encode(new_secret).decode("utf-8"),
         "secret_id": secret_id,
         "offset": offset,
+        "envelopes": [
+            {"public_key": key, "content": base64.b64encode(envelope).decode("utf-8")}
+            for key, envelope in zip(recipient_public_keys, envelopes)
+        ],
     }
 
 
@@ -123,29 +373,176 @@ async def post_encryption_secrets(
     operation_id="getEncryptionData",
     status_code=status.HTTP_200_OK,
     response_model=models.OutboundEnvelopeContent,
-    response_description="",
+    response_description="The envelope, as raw Crypt4GH header bytes if requested via"
+    + " the Accept header",
     responses={
+        status.HTTP_200_OK: {
+            "content": {
+                OCTET_STREAM: {"schema": {"type": "string", "format": "binary"}}
+            }
+        },
+        status.HTTP_400_BAD_REQUEST: ERROR_RESPONSES["invalidPublicKeyError"],
         status.HTTP_404_NOT_FOUND: ERROR_RESPONSES["secretNotFoundError"],
+        status.HTTP_503_SERVICE_UNAVAILABLE: ERROR_RESPONSES["vaultOverloadedError"],
+        status.HTTP_504_GATEWAY_TIMEOUT: ERROR_RESPONSES["vaultConnectionError"],
     },
 )
-async def get_header_envelope(
-    *, secret_id: str, client_pk: str, vault: VaultAdapter = Depends(get_vault)
+async def get_header_envelope(  # noqa: PLR0913
+    *,
+    secret_id: str,
+    client_pk: str,
+    request: Request,
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+    internal_recipients: list[bytes] = Depends(get_internal_recipients),
+    envelope_cache: EnvelopeCache = Depends(get_envelope_cache),
 ):
     """Create header envelope for the file secret with given ID encrypted with a given public key"""
     try:
-        header_envelope = await get_envelope(
+        client_pubkey = base64.urlsafe_b64decode(client_pk)
+        header_envelope = await envelope_cache.get_or_create(
             secret_id=secret_id,
-            client_pubkey=base64.urlsafe_b64decode(client_pk),
-            vault=vault,
+            client_pubkey=client_pubkey,
+            create=partial(
+                get_envelope,
+                secret_id=secret_id,
+                client_pubkey=client_pubkey,
+                vault=vault,
+                crypto=crypto,
+                internal_recipients=internal_recipients,
+            ),
         )
     except SecretRetrievalError as error:
         raise exceptions.HttpSecretNotFoundError() from error
+    except StoreOverloadedError as error:
+        raise exceptions.HttpVaultOverloadedError() from error
+    except StoreConnectionError as error:
+        raise exceptions.HttpVaultConnectionError() from error
+    except ExecutorSaturatedError as error:
+        raise exceptions.HttpCryptoOverloadedError() from error
+    except ValueError as error:
+        raise exceptions.HttpInvalidPublicKeyError() from error
 
+    if OCTET_STREAM in request.headers.get("Accept", ""):
+        return Response(content=header_envelope, media_type=OCTET_STREAM)
     return {
         "content": base64.b64encode(header_envelope).decode("utf-8"),
     }
 
 
+@router.get(
+    "/secrets/{secret_id}/envelopes",
+    summary="Get envelopes of one secret for several public keys",
+    operation_id="getEncryptionDataForRecipients",
+    status_code=status.HTTP_200_OK,
+    response_model=Union[
+        models.OutboundEnvelopeContent, models.RecipientEnvelopeContent
+    ],
+    response_description="One envelope with a packet per public key, as raw Crypt4GH"
+    + " header bytes if requested via the Accept header, or one envelope per public"
+    + " key if combined is false",
+    responses={
+        status.HTTP_200_OK: {
+            "content": {
+                OCTET_STREAM: {"schema": {"type": "string", "format": "binary"}}
+            }
+        },
+        status.HTTP_400_BAD_REQUEST: ERROR_RESPONSES["invalidPublicKeyError"],
+        status.HTTP_404_NOT_FOUND: ERROR_RESPONSES["secretNotFoundError"],
+        status.HTTP_503_SERVICE_UNAVAILABLE: ERROR_RESPONSES["vaultOverloadedError"],
+        status.HTTP_504_GATEWAY_TIMEOUT: ERROR_RESPONSES["vaultConnectionError"],
+    },
+)
+async def get_header_envelopes_for_recipients(  # noqa: PLR0913
+    *,
+    secret_id: str,
+    # no public keys are rejected along with invalid ones
+    client_pk: list[str] = Query(default=[], max_length=models.MAX_RECIPIENTS),
+    combined: bool = True,
+    request: Request,
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+):
+    """
+    Create header envelopes for the file secret with given ID for each of the given
+    public keys, either combined in one header or separately
+    """
+    try:
+        client_pubkeys = [base64.urlsafe_b64decode(key) for key in client_pk]
+        header_envelopes = await get_recipient_envelopes(
+            secret_id=secret_id,
+            client_pubkeys=client_pubkeys,
+            vault=vault,
+            combined=combined,
+            crypto=crypto,
+        )
+    except SecretRetrievalError as error:
+        raise exceptions.HttpSecretNotFoundError() from error
+    except StoreOverloadedError as error:
+        raise exceptions.HttpVaultOverloadedError() from error
+    except StoreConnectionError as error:
+        raise exceptions.HttpVaultConnectionError() from error
+    except ExecutorSaturatedError as error:
+        raise exceptions.HttpCryptoOverloadedError() from error
+    except ValueError as error:
+        raise exceptions.HttpInvalidPublicKeyError() from error
+
+    if not combined:
+        return {
+            "envelopes": [
+                {"public_key": key, "content": base64.b64encode(envelope).decode()}
+                for key, envelope in zip(client_pk, header_envelopes)
+            ]
+        }
+    if OCTET_STREAM in request.headers.get("Accept", ""):
+        return Response(content=header_envelopes[0], media_type=OCTET_STREAM)
+    return {"content": base64.b64encode(header_envelopes[0]).decode("utf-8")}
+
+
+@router.post(
+    "/secrets/envelopes",
+    summary="Get personalized envelopes for many secrets and one public key",
+    operation_id="getEncryptionDataBatch",
+    status_code=status.HTTP_200_OK,
+    response_model=models.BatchEnvelopeContent,
+    response_description="One item per secret ID, containing the envelope or an"
+    + " error ID, e.g. secretNotFoundError",
+    responses={
+        status.HTTP_400_BAD_REQUEST: ERROR_RESPONSES["invalidPublicKeyError"],
+    },
+)
+async def get_header_envelopes(
+    *,
+    envelope_query: models.BatchEnvelopeQuery,
+    vault: SecretStore = Depends(get_vault),
+    crypto: CryptoExecutor = Depends(get_crypto),
+    config: VaultConfig = Depends(config_injector),
+):
+    """Create header envelopes for many file secrets encrypted with one public key"""
+    try:
+        client_pubkey = base64.b64decode(envelope_query.public_key)
+        results = await get_envelopes(
+            secret_ids=envelope_query.secret_ids,
+            client_pubkey=client_pubkey,
+            vault=vault,
+            concurrency=config.vault_batch_concurrency,
+            crypto=crypto.for_batches(),
+        )
+    except ExecutorSaturatedError as error:
+        raise exceptions.HttpCryptoOverloadedError() from error
+    except ValueError as error:
+        raise exceptions.HttpInvalidPublicKeyError() from error
+
+    envelopes = []
+    for secret_id, result in zip(envelope_query.secret_ids, results):
+        if isinstance(result, bytes):
+            content = base64.b64encode(result).decode("utf-8")
+            envelopes.append({"secret_id": secret_id, "content": content})
+        else:
+            envelopes.append({"secret_id": secret_id, "error": _batch_error_id(result)})
+    return {"envelopes": envelopes}
+
+
 @router.delete(
     "/secrets/{secret_id}",
     summary="Delete the associated secret",
@@ -154,13 +551,28 @@ async def get_header_envelope(
     response_description="",
     responses={
         status.HTTP_404_NOT_FOUND: ERROR_RESPONSES["secretNotFoundError"],
+        status.HTTP_503_SERVICE_UNAVAILABLE: ERROR_RESPONSES["vaultOverloadedError"],
+        status.HTTP_504_GATEWAY_TIMEOUT: ERROR_RESPONSES["vaultConnectionError"],
     },
 )
-async def delete_secret(*, secret_id: str, vault: VaultAdapter = Depends(get_vault)):
+async def delete_secret(
+    *,
+    secret_id: str,
+    vault: SecretStore = Depends(get_vault),
+    envelope_cache: EnvelopeCache = Depends(get_envelope_cache),
+):
     """Create header envelope for the file secret with given ID encrypted with a given public key"""
+    envelope_cache.invalidate_secret(secret_id)
     try:
-        vault.delete_secret(key=secret_id)
+        await vault.delete_secret(key=secret_id)
     except SecretRetrievalError as error:
         raise exceptions.HttpSecretNotFoundError() from error
+    except StoreOverloadedError as error:
+        raise exceptions.HttpVaultOverloadedError() from error
+    except StoreConnectionError as error:
+        raise exceptions.HttpVaultConnectionError() from error
+    finally:
+        # an envelope may have been cached again in the meantime
+        envelope_cache.invalidate_secret(secret_id)
 
     return status.HTTP_204_NO_CONTENT
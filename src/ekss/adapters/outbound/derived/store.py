@@ -0,0 +1,146 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Secret store deriving secrets from versioned master keys with HKDF"""
+
+import base64
+import hashlib
+import hmac
+import os
+from collections.abc import Mapping, Sequence
+from typing import Optional, Union
+
+from ekss.adapters.outbound.revocation import RevocationList
+from ekss.adapters.outbound.secret_store.helpers import decode_id, encode_id, get_each
+from ekss.config import StorageConfig
+from ekss.ports.outbound.secret_store import (
+    SecretInsertionError,
+    SecretRetrievalError,
+    SecretStoreError,
+)
+
+NONCE_SIZE = 16
+TAG_SIZE = 16
+KEY_SIZE = 32
+
+
+def hkdf_expand(prk: bytes, info: bytes, length: int = KEY_SIZE) -> bytes:
+    """HKDF-Expand with SHA-256 as specified in RFC 5869"""
+    output = block = b""
+    counter = 1
+    while len(output) < length:
+        block = hmac.digest(prk, block + info + bytes([counter]), hashlib.sha256)
+        output += block
+        counter += 1
+    return output[:length]
+
+
+class DerivedSecretStore:
+    """
+    Synchronous secret store that derives the secret of each file from its ID.
+
+    New IDs consist of the version of the current master key, a random nonce and a
+    tag derived from both, so that only IDs issued by this store are accepted. The
+    secret is derived from the master key and the nonce with HKDF, so it is never
+    encrypted or transmitted anywhere. Secrets of older master keys stay available
+    as long as their key version is configured. Deleting an ID revokes it.
+    """
+
+    max_batch_size = 1000
+    stores_envelopes = False
+
+    def __init__(self, config: StorageConfig):
+        """Extract pseudorandom keys from the master keys and load the revocations"""
+        self._keys: dict[int, bytes] = {}
+        for version, key in config.derived_master_keys.items():
+            if not 0 < version < 256:
+                raise ValueError("Key versions must be between 1 and 255.")
+            master_key = base64.b64decode(key.get_secret_value())
+            if len(master_key) != KEY_SIZE:
+                raise ValueError("The master keys must be 32 bytes long.")
+            # HKDF-Extract with a salt fixed per service
+            self._keys[version] = hmac.digest(
+                b"ekss-derived-secrets", master_key, hashlib.sha256
+            )
+        if config.derived_master_key_version not in self._keys:
+            raise ValueError("There is no master key for the current version.")
+        self._version = config.derived_master_key_version
+        self._revoked = RevocationList(
+            path=config.revocation_path,
+            versions=set(self._keys),
+            reload_interval=config.revocation_reload_interval,
+        )
+
+    def close(self):
+        """There is nothing to close"""
+
+    def _tag(self, prefix: bytes) -> bytes:
+        """The tag authenticating an ID starting with the given version and nonce"""
+        return hkdf_expand(self._keys[prefix[0]], b"ekss-secret-id" + prefix, TAG_SIZE)
+
+    def _derive(self, prefix: bytes) -> bytes:
+        """The secret of the ID starting with the given version and nonce"""
+        return hkdf_expand(self._keys[prefix[0]], b"ekss-file-secret" + prefix)
+
+    def _prefix(self, key: str) -> bytes:
+        """Version and nonce of a valid, not revoked ID"""
+        decoded = decode_id(key)
+        prefix, tag = decoded[: 1 + NONCE_SIZE], decoded[1 + NONCE_SIZE :]
+        if (
+            len(decoded) != 1 + NONCE_SIZE + TAG_SIZE
+            or prefix[0] not in self._keys
+            or not hmac.compare_digest(tag, self._tag(prefix))
+            or RevocationList.entry(prefix, version=prefix[0]) in self._revoked
+        ):
+            raise SecretRetrievalError()
+        return prefix
+
+    def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create a new ID and derive its secret from the current master key"""
+        prefix = bytes([self._version]) + os.urandom(NONCE_SIZE)
+        return encode_id(prefix + self._tag(prefix)), self._derive(prefix)
+
+    def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Secrets that are not derived cannot be stored"""
+        raise SecretInsertionError()
+
+    def get_secret(self, *, key: str) -> bytes:
+        """Derive the secret from its ID"""
+        return self._derive(self._prefix(key))
+
+    def get_secrets(
+        self, *, keys: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Derive the secrets from their IDs"""
+        return get_each(self.get_secret, keys)
+
+    def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Envelopes are not stored, but the ID must still be valid"""
+        self._prefix(key)
+        return None
+
+    def secret_exists(self, *, key: str) -> bool:
+        """Check whether the ID was issued by this store and has not been revoked"""
+        try:
+            self._prefix(key)
+        except SecretRetrievalError:
+            return False
+        return True
+
+    def delete_secret(self, *, key: str) -> None:
+        """Revoke the ID so that its secret can no longer be derived"""
+        prefix = self._prefix(key)
+        self._revoked.add(RevocationList.entry(prefix, version=prefix[0]))
@@ -0,0 +1,106 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Revocation list of secret IDs that are not stored and thus cannot be deleted"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+REVOCATION_SIZE = 16
+
+
+class RevocationList:
+    """
+    Append-only file of deleted secret IDs, shared by all processes using it.
+
+    Each entry consists of the key version of a wrapped secret and a truncated hash of
+    it, so entries have a fixed size independent of the secret. Hashing the decoded
+    bytes rather than the ID prevents other encodings of the same ID from passing. If
+    versions are given, entries of other key versions are not kept in memory, as their
+    IDs cannot be unwrapped anyway. Entries appended by other processes are picked up
+    when the file is checked again, at most every `reload_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        path: Path,
+        reload_interval: float,
+        versions: Optional[set[int]] = None,
+    ):
+        """Load the entries of the given key versions, or all, from the file if any"""
+        self._path = path
+        self._versions = versions
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._entries: set[bytes] = set()
+        self._offset = 0
+        self._checked_at = time.monotonic()
+        self._read()
+
+    @staticmethod
+    def entry(wrapped: bytes, *, version: int = 0) -> bytes:
+        """The fixed size entry for the given wrapped secret and key version"""
+        digest = hashlib.blake2b(wrapped, digest_size=REVOCATION_SIZE - 1).digest()
+        return bytes([version]) + digest
+
+    def _read(self):
+        """Load entries appended since the last read"""
+        try:
+            with self._path.open("rb") as file:
+                file.seek(self._offset)
+                data = file.read()
+        except FileNotFoundError:
+            return
+        # a concurrent append may not be complete yet
+        usable = len(data) - len(data) % REVOCATION_SIZE
+        for start in range(0, usable, REVOCATION_SIZE):
+            entry = data[start : start + REVOCATION_SIZE]
+            if self._versions is None or entry[0] in self._versions:
+                self._entries.add(entry)
+        self._offset += usable
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self._reload_interval:
+            self._checked_at = now
+            try:
+                self._read()
+            except OSError as error:
+                log.warning("Keeping previous revocations, reload failed: %s", error)
+
+    def __contains__(self, entry: bytes) -> bool:
+        """Check whether the given entry has been revoked"""
+        with self._lock:
+            self._refresh()
+            return entry in self._entries
+
+    def add(self, entry: bytes):
+        """Revoke the given entry durably"""
+        with self._lock:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, entry)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._entries.add(entry)
@@ -0,0 +1,117 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Async access to synchronous secret stores"""
+
+import asyncio
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Optional, TypeVar, Union
+
+from ekss.offload import BoundedExecutor, ExecutorSaturatedError
+from ekss.ports.outbound.secret_store import (
+    SecretStoreError,
+    StoreOverloadedError,
+    SyncSecretStore,
+)
+
+T = TypeVar("T")
+
+
+class SyncStoreBridge:
+    """
+    Exposes a SyncSecretStore, e.g. the hvac based VaultAdapter, as a SecretStore.
+
+    Without an executor, calls are made directly on the event loop thread and block it
+    until the store responds. With an executor, they run on its worker threads and
+    fail with a StoreOverloadedError if its queue is full. Batch reads are split into
+    batches of the size the wrapped store supports.
+    """
+
+    def __init__(
+        self, store: SyncSecretStore, *, executor: Optional[BoundedExecutor] = None
+    ):
+        """Wrap the given store, optionally offloading calls to an executor"""
+        self._store = store
+        self._executor = executor
+        self.stores_envelopes = store.stores_envelopes
+
+    async def _call(self, func: Callable[..., T], **kwargs: Any) -> T:
+        if self._executor is None:
+            return func(**kwargs)
+        try:
+            return await self._executor.run(lambda: func(**kwargs))
+        except ExecutorSaturatedError as error:
+            raise StoreOverloadedError() from error
+
+    async def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create the secret of a new file without offloading, as it needs no I/O"""
+        return self._store.new_secret()
+
+    async def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Store a new secret and return the ID it can be retrieved with"""
+        return await self._call(
+            self._store.store_secret, secret=secret, envelopes=envelopes
+        )
+
+    async def get_secret(self, *, key: str) -> bytes:
+        """Retrieve the secret with the given ID"""
+        return await self._call(self._store.get_secret, key=key)
+
+    async def get_secrets(
+        self, *, keys: Sequence[str], concurrency: int
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve the secrets with the given IDs, concurrency batches at a time"""
+        size = self._store.max_batch_size
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_batch(
+            batch: Sequence[str],
+        ) -> list[Union[bytes, SecretStoreError]]:
+            async with semaphore:
+                try:
+                    return await self._call(self._store.get_secrets, keys=batch)
+                except SecretStoreError as error:
+                    return [error] * len(batch)
+
+        batches = [keys[start : start + size] for start in range(0, len(keys), size)]
+        results = await asyncio.gather(*map(get_batch, batches))
+        return [secret for batch in results for secret in batch]
+
+    async def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        return await self._call(
+            self._store.get_envelope, key=key, envelope_id=envelope_id
+        )
+
+    async def secret_exists(self, *, key: str) -> bool:
+        """Check whether a secret with the given ID is stored"""
+        return await self._call(self._store.secret_exists, key=key)
+
+    async def delete_secret(self, *, key: str) -> None:
+        """Delete the secret with the given ID"""
+        await self._call(self._store.delete_secret, key=key)
+
+    async def close(self) -> None:
+        """Close the wrapped store and shut down the executor"""
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._store.close()
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """Report the load of the executor, if calls are offloaded"""
+        if self._executor is None:
+            return {}
+        return {"vault_offload": self._executor.stats.as_metrics()}
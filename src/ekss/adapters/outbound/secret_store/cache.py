@@ -0,0 +1,123 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Encrypted in-process cache in front of a secret store"""
+
+import os
+from collections.abc import Mapping, Sequence
+from typing import Optional, Union
+
+from ekss.adapters.outbound.secret_store.sealing import (
+    KEY_SIZE,
+    open_secret,
+    seal_secret,
+)
+from ekss.cache import LRUCache
+from ekss.ports.outbound.secret_store import SecretStore, SecretStoreError
+
+
+class CachingSecretStore:
+    """
+    Serves repeated secret reads of a SecretStore from memory.
+
+    Secrets never change once stored, so they can be cached until they are deleted.
+    Cached secrets are encrypted with an ephemeral key that only exists in this
+    process, bound to their ID. Deletions through this store invalidate the entry
+    immediately, and reads overlapping a deletion do not cache their result. Other
+    processes serve it until its TTL runs out.
+    """
+
+    def __init__(self, store: SecretStore, *, max_entries: int, ttl: float):
+        """Wrap the given store with a cache of the given size and TTL"""
+        self._store = store
+        self.stores_envelopes = store.stores_envelopes
+        self._key = os.urandom(KEY_SIZE)
+        self._cache: LRUCache[str, bytes] = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._invalidations = 0
+
+    def _seal(self, key: str, secret: bytes) -> bytes:
+        return seal_secret(secret=secret, key=self._key, associated_data=key.encode())
+
+    def _open(self, key: str, sealed: bytes) -> bytes:
+        return open_secret(sealed=sealed, key=self._key, associated_data=key.encode())
+
+    async def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create the secret of a new file"""
+        return await self._store.new_secret()
+
+    async def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Store a new secret and return the ID it can be retrieved with"""
+        return await self._store.store_secret(secret=secret, envelopes=envelopes)
+
+    async def get_secret(self, *, key: str) -> bytes:
+        """Retrieve the secret with the given ID, from the cache if possible"""
+        sealed = self._cache.get(key)
+        if sealed is not None:
+            return self._open(key, sealed)
+        invalidations = self._invalidations
+        secret = await self._store.get_secret(key=key)
+        # the secret may have been deleted while it was read
+        if invalidations == self._invalidations:
+            self._cache.put(key, self._seal(key, secret))
+        return secret
+
+    async def get_secrets(
+        self, *, keys: Sequence[str], concurrency: int
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve the secrets with the given IDs, reading uncached ones at once"""
+        results: dict[str, Union[bytes, SecretStoreError]] = {}
+        for key in keys:
+            sealed = self._cache.get(key)
+            if sealed is not None:
+                results[key] = self._open(key, sealed)
+        missing = list(dict.fromkeys(key for key in keys if key not in results))
+        invalidations = self._invalidations
+        secrets = await self._store.get_secrets(keys=missing, concurrency=concurrency)
+        for key, secret in zip(missing, secrets):
+            if isinstance(secret, bytes) and invalidations == self._invalidations:
+                self._cache.put(key, self._seal(key, secret))
+            results[key] = secret
+        return [results[key] for key in keys]
+
+    async def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        return await self._store.get_envelope(key=key, envelope_id=envelope_id)
+
+    async def secret_exists(self, *, key: str) -> bool:
+        """Check whether a secret with the given ID is stored, cached ones are"""
+        if self._cache.get(key) is not None:
+            return True
+        return await self._store.secret_exists(key=key)
+
+    async def delete_secret(self, *, key: str) -> None:
+        """Delete the secret with the given ID and drop it from the cache"""
+        self._invalidations += 1
+        self._cache.invalidate(key)
+        try:
+            await self._store.delete_secret(key=key)
+        finally:
+            # a concurrent read may have cached it again in the meantime
+            self._invalidations += 1
+            self._cache.invalidate(key)
+
+    async def close(self) -> None:
+        """Drop all cached secrets and close the wrapped store"""
+        self._cache.clear()
+        await self._store.close()
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """Report cache metrics along with those of the wrapped store"""
+        return {**self._store.metrics(), "secret_cache": self._cache.stats.as_metrics()}
@@ -0,0 +1,117 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Coalescing of concurrent reads of the same secret into one store request"""
+
+import asyncio
+from collections.abc import Mapping, Sequence
+from typing import Optional, Union
+
+from ekss.ports.outbound.secret_store import SecretStore, SecretStoreError
+
+
+class CoalescingSecretStore:
+    """
+    Lets concurrent get_secret calls for the same ID share one in-flight read.
+
+    All callers waiting for a read receive its result or its error. A caller being
+    cancelled does not cancel the read for the others. Batch reads join pending reads
+    and read each remaining ID once, but later reads do not join them.
+    """
+
+    def __init__(self, store: SecretStore):
+        """Wrap the given store"""
+        self._store = store
+        self.stores_envelopes = store.stores_envelopes
+        self._in_flight: dict[str, asyncio.Task[bytes]] = {}
+        self._reads = 0
+        self._coalesced = 0
+
+    async def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create the secret of a new file"""
+        return await self._store.new_secret()
+
+    async def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Store a new secret and return the ID it can be retrieved with"""
+        return await self._store.store_secret(secret=secret, envelopes=envelopes)
+
+    async def get_secret(self, *, key: str) -> bytes:
+        """Retrieve the secret with the given ID, joining a pending read if any"""
+        task = self._in_flight.get(key)
+        if task is None:
+            self._reads += 1
+            task = asyncio.create_task(self._store.get_secret(key=key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._coalesced += 1
+        return await asyncio.shield(task)
+
+    async def get_secrets(
+        self, *, keys: Sequence[str], concurrency: int
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve the secrets with the given IDs, joining pending reads if any"""
+        pending = {key: self._in_flight[key] for key in keys if key in self._in_flight}
+        missing = list(dict.fromkeys(key for key in keys if key not in pending))
+        self._reads += len(missing)
+        self._coalesced += len(keys) - len(missing)
+        results: dict[str, Union[bytes, SecretStoreError]] = dict(
+            zip(
+                missing,
+                await self._store.get_secrets(keys=missing, concurrency=concurrency),
+            )
+        )
+        for key, task in pending.items():
+            try:
+                results[key] = await asyncio.shield(task)
+            except SecretStoreError as error:
+                results[key] = error
+        return [results[key] for key in keys]
+
+    async def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        return await self._store.get_envelope(key=key, envelope_id=envelope_id)
+
+    def _finish(self, key: str, task: asyncio.Task[bytes]):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # mark the error as retrieved even if every caller was cancelled
+            task.exception()
+
+    async def secret_exists(self, *, key: str) -> bool:
+        """Check whether a secret with the given ID is stored"""
+        return await self._store.secret_exists(key=key)
+
+    async def delete_secret(self, *, key: str) -> None:
+        """Delete the secret, later reads do not join reads started before"""
+        self._in_flight.pop(key, None)
+        await self._store.delete_secret(key=key)
+
+    async def close(self) -> None:
+        """Close the wrapped store"""
+        await self._store.close()
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """Report the number of reads and of calls that joined a pending read"""
+        return {
+            **self._store.metrics(),
+            "vault_read_coalescing": {
+                "reads": self._reads,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._in_flight),
+            },
+        }
@@ -0,0 +1,51 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Helpers shared by the implementations of the secret store port"""
+
+import base64
+import binascii
+from collections.abc import Sequence
+from typing import Callable, Union
+
+from ekss.ports.outbound.secret_store import SecretRetrievalError, SecretStoreError
+
+
+def encode_id(data: bytes) -> str:
+    """Encode the bytes of a secret ID as URL-safe base64 without padding"""
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_id(key: str) -> bytes:
+    """Decode a secret ID created by encode_id, malformed IDs are not found"""
+    try:
+        return base64.urlsafe_b64decode(key + "=" * (-len(key) % 4))
+    except (binascii.Error, ValueError) as exc:
+        raise SecretRetrievalError() from exc
+
+
+def get_each(
+    get_secret: Callable[..., bytes], keys: Sequence[str]
+) -> list[Union[bytes, SecretStoreError]]:
+    """
+    Retrieve the secrets with the given IDs one after the other, representing those
+    that could not be retrieved by the error raised
+    """
+    secrets: list[Union[bytes, SecretStoreError]] = []
+    for key in keys:
+        try:
+            secrets.append(get_secret(key=key))
+        except SecretStoreError as error:
+            secrets.append(error)
+    return secrets
@@ -0,0 +1,42 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Authenticated encryption of secrets with XChaCha20-Poly1305"""
+
+import os
+
+from nacl.bindings import (
+    crypto_aead_xchacha20poly1305_ietf_decrypt,
+    crypto_aead_xchacha20poly1305_ietf_encrypt,
+    crypto_aead_xchacha20poly1305_ietf_KEYBYTES,
+    crypto_aead_xchacha20poly1305_ietf_NPUBBYTES,
+)
+
+KEY_SIZE = crypto_aead_xchacha20poly1305_ietf_KEYBYTES
+NONCE_SIZE = crypto_aead_xchacha20poly1305_ietf_NPUBBYTES
+
+
+def seal_secret(*, secret: bytes, key: bytes, associated_data: bytes) -> bytes:
+    """Encrypt the secret under a random nonce, which is prepended to the ciphertext"""
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + crypto_aead_xchacha20poly1305_ietf_encrypt(
+        secret, associated_data, nonce, key
+    )
+
+
+def open_secret(*, sealed: bytes, key: bytes, associated_data: bytes) -> bytes:
+    """Decrypt a sealed secret, raising a CryptoError if it does not authenticate"""
+    return crypto_aead_xchacha20poly1305_ietf_decrypt(
+        sealed[NONCE_SIZE:], associated_data, sealed[:NONCE_SIZE], key
+    )
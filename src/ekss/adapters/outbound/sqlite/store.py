@@ -0,0 +1,192 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Secret store keeping encrypted secrets in a local SQLite database"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping, Sequence
+from typing import Optional, Union
+from uuid import uuid4
+
+from ekss.adapters.outbound.secret_store.sealing import (
+    KEY_SIZE,
+    open_secret,
+    seal_secret,
+)
+from ekss.config import StorageConfig
+from ekss.ports.outbound.secret_store import (
+    SecretInsertionError,
+    SecretRetrievalError,
+    SecretStoreError,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS secrets (
+    id TEXT PRIMARY KEY,
+    secret BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS envelopes (
+    secret_id TEXT NOT NULL,
+    envelope_id TEXT NOT NULL,
+    envelope BLOB NOT NULL,
+    PRIMARY KEY (secret_id, envelope_id)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteSecretStore:
+    """
+    Synchronous secret store keeping secrets in a local database file, for use
+    without a network hop, e.g. on edge or test deployments.
+
+    The database runs in WAL mode, so reads do not block each other or writes.
+    Secrets are encrypted with the configured key encryption key, bound to their ID.
+    Envelopes are only readable by their recipients and stored as they are.
+    Each thread uses its own connection.
+    """
+
+    max_batch_size = 1000
+    stores_envelopes = True
+
+    def __init__(self, config: StorageConfig):
+        """Open the database and create the tables if needed"""
+        if config.sqlite_key_encryption_key is None:
+            raise ValueError("The SQLite secret store needs a key encryption key.")
+        self._kek = base64.b64decode(
+            config.sqlite_key_encryption_key.get_secret_value()
+        )
+        if len(self._kek) != KEY_SIZE:
+            raise ValueError("The key encryption key must be 32 bytes long.")
+        self._path = config.sqlite_path
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """The connection of the calling thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=30, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            # durable with WAL except for the last transactions on power loss
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """Close the connections of all threads"""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _seal(self, key: str, secret: bytes) -> bytes:
+        return seal_secret(secret=secret, key=self._kek, associated_data=key.encode())
+
+    def _open(self, key: str, sealed: bytes) -> bytes:
+        return open_secret(sealed=sealed, key=self._kek, associated_data=key.encode())
+
+    def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create a random secret, the ID is assigned when storing it"""
+        return None, os.urandom(32)
+
+    def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Store a secret and its envelopes under a new UUID4 and return it"""
+        key = str(uuid4())
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    "INSERT INTO secrets (id, secret) VALUES (?, ?)",
+                    (key, self._seal(key, secret)),
+                )
+                connection.executemany(
+                    "INSERT INTO envelopes (secret_id, envelope_id, envelope)"
+                    " VALUES (?, ?, ?)",
+                    [(key, *item) for item in (envelopes or {}).items()],
+                )
+        except sqlite3.IntegrityError as exc:
+            raise SecretInsertionError() from exc
+        return key
+
+    def get_secret(self, *, key: str) -> bytes:
+        """Retrieve and decrypt the secret with the given ID"""
+        row = (
+            self._connection()
+            .execute("SELECT secret FROM secrets WHERE id = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            raise SecretRetrievalError()
+        return self._open(key, row[0])
+
+    def get_secrets(
+        self, *, keys: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve and decrypt the secrets with the given IDs with one query"""
+        rows = dict(
+            self._connection().execute(
+                "SELECT id, secret FROM secrets"
+                " WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(keys)),),
+            )
+        )
+        return [
+            self._open(key, rows[key]) if key in rows else SecretRetrievalError()
+            for key in keys
+        ]
+
+    def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT envelope FROM secrets LEFT JOIN envelopes"
+                " ON secret_id = id AND envelope_id = ? WHERE id = ?",
+                (envelope_id, key),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise SecretRetrievalError()
+        return row[0]
+
+    def secret_exists(self, *, key: str) -> bool:
+        """Check whether a secret with the given ID is stored"""
+        row = (
+            self._connection()
+            .execute("SELECT 1 FROM secrets WHERE id = ?", (key,))
+            .fetchone()
+        )
+        return row is not None
+
+    def delete_secret(self, *, key: str) -> None:
+        """Delete the secret with the given ID along with its envelopes"""
+        with self._connection() as connection:
+            deleted = connection.execute("DELETE FROM secrets WHERE id = ?", (key,))
+            if not deleted.rowcount:
+                raise SecretRetrievalError()
+            connection.execute("DELETE FROM envelopes WHERE secret_id = ?", (key,))
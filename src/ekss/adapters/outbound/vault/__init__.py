@@ -14,10 +14,20 @@
 # limitations under the License.
 """Module containing HashiCorp vault related functionality"""
 
+from ekss.adapters.outbound.vault.async_client import AsyncVaultAdapter
 from ekss.adapters.outbound.vault.client import VaultAdapter
 from ekss.adapters.outbound.vault.exceptions import (
     SecretInsertionError,
     SecretRetrievalError,
+    VaultConnectionError,
 )
+from ekss.adapters.outbound.vault.transit import TransitVaultAdapter
 
-__all__ = ["SecretInsertionError", "SecretRetrievalError", "VaultAdapter"]
+__all__ = [
+    "AsyncVaultAdapter",
+    "SecretInsertionError",
+    "SecretRetrievalError",
+    "TransitVaultAdapter",
+    "VaultAdapter",
+    "VaultConnectionError",
+]
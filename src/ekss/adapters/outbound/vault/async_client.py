@@ -0,0 +1,249 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Non-blocking client for the HashiCorp Vault KV secrets engine"""
+
+import asyncio
+import base64
+import os
+from collections.abc import Mapping, Sequence
+from typing import Any, Optional, Union
+from uuid import uuid4
+
+import httpx
+import hvac.exceptions
+
+from ekss.adapters.outbound.vault import exceptions
+from ekss.adapters.outbound.vault.auth import AsyncVaultTokenManager
+from ekss.config import VaultConfig
+from ekss.ports.outbound.secret_store import SecretStoreError
+
+SERVER_ERRORS = (
+    hvac.exceptions.BadGateway,
+    hvac.exceptions.InternalServerError,
+    hvac.exceptions.VaultDown,
+)
+
+
+class AsyncVaultAdapter:
+    """Adapter talking to the Vault HTTP API via a pooled httpx.AsyncClient"""
+
+    stores_envelopes = True
+
+    def __init__(self, config: VaultConfig):
+        """Initialize the connection pool and login credentials"""
+        self._client = httpx.AsyncClient(
+            base_url=f"{config.vault_url.rstrip('/')}/v1/",
+            verify=config.vault_verify,
+            timeout=30,
+            limits=httpx.Limits(
+                max_connections=config.vault_pool_max_connections,
+                max_keepalive_connections=config.vault_pool_size,
+                keepalive_expiry=config.vault_pool_idle_timeout,
+            ),
+        )
+        self._path = config.vault_path
+        self._secrets_mount_point = config.vault_secrets_mount_point
+        self._kv_version = config.vault_kv_version
+
+        self._kube_role = config.vault_kube_role
+        if self._kube_role:
+            self._service_account_token_path = config.service_account_token_path
+        elif config.vault_role_id and config.vault_secret_id:
+            self._role_id = config.vault_role_id.get_secret_value()
+            self._secret_id = config.vault_secret_id.get_secret_value()
+        else:
+            raise ValueError(
+                "There is no way to log in to vault:\n"
+                + "Neither kube role nor both role and secret ID were provided."
+            )
+
+        self._tokens = AsyncVaultTokenManager(
+            config=config, login=self._login, renew=self._renew
+        )
+
+    async def close(self):
+        """Stop token renewal and close all pooled connections to the vault"""
+        await self._tokens.stop()
+        await self._client.aclose()
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """The async adapter has no metrics of its own"""
+        return {}
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        token: Optional[str] = None,
+        json: Optional[dict[str, Any]] = None,
+    ) -> httpx.Response:
+        """Send a request, raising the hvac exception matching an error status"""
+        headers = {"X-Vault-Request": "true"}
+        if token:
+            headers["X-Vault-Token"] = token
+        try:
+            response = await self._client.request(
+                method, url, headers=headers, json=json
+            )
+        except httpx.TransportError as error:
+            raise exceptions.VaultConnectionError() from error
+        if response.is_error:
+            errors = None
+            if response.headers.get("Content-Type") == "application/json":
+                errors = response.json().get("errors")
+            raise hvac.exceptions.VaultError.from_status(
+                response.status_code,
+                errors=errors,
+                method=method,
+                url=url,
+                text=response.text,
+            )
+        return response
+
+    async def _login(self) -> dict[str, Any]:
+        """Log in using Kubernetes Auth or AppRole"""
+        if self._kube_role:
+            with self._service_account_token_path.open() as token_file:
+                jwt = token_file.read()
+            url = "auth/kubernetes/login"
+            payload = {"role": self._kube_role, "jwt": jwt}
+        else:
+            url = "auth/approle/login"
+            payload = {"role_id": self._role_id, "secret_id": self._secret_id}
+        return (await self._request("POST", url, json=payload)).json()
+
+    async def _renew(self) -> dict[str, Any]:
+        """Renew the current token"""
+        response = await self._request(
+            "POST", "auth/token/renew-self", token=self._tokens.token, json={}
+        )
+        return response.json()
+
+    async def _authenticated(
+        self, method: str, url: str, *, json: Optional[dict[str, Any]] = None
+    ) -> httpx.Response:
+        """
+        Send a request with a valid token.
+        If the token is rejected anyway, log in again once and retry.
+        Errors of the vault itself raise a VaultConnectionError, like transport errors.
+        """
+        try:
+            token = await self._tokens.ensure_valid()
+            try:
+                return await self._request(method, url, token=token, json=json)
+            except hvac.exceptions.Forbidden:
+                token = await self._tokens.reauthenticate(stale_token=token)
+                return await self._request(method, url, token=token, json=json)
+        except SERVER_ERRORS as error:
+            raise exceptions.VaultConnectionError() from error
+
+    async def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create a random secret, the ID is assigned when storing it"""
+        return None, os.urandom(32)
+
+    def _url(self, kind: str, key: str) -> str:
+        """URL of the data or metadata of a secret, KV v1 only knows data"""
+        if self._kv_version == 1:
+            return f"{self._secrets_mount_point}/{self._path}/{key}"
+        return f"{self._secrets_mount_point}/{kind}/{self._path}/{key}"
+
+    async def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """
+        Store a secret under a subpath of the given prefix.
+        Generates a UUID4 as key, uses it for the subpath and returns it.
+        Envelopes are stored under their ID next to the secret.
+        """
+        value = base64.b64encode(secret).decode("utf-8")
+        key = str(uuid4())
+        data: dict[str, Any] = {key: value}
+        for envelope_id, envelope in (envelopes or {}).items():
+            data[envelope_id] = base64.b64encode(envelope).decode("utf-8")
+
+        # set cas to 0 as we only want a static secret, KV v1 does not support it
+        payload = (
+            data if self._kv_version == 1 else {"data": data, "options": {"cas": 0}}
+        )
+        try:
+            await self._authenticated("POST", self._url("data", key), json=payload)
+        except hvac.exceptions.InvalidRequest as exc:
+            raise exceptions.SecretInsertionError() from exc
+        return key
+
+    async def get_secret(self, *, key: str) -> bytes:
+        """
+        Retrieve a secret at the subpath of the given prefix denoted by key.
+        Key should be a UUID4 returned by store_secret on insertion
+        """
+        return base64.b64decode((await self._read(key))[key])
+
+    async def get_secrets(
+        self, *, keys: Sequence[str], concurrency: int
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve the secrets with the given IDs, concurrency at a time"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_one(key: str) -> Union[bytes, SecretStoreError]:
+            async with semaphore:
+                try:
+                    return await self.get_secret(key=key)
+                except SecretStoreError as error:
+                    return error
+
+        return await asyncio.gather(*map(get_one, keys))
+
+    async def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        envelope = (await self._read(key)).get(envelope_id)
+        return None if envelope is None else base64.b64decode(envelope)
+
+    async def _read(self, key: str) -> dict[str, str]:
+        """Read the data stored for the secret with the given key"""
+        try:
+            response = await self._authenticated("GET", self._url("data", key))
+        except hvac.exceptions.InvalidPath as exc:
+            raise exceptions.SecretRetrievalError() from exc
+
+        data = response.json()["data"]
+        return data if self._kv_version == 1 else data["data"]
+
+    async def secret_exists(self, *, key: str) -> bool:
+        """
+        Check whether a secret is stored, reading its metadata only with KV v2.
+        KV v1 has no metadata, so the secret itself is read.
+        """
+        try:
+            await self._authenticated("GET", self._url("metadata", key))
+        except hvac.exceptions.InvalidPath:
+            return False
+        return True
+
+    async def delete_secret(self, *, key: str) -> None:
+        """
+        Delete a secret with all its versions.
+
+        Deleting succeeds in Vault even if nothing is stored at the path, so the
+        existence of the secret is checked first.
+        """
+        if not await self.secret_exists(key=key):
+            raise exceptions.SecretRetrievalError()
+
+        response = await self._authenticated("DELETE", self._url("metadata", key))
+
+        # Check the response status
+        if response.status_code != 204:
+            raise exceptions.SecretDeletionError()
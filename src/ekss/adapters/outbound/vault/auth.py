@@ -0,0 +1,309 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Vault token lifecycle: lease tracking, background renewal and login backoff"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections.abc import Awaitable, Iterator
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import hvac.exceptions
+import requests.exceptions
+
+from ekss.adapters.outbound.vault import exceptions
+from ekss.config import VaultConfig
+
+log = logging.getLogger(__name__)
+
+# errors on login that are worth retrying, everything else is a configuration issue
+TRANSIENT_LOGIN_ERRORS = (
+    hvac.exceptions.BadGateway,
+    hvac.exceptions.InternalServerError,
+    hvac.exceptions.RateLimitExceeded,
+    hvac.exceptions.VaultDown,
+    requests.exceptions.RequestException,
+    exceptions.VaultConnectionError,
+)
+
+
+@dataclass(frozen=True)
+class TokenLease:
+    """A Vault token together with the lease information returned on login"""
+
+    token: str
+    ttl: float
+    renewable: bool
+    obtained_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_auth(cls, auth: dict[str, Any]) -> "TokenLease":
+        """Create from the `auth` block of a login or renewal response"""
+        return cls(
+            token=auth["client_token"],
+            ttl=float(auth.get("lease_duration") or 0),
+            renewable=bool(auth.get("renewable")),
+        )
+
+    @property
+    def expires_at(self) -> float:
+        """Monotonic time of expiry, infinite for tokens without TTL"""
+        return self.obtained_at + self.ttl if self.ttl else float("inf")
+
+    def refresh_at(self, renew_fraction: float) -> float:
+        """Monotonic time at which the token should be renewed or replaced"""
+        return (
+            self.obtained_at + self.ttl * renew_fraction if self.ttl else float("inf")
+        )
+
+    def expired(self) -> bool:
+        """Check whether the lease ran out"""
+        return time.monotonic() >= self.expires_at
+
+
+def backoff_delays(*, base: float, cap: float, attempts: int) -> Iterator[float]:
+    """Exponential backoff delays with full jitter between retries"""
+    for attempt in range(attempts - 1):
+        yield random.uniform(0, min(cap, base * 2**attempt))  # noqa: S311
+
+
+class VaultTokenManager:
+    """
+    Keeps the token of a Vault client valid without per-call lookups.
+
+    The lease TTL returned on login is recorded and a background thread renews the
+    token, or logs in again if it cannot be renewed, once `vault_token_renew_fraction`
+    of the TTL has passed.
+    """
+
+    def __init__(
+        self,
+        *,
+        config: VaultConfig,
+        login: Callable[[], dict[str, Any]],
+        renew: Callable[[], dict[str, Any]],
+    ):
+        """Takes callables performing login and renewal and returning the response"""
+        self._login = login
+        self._renew = renew
+        self._renew_fraction = config.vault_token_renew_fraction
+        self._backoff_base = config.vault_login_backoff_base
+        self._backoff_max = config.vault_login_backoff_max
+        self._login_attempts = config.vault_login_attempts
+
+        self._lease: Optional[TokenLease] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def token(self) -> Optional[str]:
+        """The currently used token, if logged in"""
+        return self._lease.token if self._lease else None
+
+    def ensure_valid(self) -> str:
+        """Log in if there is no token or it expired and return the current token"""
+        lease = self._lease
+        if lease is None or lease.expired():
+            with self._lock:
+                if self._lease is lease:
+                    self._set_lease(self._login_with_backoff())
+        return self.token  # type: ignore [return-value]
+
+    def reauthenticate(self, *, stale_token: Optional[str]) -> str:
+        """
+        Log in again after a request was rejected with the given token.
+        Does nothing if another caller already replaced that token in the meantime.
+        """
+        with self._lock:
+            if self.token == stale_token:
+                self._set_lease(self._login_with_backoff())
+        return self.token  # type: ignore [return-value]
+
+    def stop(self):
+        """Stop background renewal"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+
+    def _set_lease(self, auth: dict[str, Any]):
+        self._lease = TokenLease.from_auth(auth)
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="vault-token-renewal", daemon=True
+            )
+            self._thread.start()
+        else:
+            self._wakeup.set()
+
+    def _login_with_backoff(self) -> dict[str, Any]:
+        delays = backoff_delays(
+            base=self._backoff_base,
+            cap=self._backoff_max,
+            attempts=self._login_attempts,
+        )
+        while True:
+            try:
+                return self._login()["auth"]
+            except TRANSIENT_LOGIN_ERRORS as error:
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+                log.warning("Vault login failed, retrying in %.2fs: %s", delay, error)
+                time.sleep(delay)
+
+    def _run(self):
+        """Renew or replace the token ahead of expiry until stopped"""
+        while not self._stopped.is_set():
+            lease = self._lease
+            if lease is None:
+                return
+            timeout = lease.refresh_at(self._renew_fraction) - time.monotonic()
+            if timeout > 0:
+                self._wakeup.wait(None if timeout == float("inf") else timeout)
+                self._wakeup.clear()
+                continue
+            try:
+                self._refresh(lease)
+            except Exception as error:
+                # keep the current token, requests log in on expiry or rejection
+                log.warning("Background refresh of Vault token failed: %s", error)
+                self._wakeup.wait(self._backoff_max)
+                self._wakeup.clear()
+
+    def _refresh(self, lease: TokenLease):
+        with self._lock:
+            if self._lease is not lease:
+                return
+            if lease.renewable:
+                auth = self._renew()["auth"]
+                renewed = TokenLease.from_auth(auth)
+                # a shorter TTL than before means the token reached its max TTL
+                if renewed.ttl >= lease.ttl:
+                    self._lease = renewed
+                    return
+            self._lease = TokenLease.from_auth(self._login_with_backoff())
+
+
+class AsyncVaultTokenManager:
+    """
+    Asyncio counterpart of the VaultTokenManager for non-blocking Vault clients.
+
+    Renewal runs in a background task on the event loop instead of a thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        config: VaultConfig,
+        login: Callable[[], Awaitable[dict[str, Any]]],
+        renew: Callable[[], Awaitable[dict[str, Any]]],
+    ):
+        """Takes coroutine functions performing login and renewal"""
+        self._login = login
+        self._renew = renew
+        self._renew_fraction = config.vault_token_renew_fraction
+        self._backoff_base = config.vault_login_backoff_base
+        self._backoff_max = config.vault_login_backoff_max
+        self._login_attempts = config.vault_login_attempts
+
+        self._lease: Optional[TokenLease] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def token(self) -> Optional[str]:
+        """The currently used token, if logged in"""
+        return self._lease.token if self._lease else None
+
+    async def ensure_valid(self) -> str:
+        """Log in if there is no token or it expired and return the current token"""
+        lease = self._lease
+        if lease is None or lease.expired():
+            async with self._lock:
+                if self._lease is lease:
+                    self._set_lease(await self._login_with_backoff())
+        return self.token  # type: ignore [return-value]
+
+    async def reauthenticate(self, *, stale_token: Optional[str]) -> str:
+        """
+        Log in again after a request was rejected with the given token.
+        Does nothing if another caller already replaced that token in the meantime.
+        """
+        async with self._lock:
+            if self.token == stale_token:
+                self._set_lease(await self._login_with_backoff())
+        return self.token  # type: ignore [return-value]
+
+    async def stop(self):
+        """Cancel background renewal"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _set_lease(self, auth: dict[str, Any]):
+        self._lease = TokenLease.from_auth(auth)
+        if self._task is not None:
+            self._task.cancel()
+        self._task = asyncio.create_task(self._run(self._lease))
+
+    async def _login_with_backoff(self) -> dict[str, Any]:
+        delays = backoff_delays(
+            base=self._backoff_base,
+            cap=self._backoff_max,
+            attempts=self._login_attempts,
+        )
+        while True:
+            try:
+                return (await self._login())["auth"]
+            except TRANSIENT_LOGIN_ERRORS as error:
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+                log.warning("Vault login failed, retrying in %.2fs: %s", delay, error)
+                await asyncio.sleep(delay)
+
+    async def _run(self, lease: TokenLease):
+        """Renew or replace the given lease ahead of expiry"""
+        while self._lease is lease:
+            timeout = lease.refresh_at(self._renew_fraction) - time.monotonic()
+            if timeout == float("inf"):
+                return
+            await asyncio.sleep(max(timeout, 0))
+            try:
+                lease = await self._refresh(lease)
+            except Exception as error:
+                # keep the current token, requests log in on expiry or rejection
+                log.warning("Background refresh of Vault token failed: %s", error)
+                await asyncio.sleep(self._backoff_max)
+
+    async def _refresh(self, lease: TokenLease) -> TokenLease:
+        async with self._lock:
+            if self._lease is not lease:
+                return lease
+            if lease.renewable:
+                renewed = TokenLease.from_auth((await self._renew())["auth"])
+                # a shorter TTL than before means the token reached its max TTL
+                if renewed.ttl >= lease.ttl:
+                    self._lease = renewed
+                    return renewed
+            self._lease = TokenLease.from_auth(await self._login_with_backoff())
+            return self._lease
@@ -15,24 +15,50 @@
 """Provides client side functionality for interaction with HashiCorp Vault"""
 
 import base64
+import os
+from collections.abc import Mapping, Sequence
+from typing import Any, Callable, Optional, TypeVar, Union
 from uuid import uuid4
 
 import hvac
 import hvac.exceptions
+import requests.exceptions
 from hvac.api.auth_methods import Kubernetes
 
+from ekss.adapters.outbound.secret_store.helpers import get_each
 from ekss.adapters.outbound.vault import exceptions
+from ekss.adapters.outbound.vault.auth import VaultTokenManager
+from ekss.adapters.outbound.vault.pool import PooledSession
 from ekss.config import VaultConfig
+from ekss.ports.outbound.secret_store import SecretStoreError
+
+T = TypeVar("T")
+
+# the vault cannot be reached or fails to process any request
+UNAVAILABLE_ERRORS = (
+    hvac.exceptions.BadGateway,
+    hvac.exceptions.InternalServerError,
+    hvac.exceptions.VaultDown,
+    requests.exceptions.RequestException,
+)
 
 
 class VaultAdapter:
     """Adapter wrapping hvac.Client"""
 
+    # every secret is read with a request of its own
+    max_batch_size = 1
+    stores_envelopes = True
+
     def __init__(self, config: VaultConfig):
         """Initialized approle based client and login"""
-        self._client = hvac.Client(url=config.vault_url, verify=config.vault_verify)
+        self._session = PooledSession(config=config)
+        self._client = hvac.Client(
+            url=config.vault_url, verify=config.vault_verify, session=self._session
+        )
         self._path = config.vault_path
         self._secrets_mount_point = config.vault_secrets_mount_point
+        self._kv_version = config.vault_kv_version
 
         self._kube_role = config.vault_kube_role
         if self._kube_role:
@@ -50,41 +76,81 @@ class VaultAdapter:
                 + "Neither kube role nor both role and secret ID were provided."
             )
 
-    def _check_auth(self):
-        """Check if authentication timed out and re-authenticate if needed"""
-        if not self._client.is_authenticated():
-            self._login()
+        self._tokens = VaultTokenManager(
+            config=config, login=self._login, renew=self._client.auth.token.renew_self
+        )
+
+    def close(self):
+        """Stop token renewal and close all pooled connections to the vault"""
+        self._tokens.stop()
+        self._session.close()
 
-    def _login(self):
+    def _login(self) -> dict[str, Any]:
         """Log in using Kubernetes Auth or AppRole"""
         if self._kube_role:
             with self._service_account_token_path.open() as token_file:
                 jwt = token_file.read()
-            self._kube_adapter.login(role=self._kube_role, jwt=jwt)
+            return self._kube_adapter.login(role=self._kube_role, jwt=jwt)
 
-        else:
-            self._client.auth.approle.login(
-                role_id=self._role_id, secret_id=self._secret_id
-            )
+        return self._client.auth.approle.login(
+            role_id=self._role_id, secret_id=self._secret_id
+        )
 
-    def store_secret(self, *, secret: bytes) -> str:
+    def _authenticated(self, operation: Callable[[], T]) -> T:
+        """
+        Run a vault operation with a valid token.
+        If the token is rejected anyway, log in again once and retry.
+        Errors reaching the vault or of the vault itself raise a VaultConnectionError.
+        """
+        try:
+            token = self._tokens.ensure_valid()
+            try:
+                return operation()
+            except hvac.exceptions.Forbidden:
+                self._tokens.reauthenticate(stale_token=token)
+                return operation()
+        except UNAVAILABLE_ERRORS as error:
+            raise exceptions.VaultConnectionError() from error
+
+    def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create a random secret, the ID is assigned when storing it"""
+        return None, os.urandom(32)
+
+    def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
         """
         Store a secret under a subpath of the given prefix.
         Generates a UUID4 as key, uses it for the subpath and returns it.
+        Envelopes are stored under their ID next to the secret.
         """
         value = base64.b64encode(secret).decode("utf-8")
         key = str(uuid4())
-
-        self._check_auth()
+        data = {key: value}
+        for envelope_id, envelope in (envelopes or {}).items():
+            data[envelope_id] = base64.b64encode(envelope).decode("utf-8")
 
         try:
-            # set cas to 0 as we only want a static secret
-            self._client.secrets.kv.v2.create_or_update_secret(
-                path=f"{self._path}/{key}",
-                secret={key: value},
-                cas=0,
-                mount_point=self._secrets_mount_point,
-            )
+            if self._kv_version == 1:
+                # without a method, hvac reads the path first to choose one
+                self._authenticated(
+                    lambda: self._client.secrets.kv.v1.create_or_update_secret(
+                        path=f"{self._path}/{key}",
+                        secret=data,
+                        method="POST",
+                        mount_point=self._secrets_mount_point,
+                    )
+                )
+            else:
+                # set cas to 0 as we only want a static secret
+                self._authenticated(
+                    lambda: self._client.secrets.kv.v2.create_or_update_secret(
+                        path=f"{self._path}/{key}",
+                        secret=data,
+                        cas=0,
+                        mount_point=self._secrets_mount_point,
+                    )
+                )
         except hvac.exceptions.InvalidRequest as exc:
             raise exceptions.SecretInsertionError() from exc
         return key
@@ -94,37 +160,85 @@ class VaultAdapter:
         Retrieve a secret at the subpath of the given prefix denoted by key.
         Key should be a UUID4 returned by store_secret on insertion
         """
-        self._check_auth()
+        return base64.b64decode(self._read(key)[key])
+
+    def get_secrets(
+        self, *, keys: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve the secrets with the given IDs one after the other"""
+        return get_each(self.get_secret, keys)
 
+    def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        envelope = self._read(key).get(envelope_id)
+        return None if envelope is None else base64.b64decode(envelope)
+
+    def _read(self, key: str) -> dict[str, str]:
+        """Read the data stored for the secret with the given key"""
         try:
-            response = self._client.secrets.kv.v2.read_secret_version(
-                path=f"{self._path}/{key}",
-                raise_on_deleted_version=True,
-                mount_point=self._secrets_mount_point,
+            if self._kv_version == 1:
+                response = self._authenticated(
+                    lambda: self._client.secrets.kv.v1.read_secret(
+                        path=f"{self._path}/{key}",
+                        mount_point=self._secrets_mount_point,
+                    )
+                )
+                return response["data"]
+            response = self._authenticated(
+                lambda: self._client.secrets.kv.v2.read_secret_version(
+                    path=f"{self._path}/{key}",
+                    raise_on_deleted_version=True,
+                    mount_point=self._secrets_mount_point,
+                )
             )
         except hvac.exceptions.InvalidPath as exc:
             raise exceptions.SecretRetrievalError() from exc
 
-        secret = response["data"]["data"][key]
-        return base64.b64decode(secret)
-
-    def delete_secret(self, *, key: str) -> None:
-        """Delete a secret"""
-        self._check_auth()
-        path = f"{self._path}/{key}"
+        return response["data"]["data"]
 
+    def secret_exists(self, *, key: str) -> bool:
+        """
+        Check whether a secret is stored, reading its metadata only with KV v2.
+        KV v1 has no metadata, so the secret itself is read.
+        """
+        if self._kv_version == 1:
+            try:
+                self._read(key)
+            except exceptions.SecretRetrievalError:
+                return False
+            return True
         try:
-            self._client.secrets.kv.v2.read_secret_version(
-                path=path,
-                raise_on_deleted_version=True,
-                mount_point=self._secrets_mount_point,
+            self._authenticated(
+                lambda: self._client.secrets.kv.v2.read_secret_metadata(
+                    path=f"{self._path}/{key}", mount_point=self._secrets_mount_point
+                )
             )
-        except hvac.exceptions.InvalidPath as exc:
-            raise exceptions.SecretRetrievalError() from exc
+        except hvac.exceptions.InvalidPath:
+            return False
+        return True
 
-        response = self._client.secrets.kv.v2.delete_metadata_and_all_versions(
-            path=path
-        )
+    def delete_secret(self, *, key: str) -> None:
+        """
+        Delete a secret with all its versions.
+
+        Deleting succeeds in Vault even if nothing is stored at the path, so the
+        existence of the secret is checked first.
+        """
+        if not self.secret_exists(key=key):
+            raise exceptions.SecretRetrievalError()
+
+        if self._kv_version == 1:
+            response = self._authenticated(
+                lambda: self._client.secrets.kv.v1.delete_secret(
+                    path=f"{self._path}/{key}", mount_point=self._secrets_mount_point
+                )
+            )
+        else:
+            response = self._authenticated(
+                lambda: self._client.secrets.kv.v2.delete_metadata_and_all_versions(
+                    path=f"{self._path}/{key}", mount_point=self._secrets_mount_point
+                )
+            )
 
         # Check the response status
         if response.status_code != 204:
@@ -14,18 +14,20 @@
 # limitations under the License.
 """Exceptions wrapping HashiCorp Vault errors"""
 
-
-class VaultException(RuntimeError):
-    """Baseclass for for errors encountered when interacting with HashiCorp Vault"""
-
-
-class SecretInsertionError(VaultException):
-    """Wrapper for errors encountered on secret insertion"""
-
-
-class SecretRetrievalError(VaultException):
-    """Wrapper for errors encountered on secret retrieval"""
-
-
-class SecretDeletionError(VaultException):
-    """Wrapper for errors encountered on secret deletion"""
+from ekss.ports.outbound.secret_store import (
+    SecretDeletionError,
+    SecretInsertionError,
+    SecretRetrievalError,
+    StoreConnectionError,
+)
+
+__all__ = [
+    "SecretDeletionError",
+    "SecretInsertionError",
+    "SecretRetrievalError",
+    "VaultConnectionError",
+]
+
+
+class VaultConnectionError(StoreConnectionError):
+    """Wrapper for errors encountered when the vault cannot be reached"""
@@ -0,0 +1,66 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keep-alive connection pool used for all HTTP traffic to HashiCorp Vault"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ekss.config import VaultConfig
+
+
+class PooledSession(requests.Session):
+    """
+    Requests session with a bounded keep-alive connection pool.
+
+    At most `vault_pool_max_connections` requests are in flight at the same time,
+    `vault_pool_size` connections are kept open for reuse and all pooled connections
+    are dropped once the session has been idle for `vault_pool_idle_timeout` seconds.
+    """
+
+    def __init__(self, config: VaultConfig):
+        """Mount a pooled HTTP adapter for both HTTP and HTTPS"""
+        super().__init__()
+        self.verify = config.vault_verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.vault_pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(config.vault_pool_max_connections)
+        self._idle_timeout = config.vault_pool_idle_timeout
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_used = time.monotonic()
+
+    def send(self, request, **kwargs):
+        """Send a request on a pooled connection, waiting for a free slot if needed"""
+        with self._slots:
+            with self._lock:
+                if (
+                    self._in_flight == 0
+                    and time.monotonic() - self._last_used > self._idle_timeout
+                ):
+                    # drop connections the server side has most likely closed already
+                    for adapter in self.adapters.values():
+                        adapter.close()
+                self._in_flight += 1
+            try:
+                return super().send(request, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._last_used = time.monotonic()
@@ -0,0 +1,158 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Client wrapping secrets with the HashiCorp Vault Transit secrets engine"""
+
+import base64
+import binascii
+from collections.abc import Mapping, Sequence
+from typing import Optional, Union
+
+import hvac.exceptions
+
+from ekss.adapters.outbound.revocation import RevocationList
+from ekss.adapters.outbound.vault import exceptions
+from ekss.adapters.outbound.vault.client import VaultAdapter
+from ekss.config import SecretStoreConfig
+from ekss.ports.outbound.secret_store import SecretStoreError
+
+TO_URL_SAFE = str.maketrans("+/", "-_")
+FROM_URL_SAFE = str.maketrans("-_", "+/")
+
+
+class TransitVaultAdapter(VaultAdapter):
+    """
+    Adapter storing no secrets in Vault, but encrypting them with a Transit key.
+
+    The ciphertext returned by Vault serves as the secret ID, so the number of objects
+    in Vault does not grow with the number of files. As the ID is used in URL paths,
+    the "vault:" prefix is dropped and the ciphertext is URL-safe base64 encoded.
+    Many secrets are decrypted with one request. Deleted IDs are added to a revocation
+    list, as Vault would still decrypt them. Envelopes cannot be stored and are always
+    created on demand.
+    """
+
+    def __init__(self, config: SecretStoreConfig):
+        """Log in like the KV adapter and load the revocation list"""
+        super().__init__(config=config)
+        self.max_batch_size = config.vault_transit_batch_size
+        self.stores_envelopes = False
+        self._transit_mount_point = config.vault_transit_mount_point
+        self._transit_key = config.vault_transit_key
+        self._revoked = RevocationList(
+            path=config.revocation_path,
+            reload_interval=config.revocation_reload_interval,
+        )
+
+    @staticmethod
+    def _ciphertext(key: str) -> tuple[str, bytes]:
+        """The Vault ciphertext of a well-formed ID and its revocation list entry"""
+        version, _, payload = key.partition(":")
+        if not (version[:1] == "v" and version[1:].isdigit()):
+            raise exceptions.SecretRetrievalError()
+        payload = payload.translate(FROM_URL_SAFE)
+        try:
+            entry = RevocationList.entry(base64.b64decode(payload, validate=True))
+        except binascii.Error as exc:
+            raise exceptions.SecretRetrievalError() from exc
+        return f"vault:{version}:{payload}", entry
+
+    def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Encrypt the secret and return the ciphertext as ID, envelopes are not kept"""
+        plaintext = base64.b64encode(secret).decode("utf-8")
+        try:
+            response = self._authenticated(
+                lambda: self._client.secrets.transit.encrypt_data(
+                    name=self._transit_key,
+                    plaintext=plaintext,
+                    mount_point=self._transit_mount_point,
+                )
+            )
+        except (hvac.exceptions.InvalidRequest, hvac.exceptions.InvalidPath) as exc:
+            raise exceptions.SecretInsertionError() from exc
+        ciphertext: str = response["data"]["ciphertext"]
+        return ciphertext.removeprefix("vault:").translate(TO_URL_SAFE)
+
+    def get_secret(self, *, key: str) -> bytes:
+        """Decrypt the secret from its ID"""
+        secret = self.get_secrets(keys=[key])[0]
+        if isinstance(secret, SecretStoreError):
+            raise secret
+        return secret
+
+    def get_secrets(
+        self, *, keys: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Decrypt the secrets from their IDs with one request"""
+        results: dict[int, Union[bytes, SecretStoreError]] = {}
+        ciphertexts: dict[int, str] = {}
+        for index, key in enumerate(keys):
+            try:
+                ciphertext, entry = self._ciphertext(key)
+            except SecretStoreError as error:
+                results[index] = error
+                continue
+            if entry in self._revoked:
+                results[index] = exceptions.SecretRetrievalError()
+            else:
+                ciphertexts[index] = ciphertext
+        if ciphertexts:
+            decrypted = self._decrypt(list(ciphertexts.values()))
+            results.update(zip(ciphertexts, decrypted))
+        return [results[index] for index in range(len(keys))]
+
+    def _decrypt(
+        self, ciphertexts: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Decrypt well-formed ciphertexts, any of which may fail"""
+        url = f"/v1/{self._transit_mount_point}/decrypt/{self._transit_key}"
+        payload = {
+            "batch_input": [{"ciphertext": ciphertext} for ciphertext in ciphertexts],
+            # report failures per item instead of failing the whole request
+            "partial_failure_response_code": 200,
+        }
+        try:
+            response = self._authenticated(
+                lambda: self._client.adapter.post(url, json=payload)
+            )
+        except (hvac.exceptions.InvalidRequest, hvac.exceptions.InvalidPath) as exc:
+            error = exceptions.SecretRetrievalError()
+            error.__cause__ = exc
+            return [error] * len(ciphertexts)
+        return [
+            base64.b64decode(item["plaintext"])
+            if "plaintext" in item
+            else exceptions.SecretRetrievalError()
+            for item in response["data"]["batch_results"]
+        ]
+
+    def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Envelopes are not stored, but the ID must still be valid"""
+        self.get_secret(key=key)
+        return None
+
+    def secret_exists(self, *, key: str) -> bool:
+        """Check whether the ID can be decrypted and has not been revoked"""
+        try:
+            self.get_secret(key=key)
+        except exceptions.SecretRetrievalError:
+            return False
+        return True
+
+    def delete_secret(self, *, key: str) -> None:
+        """Revoke the ID so that it can no longer be used"""
+        self.get_secret(key=key)
+        self._revoked.add(self._ciphertext(key)[1])
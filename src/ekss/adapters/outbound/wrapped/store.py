@@ -0,0 +1,135 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Secret store wrapping secrets into their IDs"""
+
+import base64
+import os
+from collections.abc import Mapping, Sequence
+from typing import Optional, Union
+
+from nacl.exceptions import CryptoError
+
+from ekss.adapters.outbound.revocation import RevocationList
+from ekss.adapters.outbound.secret_store.helpers import decode_id, encode_id, get_each
+from ekss.adapters.outbound.secret_store.sealing import (
+    KEY_SIZE,
+    NONCE_SIZE,
+    open_secret,
+    seal_secret,
+)
+from ekss.config import StorageConfig
+from ekss.ports.outbound.secret_store import (
+    SecretRetrievalError,
+    SecretStoreError,
+)
+
+ASSOCIATED_DATA = b"ekss-wrapped-secret"
+
+
+class WrappedSecretStore:
+    """
+    Synchronous secret store that keeps each secret in its own ID.
+
+    The ID is the secret encrypted with the current key encryption key, prefixed with
+    the key version, so reading a secret only needs the keys. IDs wrapped with older
+    keys can be read as long as their key version is configured. As handed out IDs
+    cannot be taken back, deleting one adds it to a revocation list.
+    """
+
+    max_batch_size = 1000
+    stores_envelopes = False
+
+    def __init__(self, config: StorageConfig):
+        """Load the key encryption keys and the revocation list"""
+        self._keys: dict[int, bytes] = {}
+        for version, key in config.wrapped_key_encryption_keys.items():
+            if not 0 < version < 256:
+                raise ValueError("Key versions must be between 1 and 255.")
+            self._keys[version] = base64.b64decode(key.get_secret_value())
+            if len(self._keys[version]) != KEY_SIZE:
+                raise ValueError("The key encryption keys must be 32 bytes long.")
+        if config.wrapped_key_version not in self._keys:
+            raise ValueError("There is no key encryption key for the current version.")
+        self._version = config.wrapped_key_version
+        self._revoked = RevocationList(
+            path=config.revocation_path,
+            versions=set(self._keys),
+            reload_interval=config.revocation_reload_interval,
+        )
+
+    def close(self):
+        """There is nothing to close"""
+
+    def _unwrap(self, key: str) -> tuple[bytes, bytes]:
+        """Wrapped and plain secret of a valid, not revoked ID"""
+        wrapped = decode_id(key)
+        kek = self._keys.get(wrapped[0]) if wrapped else None
+        if kek is None or len(wrapped) <= 1 + NONCE_SIZE:
+            raise SecretRetrievalError()
+        try:
+            secret = open_secret(
+                sealed=wrapped[1:],
+                key=kek,
+                associated_data=ASSOCIATED_DATA + wrapped[:1],
+            )
+        except CryptoError as exc:
+            raise SecretRetrievalError() from exc
+        if RevocationList.entry(wrapped, version=wrapped[0]) in self._revoked:
+            raise SecretRetrievalError()
+        return wrapped, secret
+
+    def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create a random secret, wrapped into its ID when storing it"""
+        return None, os.urandom(32)
+
+    def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Wrap the secret into a new ID, envelopes are not kept"""
+        version = bytes([self._version])
+        wrapped = seal_secret(
+            secret=secret,
+            key=self._keys[self._version],
+            associated_data=ASSOCIATED_DATA + version,
+        )
+        return encode_id(version + wrapped)
+
+    def get_secret(self, *, key: str) -> bytes:
+        """Unwrap the secret from its ID"""
+        return self._unwrap(key)[1]
+
+    def get_secrets(
+        self, *, keys: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Unwrap the secrets from their IDs"""
+        return get_each(self.get_secret, keys)
+
+    def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Envelopes are not stored, but the ID must still be valid"""
+        self._unwrap(key)
+        return None
+
+    def secret_exists(self, *, key: str) -> bool:
+        """Check whether the ID is valid and has not been revoked"""
+        try:
+            self._unwrap(key)
+        except SecretRetrievalError:
+            return False
+        return True
+
+    def delete_secret(self, *, key: str) -> None:
+        """Revoke the ID so that it can no longer be used"""
+        wrapped, _ = self._unwrap(key)
+        self._revoked.add(RevocationList.entry(wrapped, version=wrapped[0]))
@@ -0,0 +1,140 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bounded in-memory cache with least-recently-used eviction and expiry"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Optional, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    """Counters describing the effectiveness of a cache"""
+
+    max_entries: int
+    entries: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def as_metrics(self) -> dict[str, float]:
+        """Flat representation including the hit ratio"""
+        lookups = self.hits + self.misses
+        return {
+            "max_entries": self.max_entries,
+            "entries": self.entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Thread-safe mapping holding at most `max_entries` values for `ttl` seconds.
+
+    When full, the least recently used entry is evicted. Expired entries are dropped
+    when looked up and whenever a value is added. `on_discard` is called with every
+    value leaving the cache, e.g. to wipe key material.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        ttl: float,
+        on_discard: Optional[Callable[[V], None]] = None,
+    ):
+        """Configure size limit, time to live in seconds and discard callback"""
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._on_discard = on_discard
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        # all entries live equally long, so the order of insertion is that of expiry
+        self._expiry_order: OrderedDict[K, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats(max_entries=max_entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """Return the cached value or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, key: K, value: V):
+        """Add or replace a value, evicting the least recently used one if full"""
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (now + self._ttl, value)
+            self._expiry_order[key] = None
+            while len(self._entries) > self._max_entries:
+                self._discard(next(iter(self._entries)))
+                self.stats.evictions += 1
+            self.stats.entries = len(self._entries)
+
+    def invalidate(self, key: K):
+        """Remove the value for the given key, if cached"""
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+                self.stats.invalidations += 1
+
+    def clear(self):
+        """Remove all values"""
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def _purge_expired(self, now: float):
+        while self._expiry_order:
+            key = next(iter(self._expiry_order))
+            if self._entries[key][0] > now:
+                break
+            self._discard(key)
+            self.stats.expirations += 1
+
+    def _discard(self, key: K):
+        _, value = self._entries.pop(key)
+        del self._expiry_order[key]
+        self.stats.entries = len(self._entries)
+        if self._on_discard is not None:
+            self._on_discard(value)
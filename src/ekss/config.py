@@ -16,7 +16,7 @@
 """Config Parameter Modeling and Parsing"""
 
 from pathlib import Path
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 
 from ghga_service_commons.api import ApiConfigBase
 from hexkit.config import config_from_yaml
@@ -24,6 +24,8 @@ from hexkit.log import LoggingConfig
 from pydantic import Field, SecretStr, field_validator
 from pydantic_settings import BaseSettings
 
+StorageBackend = Literal["vault", "sqlite", "wrapped", "transit", "derived"]
+
 
 class VaultConfig(BaseSettings):
     """Configuration for HashiCorp Vault connection"""
@@ -60,6 +62,14 @@ class VaultConfig(BaseSettings):
         examples=["secret"],
         description="Name used to address the secret engine under a custom mount path.",
     )
+    vault_kv_version: Literal[1, 2] = Field(
+        default=2,
+        examples=[1, 2],
+        description="Version of the KV secrets engine mounted at"
+        + " vault_secrets_mount_point. Secrets are never updated, so the versioning"
+        + " and metadata of KV v2 are not needed, and KV v1 has less overhead per"
+        + " secret.",
+    )
     vault_kube_role: Optional[str] = Field(
         default=None,
         examples=["file-ingest-role"],
@@ -69,6 +79,125 @@ class VaultConfig(BaseSettings):
         default="/var/run/secrets/kubernetes.io/serviceaccount/token",
         description="Path to service account token used by kube auth adapter.",
     )
+    vault_transit_mount_point: str = Field(
+        default="transit",
+        examples=["transit"],
+        description="Mount point of the Transit engine used by the transit store.",
+    )
+    vault_transit_key: str = Field(
+        default="ekss",
+        examples=["ekss"],
+        description="Name of the Transit key the transit store encrypts secrets with."
+        + " The key must exist.",
+    )
+    vault_transit_batch_size: int = Field(
+        default=100,
+        ge=1,
+        examples=[100],
+        description="Maximum number of secrets the transit store decrypts with a"
+        + " single request.",
+    )
+    vault_client: Literal["hvac", "async"] = Field(
+        default="hvac",
+        examples=["hvac", "async"],
+        description="Client used to talk to the vault: 'hvac' for the synchronous"
+        + " hvac client or 'async' for a non-blocking client that does not stall"
+        + " the event loop while waiting for the vault. The transit store always"
+        + " uses hvac.",
+    )
+    vault_offload_threads: int = Field(
+        default=0,
+        ge=0,
+        examples=[0, 16],
+        description="Number of threads that calls of the 'hvac' vault client are"
+        + " offloaded to, so that they do not block the event loop. If set to 0,"
+        + " calls run directly on the event loop.",
+    )
+    vault_offload_max_queue: int = Field(
+        default=64,
+        ge=0,
+        examples=[64],
+        description="Maximum number of offloaded vault calls waiting for a free"
+        + " thread. Further calls are rejected immediately.",
+    )
+    vault_batch_concurrency: int = Field(
+        default=16,
+        ge=1,
+        examples=[16],
+        description="Maximum number of items of a single batch request that are"
+        + " processed at the same time, i.e. of concurrent vault reads or writes.",
+    )
+    vault_pool_size: int = Field(
+        default=10,
+        ge=1,
+        examples=[10],
+        description="Number of keep-alive connections to the vault kept open"
+        + " for reuse by each worker.",
+    )
+    vault_pool_max_connections: int = Field(
+        default=20,
+        ge=1,
+        examples=[20],
+        description="Maximum number of concurrent requests to the vault per worker."
+        + " Further requests wait until a connection becomes available.",
+    )
+    vault_pool_idle_timeout: float = Field(
+        default=30,
+        gt=0,
+        examples=[30],
+        description="Time in seconds after which idle pooled connections to the vault"
+        + " are discarded instead of reused.",
+    )
+    vault_coalesce_reads: bool = Field(
+        default=True,
+        examples=[True],
+        description="Let concurrent requests for the same secret share a single"
+        + " in-flight vault read instead of each reading it separately.",
+    )
+    vault_secret_cache_size: int = Field(
+        default=0,
+        ge=0,
+        examples=[0, 10000],
+        description="Maximum number of secrets each worker keeps in an in-memory cache,"
+        + " encrypted with a key that only exists in that worker. If set to 0,"
+        + " every secret is read from the vault.",
+    )
+    vault_secret_cache_ttl: float = Field(
+        default=300,
+        gt=0,
+        examples=[300],
+        description="Time in seconds a secret stays in the cache. As deletions only"
+        + " invalidate the cache of the worker handling them, this also bounds how"
+        + " long other workers may still serve a deleted secret.",
+    )
+    vault_token_renew_fraction: float = Field(
+        default=0.75,
+        gt=0,
+        lt=1,
+        examples=[0.75],
+        description="Fraction of the vault token TTL after which the token is renewed"
+        + " in the background, or replaced by a new login if it cannot be renewed.",
+    )
+    vault_login_attempts: int = Field(
+        default=5,
+        ge=1,
+        examples=[5],
+        description="Number of attempts to log in to the vault before giving up.",
+    )
+    vault_login_backoff_base: float = Field(
+        default=0.5,
+        gt=0,
+        examples=[0.5],
+        description="Base delay in seconds of the jittered exponential backoff"
+        + " between failed vault login attempts.",
+    )
+    vault_login_backoff_max: float = Field(
+        default=30,
+        gt=0,
+        examples=[30],
+        description="Upper bound in seconds for a single backoff delay between"
+        + " failed vault login attempts.",
+    )
 
     @field_validator("vault_verify")
     @classmethod
@@ -87,8 +216,142 @@ class VaultConfig(BaseSettings):
         return value
 
 
+class StorageConfig(BaseSettings):
+    """Configuration of the secret store and of the stores not using HashiCorp Vault"""
+
+    storage_backend: StorageBackend = Field(
+        default="vault",
+        examples=["vault", "sqlite", "wrapped", "transit", "derived"],
+        description="Where secrets are stored: 'vault' in the HashiCorp Vault KV"
+        + " engine, 'sqlite' in a local SQLite database, e.g. for edge or test"
+        + " deployments, 'wrapped' in the secret IDs themselves, encrypted with a key"
+        + " encryption key, 'transit' in the secret IDs, encrypted by the Vault"
+        + " Transit engine, or 'derived' nowhere, as secrets are derived from a master"
+        + " key and their ID. The other vault settings apply to the other stores as"
+        + " far as applicable.",
+    )
+    sqlite_path: Path = Field(
+        default=Path("ekss.sqlite3"),
+        examples=["/var/lib/ekss/secrets.sqlite3"],
+        description="Database file of the SQLite secret store.",
+    )
+    sqlite_key_encryption_key: Optional[SecretStr] = Field(
+        default=None,
+        examples=["key_encryption_key"],
+        description="Base64 encoded 32 byte key the SQLite secret store encrypts"
+        + " secrets with. Required for the SQLite secret store.",
+    )
+    wrapped_key_encryption_keys: dict[int, SecretStr] = Field(
+        default={},
+        examples=[{1: "key_encryption_key"}],
+        description="Base64 encoded 32 byte keys by version from 1 to 255, that the"
+        + " wrapped secret store encrypts secrets into their IDs with. IDs stay"
+        + " readable as long as the key of their version is configured.",
+    )
+    wrapped_key_version: int = Field(
+        default=1,
+        examples=[1, 2],
+        description="Version of the key encryption key new secrets are wrapped with.",
+    )
+    derived_master_keys: dict[int, SecretStr] = Field(
+        default={},
+        examples=[{1: "master_key"}],
+        description="Base64 encoded 32 byte master keys by version from 1 to 255,"
+        + " that the derived secret store derives secrets from. Secrets stay"
+        + " available as long as the key of their version is configured.",
+    )
+    derived_master_key_version: int = Field(
+        default=1,
+        examples=[1, 2],
+        description="Version of the master key new secrets are derived from.",
+    )
+    revocation_path: Path = Field(
+        default=Path("ekss-revocations.bin"),
+        examples=["/var/lib/ekss/revocations.bin"],
+        description="Append-only file listing the deleted IDs of the wrapped, transit"
+        + " and derived secret stores, which do not store secrets that could be"
+        + " deleted. All instances sharing the same keys must share this file.",
+    )
+    revocation_reload_interval: float = Field(
+        default=10,
+        ge=0,
+        examples=[10],
+        description="Seconds after which the wrapped, transit and derived secret"
+        + " stores check the revocation file for deletions made by other instances.",
+    )
+
+
+class SecretStoreConfig(StorageConfig, VaultConfig):
+    """Configuration of the secret store, including the vault some stores use"""
+
+
+class CryptoConfig(BaseSettings):
+    """Configuration for the execution of envelope cryptography"""
+
+    crypto_executor: Literal["inline", "thread", "process"] = Field(
+        default="inline",
+        examples=["inline", "thread", "process"],
+        description="Where envelopes are decrypted and encrypted: 'inline' on the"
+        + " event loop (on worker threads for batches), 'thread' on a thread pool or"
+        + " 'process' on a process pool with the server key loaded in every worker"
+        + " process.",
+    )
+    crypto_workers: int = Field(
+        default=0,
+        ge=0,
+        examples=[0, 4],
+        description="Number of threads or processes for envelope cryptography."
+        + " 0 uses one per CPU core. Ignored for the inline executor.",
+    )
+    crypto_max_queue: int = Field(
+        default=256,
+        ge=0,
+        examples=[256],
+        description="Maximum number of envelope operations waiting for a free"
+        + " worker. Further operations are rejected immediately.",
+    )
+    crypto_envelope_codec: Literal["libsodium", "crypt4gh"] = Field(
+        default="crypt4gh",
+        examples=["crypt4gh", "libsodium"],
+        description="How envelope headers are built and parsed: 'crypt4gh' with the"
+        + " generic implementation of the crypt4gh library, or 'libsodium' with a"
+        + " lean implementation for single-packet envelopes.",
+    )
+    crypto_shared_key_cache_size: int = Field(
+        default=1024,
+        ge=0,
+        examples=[1024],
+        description="Maximum number of keys shared with client public keys that are"
+        + " kept per process to skip the key agreement for further envelopes."
+        + " 0 disables the cache.",
+    )
+    crypto_shared_key_cache_ttl: float = Field(
+        default=3600,
+        gt=0,
+        examples=[3600],
+        description="Seconds after which a cached shared key is discarded.",
+    )
+    crypto_envelope_cache_size: int = Field(
+        default=0,
+        ge=0,
+        examples=[0, 4096],
+        description="Maximum number of envelopes kept per process to answer repeated"
+        + " requests for the same secret and public key. If set to 0, the cache is"
+        + " disabled. Enable it only with a single worker, since deleting a secret"
+        + " does not drop its envelopes cached by other workers.",
+    )
+    crypto_envelope_cache_ttl: float = Field(
+        default=300,
+        gt=0,
+        examples=[300],
+        description="Seconds after which a cached envelope is discarded. Deleting a"
+        + " secret drops its envelopes immediately only in the process handling the"
+        + " deletion.",
+    )
+
+
 @config_from_yaml(prefix="ekss")
-class Config(ApiConfigBase, VaultConfig, LoggingConfig):
+class Config(ApiConfigBase, SecretStoreConfig, CryptoConfig, LoggingConfig):
     """Config parameters and their defaults."""
 
     service_name: str = "encryption_key_store"
@@ -102,6 +365,33 @@ class Config(ApiConfigBase, VaultConfig, LoggingConfig):
         examples=["server_public_key"],
         description="Base64 encoded server Crypt4GH public key",
     )
+    server_retired_private_keys: list[SecretStr] = Field(
+        default=[],
+        examples=[["retired_server_private_key"]],
+        description="Base64 encoded server Crypt4GH private keys that are no longer"
+        + " used for new envelopes, but still used to decrypt submitted envelopes.",
+    )
+    server_keyring_path: Optional[Path] = Field(
+        default=None,
+        examples=["/etc/ekss/keyring"],
+        description="File with one base64 encoded server Crypt4GH private key per"
+        + " line, replacing the configured keys. The first key is used for new"
+        + " envelopes, all keys are used for decryption. The file is read again when"
+        + " it changes, so keys can be rotated without a restart.",
+    )
+    server_keyring_reload_interval: float = Field(
+        default=10,
+        gt=0,
+        examples=[10],
+        description="Seconds between checks whether the keyring file has changed.",
+    )
+    internal_recipient_public_keys: list[str] = Field(
+        default=[],
+        examples=[["archive_public_key"]],
+        description="Base64 encoded Crypt4GH public keys of internal services that"
+        + " need envelopes of every secret. Their envelopes are created on ingest and"
+        + " stored next to the secret, so they are served without cryptography.",
+    )
 
 
 CONFIG = Config()  # type: ignore [call-arg]
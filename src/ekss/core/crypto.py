@@ -0,0 +1,158 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Execution of envelope cryptography inline, on a thread pool or on a process pool"""
+
+import asyncio
+import copy
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from ekss.config import CONFIG, Config
+from ekss.core.keyring import KeyRing, SharedKeyCache
+from ekss.offload import BoundedExecutor, ExecutorStats
+
+T = TypeVar("T")
+
+_keyring: Optional[KeyRing] = None
+_shared_keys: Optional[SharedKeyCache] = None
+_envelope_codec: Optional[str] = None
+
+
+def process_arguments(config: Config) -> dict[str, Any]:
+    """Picklable arguments for setup_process"""
+    return {
+        "keyring": KeyRing.arguments_from_config(config),
+        "shared_key_cache_size": config.crypto_shared_key_cache_size,
+        "shared_key_cache_ttl": config.crypto_shared_key_cache_ttl,
+        "envelope_codec": config.crypto_envelope_codec,
+    }
+
+
+def setup_process(arguments: dict[str, Any]):
+    """
+    Set up the key ring, shared key cache and envelope codec of this process, e.g.
+    in pool workers
+    """
+    global _keyring, _shared_keys, _envelope_codec
+    _keyring = KeyRing(**arguments["keyring"])
+    _shared_keys = SharedKeyCache(
+        max_entries=arguments["shared_key_cache_size"],
+        ttl=arguments["shared_key_cache_ttl"],
+    )
+    _envelope_codec = arguments["envelope_codec"]
+
+
+def get_keyring() -> KeyRing:
+    """The key ring of this process, loaded from the config on first use"""
+    global _keyring
+    if _keyring is None:
+        _keyring = KeyRing(**KeyRing.arguments_from_config(CONFIG))
+    return _keyring
+
+
+def get_shared_keys() -> SharedKeyCache:
+    """The shared key cache of this process, configured on first use"""
+    global _shared_keys
+    if _shared_keys is None:
+        _shared_keys = SharedKeyCache(
+            max_entries=CONFIG.crypto_shared_key_cache_size,
+            ttl=CONFIG.crypto_shared_key_cache_ttl,
+        )
+    return _shared_keys
+
+
+def get_envelope_codec() -> str:
+    """The envelope codec of this process, 'libsodium' or 'crypt4gh'"""
+    return _envelope_codec or CONFIG.crypto_envelope_codec
+
+
+class CryptoExecutor:
+    """
+    Runs blocking envelope cryptography as configured.
+
+    Inline, calls run on the event loop thread, or on worker threads for batches.
+    Otherwise they run on a bounded
+    thread or process pool, whose worker processes load the server keys and set up
+    their own shared key cache on startup.
+    Queue wait and execution times are recorded in `stats` in all modes.
+    """
+
+    def __init__(self, config: Config):
+        """Load the server keys and start the configured pool"""
+        arguments = process_arguments(config)
+        setup_process(arguments)
+        self._executor: Optional[BoundedExecutor] = None
+        self._inline_in_thread = False
+        if config.crypto_executor == "inline":
+            self.stats = ExecutorStats(workers=1, max_queue_depth=0)
+            return
+
+        workers = config.crypto_workers or os.cpu_count() or 1
+        pool: Executor
+        if config.crypto_executor == "thread":
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crypto")
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=setup_process,
+                initargs=(arguments,),
+            )
+        self._executor = BoundedExecutor(
+            pool, workers=workers, max_queue_depth=config.crypto_max_queue
+        )
+        self.stats = self._executor.stats
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run func(*args) as configured and return its result.
+        For process pools, func and args must be picklable.
+        """
+        if self._executor is not None:
+            return await self._executor.run(func, *args)
+        started = time.monotonic()
+        if self._inline_in_thread:
+            result = await asyncio.to_thread(func, *args)
+        else:
+            result = func(*args)
+        self.stats.record(wait=0.0, duration=time.monotonic() - started)
+        return result
+
+    def for_batches(self) -> "CryptoExecutor":
+        """
+        This executor, except that inline calls run on worker threads, so that
+        batches of many envelopes do not stall the event loop. Stats are shared.
+        """
+        if self._executor is not None:
+            return self
+        batches = copy.copy(self)
+        batches._inline_in_thread = True
+        return batches
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """
+        Report queue and execution times and the shared key cache of this process.
+        The caches of process pool workers are not included.
+        """
+        return {
+            "crypto_executor": self.stats.as_metrics(),
+            "shared_key_cache": get_shared_keys().stats.as_metrics(),
+        }
+
+    def shutdown(self):
+        """Shut down the pool, if any"""
+        if self._executor is not None:
+            self._executor.shutdown()
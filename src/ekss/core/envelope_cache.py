@@ -0,0 +1,82 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process cache of envelopes for pairs of secret ID and client public key"""
+
+from collections.abc import Awaitable
+from typing import Callable
+
+from ekss.cache import LRUCache
+
+EnvelopeKey = tuple[str, bytes]
+
+
+class EnvelopeCache:
+    """
+    Serves repeated requests for the envelope of a secret for the same client.
+
+    Envelopes can only be decrypted by their client, so they are cached as they are.
+    Deleting a secret through invalidate_secret drops all of its envelopes. Other
+    processes serve them until their TTL runs out.
+    The cache is meant to be used from the event loop thread only.
+    """
+
+    def __init__(self, *, max_entries: int, ttl: float):
+        """Configure size limit and time to live in seconds"""
+        self._cache: LRUCache[EnvelopeKey, tuple[EnvelopeKey, bytes]] = LRUCache(
+            max_entries=max_entries, ttl=ttl, on_discard=self._unindex
+        )
+        self._enabled = max_entries > 0
+        self._keys_by_secret: dict[str, set[bytes]] = {}
+        self._invalidations = 0
+        self.stats = self._cache.stats
+
+    async def get_or_create(
+        self,
+        *,
+        secret_id: str,
+        client_pubkey: bytes,
+        create: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """Return the cached envelope or create and cache it"""
+        key = (secret_id, client_pubkey)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached[1]
+        invalidations = self._invalidations
+        envelope = await create()
+        # the secret may have been deleted while the envelope was created
+        if self._enabled and invalidations == self._invalidations:
+            self._cache.put(key, (key, envelope))
+            self._keys_by_secret.setdefault(secret_id, set()).add(client_pubkey)
+        return envelope
+
+    def invalidate_secret(self, secret_id: str):
+        """Drop all envelopes of the given secret"""
+        self._invalidations += 1
+        for client_pubkey in list(self._keys_by_secret.get(secret_id, ())):
+            self._cache.invalidate((secret_id, client_pubkey))
+
+    def _unindex(self, entry: tuple[EnvelopeKey, bytes]):
+        (secret_id, client_pubkey), _ = entry
+        client_pubkeys = self._keys_by_secret.get(secret_id)
+        if client_pubkeys is not None:
+            client_pubkeys.discard(client_pubkey)
+            if not client_pubkeys:
+                del self._keys_by_secret[secret_id]
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """Report hits, misses and the hit ratio"""
+        return {"envelope_cache": self.stats.as_metrics()}
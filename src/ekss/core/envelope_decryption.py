@@ -14,28 +14,212 @@
 # limitations under the License.
 """Implements functionality for envelope decryption and secret storage"""
 
-import base64
 import io
+from collections.abc import AsyncIterable
+from functools import partial
+from typing import Optional
 
+import crypt4gh
 import crypt4gh.header
+from nacl.bindings import crypto_kx_PUBLIC_KEY_BYTES
 
-from ekss.config import CONFIG
+from ekss.core.crypto import (
+    CryptoExecutor,
+    get_envelope_codec,
+    get_keyring,
+    get_shared_keys,
+)
+from ekss.core.header_codec import (
+    PACKET_LENGTH_SIZE,
+    PREAMBLE_SIZE,
+    open_packets,
+    parse_header,
+)
+from ekss.core.keyring import ServerKey
 
+MAX_HEADER_SIZE = 64 * 1024
+# error message of crypt4gh if none of the given keys decrypts the header
+NO_SUPPORTED_METHOD = "No supported encryption method"
 
-async def extract_envelope_content(
-    *, file_part: bytes, client_pubkey: bytes
+
+class HeaderParser:
+    """
+    Incrementally collects the Crypt4GH header from the leading chunks of a file.
+
+    Only header bytes are buffered, bytes after the header are ignored. The preamble
+    is validated as soon as its bytes arrive, and headers larger than
+    `max_header_size` are rejected, so memory use is bounded regardless of the size
+    of the input. Invalid input raises a ValueError.
+    """
+
+    def __init__(self, *, max_header_size: int = MAX_HEADER_SIZE):
+        """Prepare parsing a new header"""
+        self._max_header_size = max_header_size
+        self._buffer = bytearray()
+        self._needed = PREAMBLE_SIZE
+        self._packets_left = -1  # unknown until the preamble is parsed
+        self._in_packet = False
+        self.complete = False
+
+    @property
+    def needed(self) -> int:
+        """The header length once complete, else the number of bytes needed to proceed"""
+        return self._needed
+
+    @property
+    def header(self) -> bytes:
+        """The header bytes collected so far"""
+        return bytes(self._buffer)
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume the next chunk of the file and report whether the header is complete"""
+        position = 0
+        while not self.complete and position < len(chunk):
+            end = position + self._needed - len(self._buffer)
+            self._buffer += chunk[position:end]
+            position = end
+            if len(self._buffer) < self._needed:
+                self._check_preamble()
+                break
+            self._advance()
+        return self.complete
+
+    def _check_preamble(self):
+        """Validate magic number and version as far as they are available"""
+        magic_number = crypt4gh.header.MAGIC_NUMBER
+        if not magic_number.startswith(self._buffer[: len(magic_number)]):
+            raise ValueError("Not a CRYPT4GH formatted file")
+        version = self._buffer[8:12]
+        if len(version) == 4 and int.from_bytes(version, "little") != crypt4gh.VERSION:
+            raise ValueError("Unsupported CRYPT4GH version")
+
+    def _advance(self):
+        """Parse the bytes that were needed and determine how many are needed next"""
+        if self._packets_left < 0:
+            self._check_preamble()
+            self._packets_left = int.from_bytes(self._buffer[12:16], "little")
+        elif not self._in_packet:
+            # the packet length includes the length field itself
+            packet_length = int.from_bytes(self._buffer[-PACKET_LENGTH_SIZE:], "little")
+            if packet_length < PACKET_LENGTH_SIZE:
+                raise ValueError(f"Invalid packet length {packet_length}")
+            self._in_packet = True
+            self._grow(packet_length - PACKET_LENGTH_SIZE)
+            return
+        else:
+            self._in_packet = False
+            self._packets_left -= 1
+
+        if self._packets_left == 0:
+            self.complete = True
+        else:
+            self._grow(PACKET_LENGTH_SIZE)
+
+    def _grow(self, size: int):
+        self._needed += size
+        if self._needed > self._max_header_size:
+            raise ValueError("Header too large")
+        if len(self._buffer) == self._needed:
+            self._advance()
+
+
+def get_header_length(file_start: bytes) -> int:
+    """
+    Determine how many leading bytes of a Crypt4GH file make up its header.
+
+    If `file_start` contains the whole header, its length is returned. Otherwise, the
+    returned value is larger than `len(file_start)` and a prefix of at least this
+    length is needed to make progress. Only the header needs to be sent to the
+    service to extract its content.
+    """
+    parser = HeaderParser()
+    parser.feed(file_start)
+    return parser.needed
+
+
+async def extract_envelope_content_from_stream(
+    *,
+    chunks: AsyncIterable[bytes],
+    client_pubkey: bytes,
+    crypto: Optional[CryptoExecutor] = None,
 ) -> tuple[bytes, int]:
-    """Extract file encryption/decryption secret and file content offset from envelope"""
-    envelope_stream = io.BytesIO(file_part)
+    """
+    Extract file encryption/decryption secret and file content offset from the
+    envelope at the start of a stream, without reading further than the header
+    """
+    parser = HeaderParser()
+    async for chunk in chunks:
+        if parser.feed(chunk):
+            break
+    else:
+        raise ValueError("Header too small")
+    return await extract_envelope_content(
+        file_part=parser.header, client_pubkey=client_pubkey, crypto=crypto
+    )
 
-    server_private_key = base64.b64decode(CONFIG.server_private_key.get_secret_value())
-    # (method - only 0 supported for now, private_key, public_key)
-    keys = [(0, server_private_key, None)]
-    session_keys, _ = crypt4gh.header.deconstruct(
-        infile=envelope_stream, keys=keys, sender_pubkey=client_pubkey
+
+async def extract_envelope_content(
+    *,
+    file_part: bytes,
+    client_pubkey: bytes,
+    crypto: Optional[CryptoExecutor] = None,
+) -> tuple[bytes, int]:
+    """
+    Extract file encryption/decryption secret and file content offset from envelope,
+    decrypting it on the given executor if any
+    """
+    decrypt = partial(
+        decrypt_envelope, file_part=file_part, client_pubkey=client_pubkey
     )
+    return await crypto.run(decrypt) if crypto else decrypt()
 
-    submitter_secret = session_keys[0]
-    offset = envelope_stream.tell()
 
-    return submitter_secret, offset
+def decrypt_envelope(*, file_part: bytes, client_pubkey: bytes) -> tuple[bytes, int]:
+    """
+    Blocking implementation of extract_envelope_content.
+    Tries all server keys, starting with the most likely one.
+    """
+    keyring = get_keyring()
+    libsodium = get_envelope_codec() == "libsodium"
+    if libsodium:
+        packets, header_length = parse_header(file_part)
+        if len(client_pubkey) != crypto_kx_PUBLIC_KEY_BYTES:
+            raise ValueError(NO_SUPPORTED_METHOD)
+
+    for server_key in keyring.decryption_order():
+        if libsodium:
+            shared_key = get_shared_keys().get(server_key, client_pubkey, receive=True)
+            file_secrets = open_packets(
+                packets, shared_key=shared_key, client_pubkey=client_pubkey
+            )
+        else:
+            file_secrets, header_length = _deconstruct(
+                file_part=file_part, server_key=server_key, client_pubkey=client_pubkey
+            )
+        if file_secrets is None:
+            continue
+
+        keyring.record_success(server_key)
+        if not file_secrets:
+            raise ValueError("No file secret in header")
+        return file_secrets[0], header_length
+
+    raise ValueError(NO_SUPPORTED_METHOD)
+
+
+def _deconstruct(
+    *, file_part: bytes, server_key: ServerKey, client_pubkey: bytes
+) -> tuple[Optional[list[bytes]], int]:
+    """Decrypt the header with crypt4gh, returning no secrets if the key does not fit"""
+    envelope_stream = io.BytesIO(file_part)
+    # (method - only 0 supported for now, private_key, public_key)
+    keys = [(0, server_key.private_key, None)]
+    try:
+        session_keys, _ = crypt4gh.header.deconstruct(
+            infile=envelope_stream, keys=keys, sender_pubkey=client_pubkey
+        )
+    except ValueError as error:
+        if str(error) != NO_SUPPORTED_METHOD:
+            raise
+        return None, 0
+    return session_keys, envelope_stream.tell()
@@ -15,35 +15,260 @@
 
 """Implements functionality for envelope encrytion"""
 
-import base64
+import os
+from collections.abc import Collection, Sequence
+from functools import partial
+from typing import Optional, Union
 
 import crypt4gh.header
+from nacl.bindings import (
+    crypto_aead_chacha20poly1305_ietf_encrypt,
+    crypto_kx_PUBLIC_KEY_BYTES,
+)
 
-from ekss.adapters.outbound.vault import VaultAdapter
-from ekss.config import CONFIG
+from ekss.core.crypto import (
+    CryptoExecutor,
+    get_envelope_codec,
+    get_keyring,
+    get_shared_keys,
+)
+from ekss.core.header_codec import seal_header
+from ekss.core.keyring import ServerKey, key_fingerprint
+from ekss.ports.outbound.secret_store import SecretStore, SecretStoreError
 
 
 async def get_envelope(
-    *, secret_id: str, client_pubkey: bytes, vault: VaultAdapter
+    *,
+    secret_id: str,
+    client_pubkey: bytes,
+    vault: SecretStore,
+    crypto: Optional[CryptoExecutor] = None,
+    internal_recipients: Collection[bytes] = (),
 ) -> bytes:
-    """Calls the database and then calls a function to assemble an envelope"""
-    file_secret = vault.get_secret(key=secret_id)
+    """
+    Calls the database and then calls a function to assemble an envelope.
+    Envelopes for internal recipients are served as stored on ingest, if the vault
+    adapter stores envelopes and has one for the current server key.
+    """
+    if vault.stores_envelopes and client_pubkey in internal_recipients:
+        envelope = await vault.get_envelope(
+            key=secret_id,
+            envelope_id=envelope_id(get_keyring().current, client_pubkey),
+        )
+        if envelope is not None:
+            return envelope
+    file_secret = await vault.get_secret(key=secret_id)
     header_envelope = await create_envelope(
-        file_secret=file_secret, client_pubkey=client_pubkey
+        file_secret=file_secret, client_pubkey=client_pubkey, crypto=crypto
     )
 
     return header_envelope
 
 
-async def create_envelope(*, file_secret: bytes, client_pubkey: bytes) -> bytes:
+async def create_envelope(
+    *,
+    file_secret: bytes,
+    client_pubkey: bytes,
+    crypto: Optional[CryptoExecutor] = None,
+) -> bytes:
     """
     Gather file encryption/decryption secret and assemble a crypt4gh envelope using the
-    servers private and the clients public key
+    servers private and the clients public key, on the given executor if any
+    """
+    seal = partial(seal_envelope, file_secret=file_secret, client_pubkey=client_pubkey)
+    return await crypto.run(seal) if crypto else seal()
+
+
+def seal_envelope(*, file_secret: bytes, client_pubkey: bytes) -> bytes:
+    """Blocking implementation of create_envelope"""
+    return EnvelopeSealer(client_pubkeys=[client_pubkey]).seal(file_secret=file_secret)
+
+
+class EnvelopeSealer:
+    """
+    Assembles crypt4gh envelopes for a fixed list of client public keys.
+
+    The key agreement between the server's private and a client's public key only
+    depends on the keys, so it is done once and reused for every envelope.
+    """
+
+    def __init__(self, *, client_pubkeys: Sequence[bytes]):
+        """Derive the keys shared with the given clients"""
+        if not client_pubkeys or any(
+            len(client_pubkey) != crypto_kx_PUBLIC_KEY_BYTES
+            for client_pubkey in client_pubkeys
+        ):
+            raise ValueError("Invalid client public key")
+        server_key = get_keyring().current
+        shared_keys = get_shared_keys()
+        self.server_key = server_key
+        self._server_pubkey = server_key.public_key
+        self._shared_keys = [
+            shared_keys.get(server_key, client_pubkey)
+            for client_pubkey in client_pubkeys
+        ]
+        self._libsodium = get_envelope_codec() == "libsodium"
+
+    def seal(self, *, file_secret: bytes) -> bytes:
+        """Assemble one envelope for the file secret, readable by all clients"""
+        return self._seal(file_secret, self._shared_keys)
+
+    def seal_each(self, *, file_secret: bytes) -> list[bytes]:
+        """Assemble one envelope for the file secret per client, in their order"""
+        return [
+            self._seal(file_secret, [shared_key]) for shared_key in self._shared_keys
+        ]
+
+    def _seal(self, file_secret: bytes, shared_keys: list[bytes]) -> bytes:
+        recipients = [(shared_key, os.urandom(12)) for shared_key in shared_keys]
+        if self._libsodium:
+            return seal_header(
+                file_secret=file_secret,
+                server_pubkey=self._server_pubkey,
+                recipients=recipients,
+            )
+        packet_data = crypt4gh.header.make_packet_data_enc(0, file_secret)
+        return crypt4gh.header.serialize(
+            (0).to_bytes(4, "little")
+            + self._server_pubkey
+            + nonce
+            + crypto_aead_chacha20poly1305_ietf_encrypt(
+                packet_data, None, nonce, shared_key
+            )
+            for shared_key, nonce in recipients
+        )
+
+
+def seal_for_recipients(
+    *, file_secret: bytes, client_pubkeys: Sequence[bytes], combined: bool
+) -> list[bytes]:
+    """Blocking implementation of create_recipient_envelopes"""
+    sealer = EnvelopeSealer(client_pubkeys=client_pubkeys)
+    if combined:
+        return [sealer.seal(file_secret=file_secret)]
+    return sealer.seal_each(file_secret=file_secret)
+
+
+async def get_recipient_envelopes(
+    *,
+    secret_id: str,
+    client_pubkeys: Sequence[bytes],
+    vault: SecretStore,
+    combined: bool,
+    crypto: Optional[CryptoExecutor] = None,
+) -> list[bytes]:
     """
-    server_private_key = base64.b64decode(CONFIG.server_private_key.get_secret_value())
-    keys = [(0, server_private_key, client_pubkey)]
-    header_content = crypt4gh.header.make_packet_data_enc(0, file_secret)
-    header_packets = crypt4gh.header.encrypt(header_content, keys)
-    header_bytes = crypt4gh.header.serialize(header_packets)
+    Assemble envelopes of one secret for several clients from a single vault read.
+
+    If `combined`, a single envelope with one packet per client is returned, which
+    each of them can decrypt. Otherwise, one envelope per client in their order.
+    """
+    file_secret = await vault.get_secret(key=secret_id)
+    return await create_recipient_envelopes(
+        file_secret=file_secret,
+        client_pubkeys=client_pubkeys,
+        combined=combined,
+        crypto=crypto,
+    )
 
-    return header_bytes
+
+async def create_recipient_envelopes(
+    *,
+    file_secret: bytes,
+    client_pubkeys: Sequence[bytes],
+    combined: bool,
+    crypto: Optional[CryptoExecutor] = None,
+) -> list[bytes]:
+    """Assemble envelopes of the file secret for several clients, as described above"""
+    seal = partial(
+        seal_for_recipients,
+        file_secret=file_secret,
+        client_pubkeys=client_pubkeys,
+        combined=combined,
+    )
+    return await crypto.run(seal) if crypto else seal()
+
+
+def envelope_id(server_key: ServerKey, client_pubkey: bytes) -> str:
+    """
+    ID under which an envelope is stored next to its secret. Envelopes of retired
+    server keys are not found anymore.
+    """
+    return f"envelope_{server_key.fingerprint}_{key_fingerprint(client_pubkey)}"
+
+
+def seal_for_ingest(
+    *,
+    file_secret: bytes,
+    recipient_pubkeys: Sequence[bytes],
+    internal_recipients: Sequence[bytes],
+) -> tuple[list[bytes], dict[str, bytes]]:
+    """Blocking implementation of create_ingest_envelopes"""
+    client_pubkeys = [*recipient_pubkeys, *internal_recipients]
+    if not client_pubkeys:
+        return [], {}
+    sealer = EnvelopeSealer(client_pubkeys=client_pubkeys)
+    envelopes = sealer.seal_each(file_secret=file_secret)
+    stored = {
+        envelope_id(sealer.server_key, client_pubkey): envelope
+        for client_pubkey, envelope in zip(
+            internal_recipients, envelopes[len(recipient_pubkeys) :]
+        )
+    }
+    return envelopes[: len(recipient_pubkeys)], stored
+
+
+async def create_ingest_envelopes(
+    *,
+    file_secret: bytes,
+    recipient_pubkeys: Sequence[bytes],
+    internal_recipients: Sequence[bytes],
+    crypto: Optional[CryptoExecutor] = None,
+) -> tuple[list[bytes], dict[str, bytes]]:
+    """
+    Assemble envelopes of a new secret in one pass: one per requested recipient, in
+    their order, and one per internal recipient, by the ID to store it under
+    """
+    seal = partial(
+        seal_for_ingest,
+        file_secret=file_secret,
+        recipient_pubkeys=recipient_pubkeys,
+        internal_recipients=internal_recipients,
+    )
+    return await crypto.run(seal) if crypto else seal()
+
+
+def seal_batch(*, file_secrets: Sequence[bytes], client_pubkey: bytes) -> list[bytes]:
+    """Blocking implementation of the sealing in get_envelopes"""
+    sealer = EnvelopeSealer(client_pubkeys=[client_pubkey])
+    return [sealer.seal(file_secret=file_secret) for file_secret in file_secrets]
+
+
+async def get_envelopes(
+    *,
+    secret_ids: list[str],
+    client_pubkey: bytes,
+    vault: SecretStore,
+    concurrency: int,
+    crypto: Optional[CryptoExecutor] = None,
+) -> list[Union[bytes, SecretStoreError]]:
+    """
+    Assemble envelopes for many secrets and one client, in the order of the IDs.
+
+    The secrets are read in batches as far as the vault adapter supports them, with
+    at most `concurrency` reads at the same time. Secrets that could not be fetched
+    are represented by the error raised by the vault adapter. All envelopes are
+    sealed in one call on the given executor if any.
+    """
+    if len(client_pubkey) != crypto_kx_PUBLIC_KEY_BYTES:
+        raise ValueError("Invalid client public key")
+    secrets = await vault.get_secrets(keys=secret_ids, concurrency=concurrency)
+    seal = partial(
+        seal_batch,
+        file_secrets=[secret for secret in secrets if isinstance(secret, bytes)],
+        client_pubkey=client_pubkey,
+    )
+    envelopes = iter(await crypto.run(seal) if crypto else seal())
+    return [
+        next(envelopes) if isinstance(secret, bytes) else secret for secret in secrets
+    ]
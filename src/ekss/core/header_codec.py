@@ -0,0 +1,165 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Crypt4GH header encoding and decoding for envelopes, built directly on libsodium.
+
+The envelopes of this service only hold X25519/ChaCha20-Poly1305 packets for the same
+file secret, so the generic handling of crypt4gh.header is not needed to create them.
+Parsing accepts any valid header and fails with the same messages as crypt4gh.header.
+"""
+
+from collections.abc import Sequence
+from typing import Optional
+
+import crypt4gh
+import crypt4gh.header
+from nacl.bindings import (
+    crypto_aead_chacha20poly1305_ietf_ABYTES,
+    crypto_aead_chacha20poly1305_ietf_decrypt,
+    crypto_aead_chacha20poly1305_ietf_encrypt,
+    crypto_aead_chacha20poly1305_ietf_NPUBBYTES,
+    crypto_kx_PUBLIC_KEY_BYTES,
+)
+from nacl.exceptions import CryptoError
+
+PREAMBLE_SIZE = 16  # magic number, version and packet count
+PACKET_LENGTH_SIZE = 4
+METHOD_SIZE = 4
+
+_MAGIC_NUMBER = crypt4gh.header.MAGIC_NUMBER
+_VERSION = crypt4gh.VERSION.to_bytes(4, "little")
+_PREAMBLE = _MAGIC_NUMBER + _VERSION
+_X25519_CHACHA20 = (0).to_bytes(METHOD_SIZE, "little")
+_DATA_ENC = crypt4gh.header.PACKET_TYPE_DATA_ENC
+_EDIT_LIST = crypt4gh.header.PACKET_TYPE_EDIT_LIST
+_CHACHA20_IETF = (0).to_bytes(4, "little")
+
+_PUBKEY_END = METHOD_SIZE + crypto_kx_PUBLIC_KEY_BYTES
+_NONCE_END = _PUBKEY_END + crypto_aead_chacha20poly1305_ietf_NPUBBYTES
+_MIN_PACKET_SIZE = _NONCE_END + crypto_aead_chacha20poly1305_ietf_ABYTES
+
+
+def seal_header(
+    *,
+    file_secret: bytes,
+    server_pubkey: bytes,
+    recipients: Sequence[tuple[bytes, bytes]],
+) -> bytes:
+    """
+    Create a header with one packet holding the file secret per recipient, given as
+    the key shared with it and a fresh nonce
+    """
+    packet_data = _DATA_ENC + _CHACHA20_IETF + file_secret
+    parts = [_PREAMBLE, len(recipients).to_bytes(4, "little")]
+    for shared_key, nonce in recipients:
+        encrypted = crypto_aead_chacha20poly1305_ietf_encrypt(
+            packet_data, None, nonce, shared_key
+        )
+        packet_length = PACKET_LENGTH_SIZE + _NONCE_END + len(encrypted)
+        parts += (
+            packet_length.to_bytes(PACKET_LENGTH_SIZE, "little"),
+            _X25519_CHACHA20,
+            server_pubkey,
+            nonce,
+            encrypted,
+        )
+    return b"".join(parts)
+
+
+def parse_header(file_part: bytes) -> tuple[list[memoryview], int]:
+    """Split the header at the start of file_part into its packets and its length"""
+    if len(file_part) < PREAMBLE_SIZE:
+        raise ValueError("Header too small")
+    if file_part[:8] != _MAGIC_NUMBER:
+        raise ValueError("Not a CRYPT4GH formatted file")
+    if file_part[8:12] != _VERSION:
+        raise ValueError("Unsupported CRYPT4GH version")
+
+    view = memoryview(file_part)
+    packets = []
+    position = PREAMBLE_SIZE
+    for index in range(int.from_bytes(file_part[12:PREAMBLE_SIZE], "little")):
+        length_end = position + PACKET_LENGTH_SIZE
+        # the packet length includes the length field itself
+        length = int.from_bytes(view[position:length_end], "little")
+        length -= PACKET_LENGTH_SIZE
+        if length < 0:
+            raise ValueError(f"Invalid packet length {length}")
+        position = length_end + length
+        packet = view[length_end:position]
+        if len(packet) < length:
+            raise ValueError(f"Packet {index} too small")
+        packets.append(packet)
+    return packets, position
+
+
+def open_packets(
+    packets: list[memoryview], *, shared_key: bytes, client_pubkey: bytes
+) -> Optional[list[bytes]]:
+    """
+    Decrypt the packets sent by the client with the given key shared with it.
+    Returns the file secrets they contain, or None if none could be decrypted.
+    """
+    decrypted = []
+    for packet in packets:
+        if (
+            len(packet) < _MIN_PACKET_SIZE
+            or packet[:METHOD_SIZE] != _X25519_CHACHA20
+            or packet[METHOD_SIZE:_PUBKEY_END] != client_pubkey
+        ):
+            continue
+        try:
+            decrypted.append(
+                crypto_aead_chacha20poly1305_ietf_decrypt(
+                    bytes(packet[_NONCE_END:]),
+                    None,
+                    bytes(packet[_PUBKEY_END:_NONCE_END]),
+                    shared_key,
+                )
+            )
+        except CryptoError:
+            continue
+    if not decrypted:
+        return None
+    return _file_secrets(decrypted)
+
+
+def _file_secrets(packets: list[bytes]) -> list[bytes]:
+    """Extract the file secrets, validating the packets in the order crypt4gh does"""
+    data_packets = []
+    edit_list = None
+    for packet in packets:
+        packet_type = packet[:4]
+        if packet_type == _DATA_ENC:
+            data_packets.append(packet)
+        elif packet_type == _EDIT_LIST:
+            if edit_list is not None:
+                raise ValueError("Invalid file: Too many edit list packets")
+            edit_list = packet
+        else:
+            packet_type_number = int.from_bytes(packet_type, "little")
+            raise ValueError(f"Invalid packet type {packet_type_number}")
+
+    for packet in data_packets:
+        method = packet[4:8]
+        if method != _CHACHA20_IETF:
+            method_number = int.from_bytes(method, "little")
+            raise ValueError(f"Unsupported bulk encryption method: {method_number}")
+    if edit_list is not None:
+        lengths = int.from_bytes(edit_list[4:8], "little")
+        if len(edit_list) - 8 < 8 * lengths:
+            raise ValueError("Invalid edit list")
+    return [packet[8:] for packet in data_packets]
@@ -0,0 +1,235 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Server key material, decoded and validated once, with support for rotation"""
+
+import base64
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from nacl.bindings import (
+    crypto_kx_client_session_keys,
+    crypto_kx_PUBLIC_KEY_BYTES,
+    crypto_kx_server_session_keys,
+    crypto_scalarmult_base,
+    crypto_scalarmult_SCALARBYTES,
+)
+
+from ekss.cache import LRUCache
+from ekss.config import Config
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ServerKey:
+    """A server Crypt4GH key pair, identified by the fingerprint of its public key"""
+
+    private_key: bytes
+    public_key: bytes
+    fingerprint: str
+
+    @classmethod
+    def from_private_key(cls, private_key: bytes) -> "ServerKey":
+        """Validate the private key and derive the public key and fingerprint"""
+        if len(private_key) != crypto_scalarmult_SCALARBYTES:
+            raise ValueError("Invalid server private key")
+        public_key = crypto_scalarmult_base(private_key)
+        return cls(
+            private_key=private_key,
+            public_key=public_key,
+            fingerprint=key_fingerprint(public_key),
+        )
+
+
+def key_fingerprint(public_key: bytes) -> str:
+    """Short, stable identifier of a public key"""
+    return hashlib.sha256(public_key).hexdigest()[:16]
+
+
+def decode_public_keys(encoded_keys: Sequence[str]) -> list[bytes]:
+    """Decode base64 encoded Crypt4GH public keys, raising a ValueError if invalid"""
+    public_keys = [base64.b64decode(key) for key in encoded_keys]
+    if any(len(key) != crypto_kx_PUBLIC_KEY_BYTES for key in public_keys):
+        raise ValueError("Public keys must be 32 bytes long")
+    return public_keys
+
+
+def decode_private_keys(encoded_keys: Sequence[str]) -> list[bytes]:
+    """Decode base64 encoded private keys, skipping blank entries"""
+    return [base64.b64decode(key) for key in encoded_keys if key.strip()]
+
+
+class KeyRing:
+    """
+    Holds the current and any retired server keys.
+
+    New envelopes are always created with the current key. Envelopes are decrypted
+    with all keys, starting with the one that most recently succeeded. If a key file
+    is given, its keys replace the configured ones and it is read again when it has
+    changed, checked at most every `reload_interval` seconds, so that keys can be
+    rotated without restarting. The first key in the file is the current one.
+    """
+
+    def __init__(
+        self,
+        *,
+        private_keys: Sequence[bytes],
+        path: Optional[Path] = None,
+        reload_interval: float = 10,
+    ):
+        """Load and validate the given keys, the first one being the current key"""
+        self._path = path
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = time.monotonic()
+        self._load(private_keys)
+        if path is not None:
+            self._reload(path)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "KeyRing":
+        """Create a key ring from the configured keys and key file"""
+        return cls(**cls.arguments_from_config(config))
+
+    @staticmethod
+    def arguments_from_config(config: Config) -> dict[str, Any]:
+        """Picklable constructor arguments, e.g. to create key rings in pool workers"""
+        private_keys = decode_private_keys(
+            [config.server_private_key.get_secret_value()]
+            + [key.get_secret_value() for key in config.server_retired_private_keys]
+        )
+        current = ServerKey.from_private_key(private_keys[0])
+        if current.public_key != base64.b64decode(config.server_public_key):
+            raise ValueError("Server public key does not match the private key")
+        return {
+            "private_keys": private_keys,
+            "path": config.server_keyring_path,
+            "reload_interval": config.server_keyring_reload_interval,
+        }
+
+    def _load(self, private_keys: Sequence[bytes]):
+        if not private_keys:
+            raise ValueError("At least one server key is required")
+        keys = [ServerKey.from_private_key(key) for key in private_keys]
+        self._current = keys[0]
+        self._keys = {key.fingerprint: key for key in keys}
+        # most likely to decrypt first
+        self._order = list(self._keys.values())
+
+    def _reload(self, path: Path):
+        """Load the key file if it has been modified since it was last loaded"""
+        mtime = path.stat().st_mtime
+        if mtime != self._mtime:
+            self._load(decode_private_keys(path.read_text().splitlines()))
+            self._mtime = mtime
+
+    def _refresh(self):
+        if self._path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at >= self._reload_interval:
+            self._checked_at = now
+            try:
+                self._reload(self._path)
+            except (OSError, ValueError) as error:
+                log.warning("Keeping previous server keys, reload failed: %s", error)
+
+    @property
+    def current(self) -> ServerKey:
+        """The key used for new envelopes"""
+        with self._lock:
+            self._refresh()
+            return self._current
+
+    def get(self, fingerprint: str) -> Optional[ServerKey]:
+        """The key with the given fingerprint, if any"""
+        with self._lock:
+            self._refresh()
+            return self._keys.get(fingerprint)
+
+    def decryption_order(self) -> list[ServerKey]:
+        """All keys, starting with the one that most recently decrypted an envelope"""
+        with self._lock:
+            self._refresh()
+            return list(self._order)
+
+    def record_success(self, key: ServerKey):
+        """Try the given key first from now on"""
+        with self._lock:
+            if self._order[0] is not key and key in self._order:
+                self._order.remove(key)
+                self._order.insert(0, key)
+
+
+def _wipe(shared_key: bytearray):
+    shared_key[:] = bytes(len(shared_key))
+
+
+class SharedKeyCache:
+    """
+    Bounded cache of the X25519 keys shared between server keys and client keys.
+
+    Clients reuse their public key for many envelopes, so the key agreement, the
+    costly part of creating an envelope, can be skipped for repeated requests.
+    Entries are bound to the server key they were derived from. The cached copies are
+    overwritten with zeros when they are evicted or expire, and expired entries are
+    purged whenever a new key is cached. The keys handed out to callers are immutable
+    copies that cannot be wiped and stay in memory until they are garbage collected.
+    """
+
+    def __init__(self, *, max_entries: int, ttl: float):
+        """Configure size limit and time to live in seconds"""
+        self._cache: LRUCache[tuple[str, bytes, bool], bytearray] = LRUCache(
+            max_entries=max_entries, ttl=ttl, on_discard=_wipe
+        )
+        self.stats = self._cache.stats
+        # entries are wiped on eviction, so copying them out must not overlap with it
+        self._lock = threading.Lock()
+
+    def get(
+        self, server_key: ServerKey, client_pubkey: bytes, *, receive: bool = False
+    ) -> bytes:
+        """
+        The key for sending to the client with the given public key, or for receiving
+        from it. Crypt4GH derives these differently, so they are cached separately.
+        """
+        cache_key = (server_key.fingerprint, client_pubkey, receive)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return bytes(cached)
+        if receive:
+            shared_key, _ = crypto_kx_client_session_keys(
+                server_key.public_key, server_key.private_key, client_pubkey
+            )
+        else:
+            _, shared_key = crypto_kx_server_session_keys(
+                server_key.public_key, server_key.private_key, client_pubkey
+            )
+        with self._lock:
+            self._cache.put(cache_key, bytearray(shared_key))
+        return shared_key
+
+    def clear(self):
+        """Wipe all cached keys"""
+        with self._lock:
+            self._cache.clear()
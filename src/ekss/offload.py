@@ -0,0 +1,112 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Offloading of blocking work from the event loop to bounded worker pools"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Thrown when all workers are busy and the queue is full"""
+
+
+@dataclass
+class ExecutorStats:
+    """Counters describing the load of a BoundedExecutor"""
+
+    workers: int
+    max_queue_depth: int
+    queue_depth: int = 0
+    completed: int = 0
+    rejected: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    execution_total: float = 0.0
+
+    def record(self, *, wait: float, duration: float):
+        """Record a completed call"""
+        self.completed += 1
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+        self.execution_total += duration
+
+    def as_metrics(self) -> dict[str, float]:
+        """Flat representation including averages"""
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_seconds_avg": self.queue_wait_total / completed,
+            "queue_wait_seconds_max": self.queue_wait_max,
+            "execution_seconds_avg": self.execution_total / completed,
+        }
+
+
+def _run_timed(func: Callable[..., T], *args: Any) -> tuple[float, float, T]:
+    """Run func and report when it started and how long it took"""
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic() - started, result
+
+
+class BoundedExecutor:
+    """
+    Runs blocking callables on a worker pool without letting work pile up.
+
+    At most `max_queue_depth` calls wait for a free worker, further calls fail
+    immediately with an ExecutorSaturatedError. Queue wait and execution times are
+    recorded in `stats`. The callables must be picklable for process pools.
+    """
+
+    def __init__(self, executor: Executor, *, workers: int, max_queue_depth: int):
+        """Wrap an executor running the given number of workers"""
+        self._executor = executor
+        self._pending = 0
+        self.stats = ExecutorStats(workers=workers, max_queue_depth=max_queue_depth)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run func(*args) on the pool and wait for the result"""
+        stats = self.stats
+        if self._pending >= stats.workers + stats.max_queue_depth:
+            stats.rejected += 1
+            raise ExecutorSaturatedError()
+
+        self._pending += 1
+        stats.queue_depth = max(0, self._pending - stats.workers)
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        try:
+            started, duration, result = await loop.run_in_executor(
+                self._executor, _run_timed, func, *args
+            )
+        finally:
+            self._pending -= 1
+            stats.queue_depth = max(0, self._pending - stats.workers)
+
+        stats.record(wait=max(0.0, started - submitted), duration=duration)
+        return result
+
+    def shutdown(self):
+        """Shut down the underlying pool, waiting for running calls"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,153 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Backend-neutral interface of the stores that file secrets are kept in"""
+
+from collections.abc import Mapping, Sequence
+from typing import Optional, Protocol, Union
+
+
+class SecretStoreError(RuntimeError):
+    """Baseclass for errors encountered when interacting with a secret store"""
+
+
+class SecretInsertionError(SecretStoreError):
+    """Wrapper for errors encountered on secret insertion"""
+
+
+class SecretRetrievalError(SecretStoreError):
+    """Wrapper for errors encountered on secret retrieval"""
+
+
+class SecretDeletionError(SecretStoreError):
+    """Wrapper for errors encountered on secret deletion"""
+
+
+class StoreConnectionError(SecretStoreError):
+    """Wrapper for errors encountered when the store cannot be reached"""
+
+
+class StoreOverloadedError(SecretStoreError):
+    """Thrown when too many store requests are already waiting to be processed"""
+
+
+class SecretStore(Protocol):
+    """
+    Storage, retrieval and deletion of file secrets, as used by the API.
+    Missing secrets are reported with a SecretRetrievalError. Stores that do not
+    keep envelopes set `stores_envelopes` to False, so that callers can skip creating
+    and looking up envelopes that would be dropped anyway.
+    """
+
+    stores_envelopes: bool
+
+    async def new_secret(self) -> tuple[Optional[str], bytes]:
+        """
+        Create the secret of a new file. Stores deriving secrets from their IDs return
+        the ID as well, such secrets must not be passed to store_secret. Other stores
+        return None instead of an ID.
+        """
+        ...
+
+    async def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """
+        Store a new secret and return the ID it can be retrieved with.
+        Envelopes of the secret are stored next to it under the given envelope IDs.
+        """
+        ...
+
+    async def get_secret(self, *, key: str) -> bytes:
+        """Retrieve the secret with the given ID"""
+        ...
+
+    async def get_secrets(
+        self, *, keys: Sequence[str], concurrency: int
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """
+        Retrieve the secrets with the given IDs in their order, with as few round
+        trips as the store allows and at most `concurrency` of them at the same time.
+        Secrets that could not be retrieved are represented by the error raised.
+        """
+        ...
+
+    async def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """
+        Retrieve an envelope stored next to the secret with the given ID.
+        Returns None if the secret exists, but there is no such envelope.
+        """
+        ...
+
+    async def secret_exists(self, *, key: str) -> bool:
+        """Check whether a secret with the given ID is stored"""
+        ...
+
+    async def delete_secret(self, *, key: str) -> None:
+        """Delete the secret with the given ID"""
+        ...
+
+    async def close(self) -> None:
+        """Release all connections held by the store"""
+        ...
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        """Metrics of the store grouped by component"""
+        ...
+
+
+class SyncSecretStore(Protocol):
+    """
+    Blocking counterpart of SecretStore, for stores made available to the API through
+    a SyncStoreBridge. Batch reads are limited to `max_batch_size` secrets.
+    """
+
+    max_batch_size: int
+    stores_envelopes: bool
+
+    def new_secret(self) -> tuple[Optional[str], bytes]:
+        """Create the secret of a new file, see SecretStore"""
+        ...
+
+    def store_secret(
+        self, *, secret: bytes, envelopes: Optional[Mapping[str, bytes]] = None
+    ) -> str:
+        """Store a new secret and return the ID it can be retrieved with"""
+        ...
+
+    def get_secret(self, *, key: str) -> bytes:
+        """Retrieve the secret with the given ID"""
+        ...
+
+    def get_secrets(
+        self, *, keys: Sequence[str]
+    ) -> list[Union[bytes, SecretStoreError]]:
+        """Retrieve the secrets with the given IDs in their order, errors included"""
+        ...
+
+    def get_envelope(self, *, key: str, envelope_id: str) -> Optional[bytes]:
+        """Retrieve an envelope stored next to the secret, if there is one"""
+        ...
+
+    def secret_exists(self, *, key: str) -> bool:
+        """Check whether a secret with the given ID is stored"""
+        ...
+
+    def delete_secret(self, *, key: str) -> None:
+        """Delete the secret with the given ID"""
+        ...
+
+    def close(self) -> None:
+        """Release all connections held by the store"""
+        ...
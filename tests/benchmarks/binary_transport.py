@@ -0,0 +1,198 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare throughput and peak memory of the JSON and raw binary variants of the ingest
+and envelope endpoints, calling the ASGI app directly so that only the memory used
+by the service is measured.
+
+Run with: python -m tests.benchmarks.binary_transport [requests] [part_size_mib]
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections.abc import Iterator
+from typing import Any
+
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub
+
+CHUNK_SIZE = 64 * 1024
+
+
+def chunked(body: bytes) -> list[bytes]:
+    """Split a request body into chunks as received by a server"""
+    return [
+        body[start : start + CHUNK_SIZE] for start in range(0, len(body), CHUNK_SIZE)
+    ]
+
+
+async def call(
+    app: Any,
+    method: str,
+    path: str,
+    *,
+    headers: dict[str, str],
+    chunks: list[bytes],
+) -> tuple[int, bytes]:
+    """Send a request to the ASGI app, delivering the body chunks like a server"""
+    chunks = chunks or [b""]
+    messages: Iterator[dict[str, Any]] = iter(
+        {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    )
+    response: dict[str, Any] = {"body": b""}
+
+    async def receive() -> dict[str, Any]:
+        # the client stays connected until the response is complete
+        return next(messages, {}) or await asyncio.get_running_loop().create_future()
+
+    async def send(message: dict[str, Any]):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        else:
+            response["body"] += message.get("body", b"")
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (key.lower().encode(), value.encode()) for key, value in headers.items()
+        ],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    await app(scope, receive, send)
+    return response["status"], response["body"]
+
+
+async def measure(app: Any, requests: int, **request: Any) -> dict[str, float]:
+    """Time the given request and measure the peak memory of a single one"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        status, _ = await call(app, **request)
+        assert status == 200, status
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    await call(app, **request)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "requests/s": requests / elapsed,
+        "request KiB": sum(map(len, request["chunks"])) / 1024,
+        "peak KiB": peak / 1024,
+    }
+
+
+async def main(requests: int = 20, part_size_mib: int = 16):
+    """Print a comparison table"""
+    client_sk = PrivateKey.generate()
+    public_key = base64.b64encode(bytes(client_sk.public_key)).decode()
+    header = make_first_part(
+        client_private_key=bytes(client_sk), session_key=os.urandom(32)
+    )
+    first_part = header + os.urandom(part_size_mib * 1024**2 - len(header))
+
+    def json_query(file_part: bytes) -> list[bytes]:
+        file_part_b64 = base64.b64encode(file_part).decode()
+        query = {"file_part": file_part_b64, "public_key": public_key}
+        return chunked(json.dumps(query).encode())
+
+    with VaultStub() as stub:
+        config = stub.config()
+        app = setup_app(CONFIG)
+        app.dependency_overrides[config_injector] = lambda: config
+        json_headers = {"Content-Type": "application/json"}
+        binary_headers = {
+            "Content-Type": "application/octet-stream",
+            "Client-Public-Key": public_key,
+        }
+
+        _, body = await call(
+            app, "POST", "/secrets", headers=json_headers, chunks=json_query(header)
+        )
+        secret_id = json.loads(body)["secret_id"]
+        client_pk = base64.urlsafe_b64encode(bytes(client_sk.public_key)).decode()
+        envelope_path = f"/secrets/{secret_id}/envelopes/{client_pk}"
+
+        scenarios: dict[str, dict[str, Any]] = {
+            "ingest JSON (part)": {
+                "method": "POST",
+                "path": "/secrets",
+                "headers": json_headers,
+                "chunks": json_query(first_part),
+            },
+            "ingest JSON (header)": {
+                "method": "POST",
+                "path": "/secrets",
+                "headers": json_headers,
+                "chunks": json_query(header),
+            },
+            "ingest binary (part)": {
+                "method": "POST",
+                "path": "/secrets/stream",
+                "headers": binary_headers,
+                "chunks": chunked(first_part),
+            },
+            "ingest binary (header)": {
+                "method": "POST",
+                "path": "/secrets/stream",
+                "headers": binary_headers,
+                "chunks": chunked(header),
+            },
+            "envelope JSON": {
+                "method": "GET",
+                "path": envelope_path,
+                "headers": {},
+                "chunks": [],
+            },
+            "envelope binary": {
+                "method": "GET",
+                "path": envelope_path,
+                "headers": {"Accept": "application/octet-stream"},
+                "chunks": [],
+            },
+        }
+        results = {
+            name: await measure(app, requests, **request)
+            for name, request in scenarios.items()
+        }
+        await app.state.vault.close()
+
+    columns = list(next(iter(results.values())))
+    print(f"{'':24}" + "".join(f"{column:>14}" for column in columns))
+    for name, row in results.items():
+        print(f"{name:24}" + "".join(f"{row[column]:>14.1f}" for column in columns))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,83 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare how envelope throughput scales with the number of workers for the inline,
+thread pool and process pool crypto executors.
+
+Run with: python -m tests.benchmarks.crypto_scaling [operations]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import create_crypto
+from ekss.config import CONFIG
+from ekss.core.crypto import CryptoExecutor
+from ekss.core.envelope_decryption import extract_envelope_content
+from ekss.core.envelope_encryption import create_envelope
+from tests.fixtures.file import make_first_part
+
+
+async def run_operations(crypto: CryptoExecutor, *, operations: int) -> float:
+    """Decrypt and re-encrypt envelopes concurrently and return operations per second"""
+    client_sk = PrivateKey.generate()
+    client_pubkey = bytes(client_sk.public_key)
+    file_part = make_first_part(
+        client_private_key=bytes(client_sk), session_key=os.urandom(32)
+    )
+
+    async def operation():
+        secret, _ = await extract_envelope_content(
+            file_part=file_part, client_pubkey=client_pubkey, crypto=crypto
+        )
+        await create_envelope(
+            file_secret=secret, client_pubkey=client_pubkey, crypto=crypto
+        )
+
+    await operation()  # start up the pool
+    start = time.perf_counter()
+    await asyncio.gather(*(operation() for _ in range(operations)))
+    return operations / (time.perf_counter() - start)
+
+
+async def main(operations: int = 2000):
+    """Print envelope round trips per second by executor and number of workers"""
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    print(
+        f"{'ops/s by workers':18}" + "".join(f"{count:>10}" for count in worker_counts)
+    )
+    for mode in ("inline", "thread", "process"):
+        row = []
+        for workers in worker_counts:
+            config = CONFIG.model_copy(
+                update={
+                    "crypto_executor": mode,
+                    "crypto_workers": workers,
+                    "crypto_max_queue": 2 * operations,
+                }
+            )
+            crypto = create_crypto(config)
+            row.append(await run_operations(crypto, operations=operations))
+            crypto.shutdown()
+        print(f"{mode:18}" + "".join(f"{value:>10.0f}" for value in row))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,95 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare envelope operations per second of the libsodium and crypt4gh codecs, with
+and without cached shared keys.
+
+Run with: python -m tests.benchmarks.envelope_codec [seconds per measurement]
+"""
+
+import io
+import os
+import sys
+import timeit
+from functools import partial
+from typing import Callable
+
+import crypt4gh.header
+from nacl.public import PrivateKey
+
+from ekss.config import CONFIG
+from ekss.core import crypto
+from ekss.core.envelope_decryption import decrypt_envelope
+from ekss.core.envelope_encryption import seal_envelope
+from ekss.core.header_codec import parse_header
+from tests.fixtures.file import make_first_part
+
+
+def parse_with_crypt4gh(file_part: bytes) -> list[bytes]:
+    """Split the header into packets as crypt4gh.header.deconstruct does"""
+    return list(crypt4gh.header.parse(io.BytesIO(file_part)))
+
+
+def ops_per_second(operation: Callable[[], object], seconds: float) -> float:
+    """Report the best rate of five runs of about a fifth of the given time each"""
+    timer = timeit.Timer(operation)
+    number, elapsed = timer.autorange()
+    runs = max(1, int(seconds / 5 / (elapsed / number)))
+    return runs / min(timer.repeat(repeat=5, number=runs))
+
+
+def main(seconds: float = 1.0):
+    """Print operations per second by codec and shared key cache size"""
+    client_sk = PrivateKey.generate()
+    client_pubkey = bytes(client_sk.public_key)
+    file_secret = os.urandom(32)
+    file_part = make_first_part(
+        client_private_key=bytes(client_sk), session_key=file_secret
+    )
+    operations: dict[str, Callable[[], object]] = {
+        "parse header": lambda: None,
+        "decrypt envelope": lambda: decrypt_envelope(
+            file_part=file_part, client_pubkey=client_pubkey
+        ),
+        "seal envelope": lambda: seal_envelope(
+            file_secret=file_secret, client_pubkey=client_pubkey
+        ),
+    }
+
+    print(f"{'ops/s':40}" + "".join(f"{name:>18}" for name in operations))
+    for cache_size in (0, CONFIG.crypto_shared_key_cache_size):
+        for codec in ("crypt4gh", "libsodium"):
+            crypto.setup_process(
+                crypto.process_arguments(
+                    CONFIG.model_copy(
+                        update={
+                            "crypto_envelope_codec": codec,
+                            "crypto_shared_key_cache_size": cache_size,
+                        }
+                    )
+                )
+            )
+            parse = parse_with_crypt4gh if codec == "crypt4gh" else parse_header
+            operations["parse header"] = partial(parse, file_part)
+            rates = [
+                ops_per_second(operation, seconds) for operation in operations.values()
+            ]
+            label = f"{codec}, shared key cache size {cache_size}"
+            print(f"{label:40}" + "".join(f"{rate:>18.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main(*map(float, sys.argv[1:]))
@@ -0,0 +1,96 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare operations per second and Vault round trips per operation of the KV v1 and
+v2 secrets engines, for both vault clients, against a local Vault stub. The stub adds
+the given latency in milliseconds to every request to emulate the network.
+
+Run with: python -m tests.benchmarks.kv_versions [operations] [latency]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import Callable
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.ports.outbound.secret_store import SecretStore
+from tests.fixtures.vault_stub import VaultStub
+
+OPERATIONS = ["store", "get", "exists", "delete"]
+
+
+async def measure(
+    store: SecretStore, stub: VaultStub, *, operations: int
+) -> dict[str, tuple[float, float]]:
+    """Operations per second and round trips per operation, by operation"""
+    secret_ids: list[str] = []
+
+    async def store_secret(_: int):
+        secret_ids.append(await store.store_secret(secret=os.urandom(32)))
+
+    async def get_secret(index: int):
+        await store.get_secret(key=secret_ids[index])
+
+    async def secret_exists(index: int):
+        await store.secret_exists(key=secret_ids[index])
+
+    async def delete_secret(index: int):
+        await store.delete_secret(key=secret_ids[index])
+
+    results = {}
+    calls: list[Callable] = [store_secret, get_secret, secret_exists, delete_secret]
+    for name, operation in zip(OPERATIONS, calls):
+        stub.reset_counters()
+        start = time.perf_counter()
+        for index in range(operations):
+            await operation(index)
+        elapsed = time.perf_counter() - start
+        results[name] = (operations / elapsed, stub.round_trips / operations)
+    return results
+
+
+async def main(operations: int = 500, latency: float = 0.5):
+    """Print operations per second and round trips per operation"""
+    print(f"{'ops/s (round trips/op)':24}" + "".join(f"{op:>16}" for op in OPERATIONS))
+    with VaultStub(latency=latency / 1000) as stub:
+        for client in ("hvac", "async"):
+            for version in (2, 1):
+                mount = stub.kv1_mount if version == 1 else "secret"
+                store = create_vault(
+                    stub.config(
+                        vault_client=client,
+                        vault_kv_version=version,
+                        vault_secrets_mount_point=mount,
+                        vault_coalesce_reads=False,
+                        vault_secret_cache_size=0,
+                    )
+                )
+                # log in before measuring
+                await store.secret_exists(key="warm-up")
+                results = await measure(store, stub, operations=operations)
+                await store.close()
+                cells = "".join(
+                    f"{f'{rate:.0f} ({trips:.1f})':>16}"
+                    for rate, trips in results.values()
+                )
+                print(f"{f'{client}, KV v{version}':24}" + cells)
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    asyncio.run(main(*(cast(value) for cast, value in zip((int, float), arguments))))
@@ -0,0 +1,98 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare operations per second of all secret store backends, with requests made one
+at a time and concurrently. Vault backends talk to a local stub without latency, so
+a real Vault adds its network and processing time on top.
+
+Run with: python -m tests.benchmarks.secret_stores [operations] [concurrency]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable
+from pathlib import Path
+from typing import Callable
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.ports.outbound.secret_store import SecretStore
+from tests.fixtures.secret_stores import BACKENDS, add_secret, backend_config
+from tests.fixtures.vault_stub import VaultStub
+
+
+async def ops_per_second(
+    operation: Callable[[int], Awaitable[object]], *, operations: int, concurrency: int
+) -> float:
+    """Run the operation for indices 0 to operations - 1, concurrency at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int):
+        async with semaphore:
+            await operation(index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*map(run, range(operations)))
+    return operations / (time.perf_counter() - start)
+
+
+async def measure(
+    store: SecretStore, *, operations: int, concurrency: int
+) -> list[float]:
+    """Operations per second for storing, reading and checking secrets"""
+    secret_ids: list[str] = []
+
+    async def store_secret(_: int):
+        secret_ids.append((await add_secret(store))[0])
+
+    async def get_secret(index: int):
+        await store.get_secret(key=secret_ids[index])
+
+    async def secret_exists(index: int):
+        await store.secret_exists(key=secret_ids[index])
+
+    return [
+        await ops_per_second(operation, operations=operations, concurrency=concurrency)
+        for operation in (store_secret, get_secret, secret_exists)
+    ]
+
+
+async def main(operations: int = 1000, concurrency: int = 16):
+    """Print operations per second by backend"""
+    columns = ["store", "get", "exists"]
+    print(f"{'ops/s':32}" + "".join(f"{column:>12}" for column in columns))
+    with VaultStub() as stub, tempfile.TemporaryDirectory() as directory:
+        for backend in BACKENDS:
+            for parallel in (1, concurrency):
+                config = backend_config(
+                    backend,
+                    stub=stub,
+                    directory=Path(directory) / f"{backend}-{parallel}",
+                    vault_offload_threads=parallel if parallel > 1 else 0,
+                )
+                config.sqlite_path.parent.mkdir()
+                store = create_vault(config)
+                rates = await measure(
+                    store, operations=operations, concurrency=parallel
+                )
+                await store.close()
+                label = f"{backend}, {parallel} at a time"
+                print(f"{label:32}" + "".join(f"{rate:>12.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,85 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare the blocking hvac path, the hvac path offloaded to threads and the
+non-blocking async vault adapter when many envelope requests wait for the vault at
+the same time on one event loop.
+
+Run with: python -m tests.benchmarks.vault_concurrency [requests] [latency_ms]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.ports.outbound.secret_store import SecretStore
+from tests.fixtures.vault_stub import VaultStub
+
+
+async def measure_loop_lag(stop: asyncio.Event) -> float:
+    """Track the longest time the event loop was unable to run other tasks"""
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+    return max_lag
+
+
+async def run_concurrently(vault: SecretStore, *, requests: int) -> dict[str, float]:
+    """Read one secret with the given number of concurrent requests"""
+    secret_id = await vault.store_secret(secret=os.urandom(32))
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(vault.get_secret(key=secret_id) for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await vault.close()
+    return {
+        "requests/s": requests / elapsed,
+        "total s": elapsed,
+        "max loop stall ms": 1000 * await lag,
+    }
+
+
+async def main(requests: int = 200, latency_ms: float = 10):
+    """Print a comparison table"""
+    with VaultStub(latency=latency_ms / 1000) as stub:
+        # every request reads from the vault, as if they were for different secrets
+        configs = {
+            "hvac (blocking)": stub.config(vault_coalesce_reads=False),
+            "hvac (16 threads)": stub.config(
+                vault_offload_threads=16,
+                vault_offload_max_queue=requests,
+                vault_coalesce_reads=False,
+            ),
+            "async": stub.config(vault_client="async", vault_coalesce_reads=False),
+        }
+        results = {
+            name: await run_concurrently(create_vault(config), requests=requests)
+            for name, config in configs.items()
+        }
+    columns = list(next(iter(results.values())))
+    print(f"{'':18}" + "".join(f"{column:>20}" for column in columns))
+    for name, row in results.items():
+        print(f"{name:18}" + "".join(f"{row[column]:>20.2f}" for column in columns))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(*[int(args[0])] if args else [], *map(float, args[1:])))
@@ -0,0 +1,74 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare Vault round trips and connections per API request for a VaultAdapter created
+per request against the long-lived pooled adapter shared by a worker.
+
+Run with: python -m tests.benchmarks.vault_round_trips [requests]
+"""
+
+import os
+import sys
+import time
+
+from ekss.adapters.outbound.vault import VaultAdapter
+from tests.fixtures.vault_stub import VaultStub
+
+
+def run_requests(stub: VaultStub, *, requests: int, shared: bool) -> dict[str, float]:
+    """Simulate API requests alternately storing and reading back a secret"""
+    config = stub.config()
+    shared_vault = VaultAdapter(config=config)
+    stub.reset_counters()
+    start = time.perf_counter()
+    secret_id = ""
+    for index in range(requests):
+        vault = shared_vault if shared else VaultAdapter(config=config)
+        if index % 2:
+            vault.get_secret(key=secret_id)
+        else:
+            secret_id = vault.store_secret(secret=os.urandom(32))
+        if not shared:
+            vault.close()
+    elapsed = time.perf_counter() - start
+    shared_vault.close()
+    return {
+        "round trips/request": stub.round_trips / requests,
+        "logins/request": stub.requests["login"] / requests,
+        "connections/request": stub.connections / requests,
+        "ms/request": 1000 * elapsed / requests,
+    }
+
+
+def main(requests: int = 500):
+    """Print a comparison table"""
+    with VaultStub() as stub:
+        results = {
+            "adapter per request": run_requests(stub, requests=requests, shared=False),
+            "pooled adapter": run_requests(stub, requests=requests, shared=True),
+        }
+    columns = list(next(iter(results.values())))
+    print(f"{'':22}" + "".join(f"{column:>22}" for column in columns))
+    for name, row in results.items():
+        print(f"{name:22}" + "".join(f"{row[column]:>22.3f}" for column in columns))
+    print()
+    per_request, pooled = results.values()
+    for column in ("round trips/request", "logins/request", "connections/request"):
+        saved = per_request[column] - pooled[column]
+        print(f"{column.split('/')[0]} saved per API request: {saved:.3f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -18,7 +18,9 @@ import base64
 import io
 from collections.abc import AsyncGenerator
 from dataclasses import dataclass
+from typing import Optional
 
+import crypt4gh.header
 import crypt4gh.lib
 import pytest_asyncio
 from ghga_service_commons.utils import temp_files
@@ -43,6 +45,20 @@ class FirstPartFixture:
     vault: VaultFixture
 
 
+def make_first_part(
+    *,
+    client_private_key: bytes,
+    session_key: bytes,
+    body: bytes = b"",
+    server_pubkey: Optional[bytes] = None,
+) -> bytes:
+    """Assemble a Crypt4GH header for the server, followed by the given body bytes"""
+    server_pubkey = server_pubkey or base64.b64decode(CONFIG.server_public_key)
+    keys = [(0, client_private_key, server_pubkey)]
+    packet = crypt4gh.header.make_packet_data_enc(0, session_key)
+    return crypt4gh.header.serialize(crypt4gh.header.encrypt(packet, keys)) + body
+
+
 @pytest_asyncio.fixture
 async def first_part_fixture(
     *,
@@ -0,0 +1,85 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Every secret store backend, for conformance tests and benchmarks"""
+
+import base64
+import os
+from collections.abc import AsyncGenerator, Mapping
+from pathlib import Path
+from typing import Optional
+
+import pytest_asyncio
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.config import SecretStoreConfig
+from ekss.ports.outbound.secret_store import SecretStore
+from tests.fixtures.vault_stub import VaultStub
+
+BACKENDS = [
+    "vault-hvac",
+    "vault-async",
+    "vault-hvac-kv1",
+    "vault-async-kv1",
+    "sqlite",
+    "wrapped",
+    "transit",
+    "derived",
+]
+
+
+def backend_config(
+    backend: str, *, stub: VaultStub, directory: Path, **kwargs
+) -> SecretStoreConfig:
+    """
+    Config for the given backend without decorators, using the stub for Vault and
+    the given directory for local files, with further settings passed as kwargs
+    """
+    return stub.config(
+        storage_backend=backend if not backend.startswith("vault") else "vault",
+        vault_client="async" if backend.startswith("vault-async") else "hvac",
+        vault_kv_version=1 if backend.endswith("-kv1") else 2,
+        vault_secrets_mount_point=stub.kv1_mount
+        if backend.endswith("-kv1")
+        else "secret",
+        sqlite_path=directory / "secrets.sqlite3",
+        sqlite_key_encryption_key=base64.b64encode(os.urandom(32)).decode(),
+        wrapped_key_encryption_keys={1: base64.b64encode(os.urandom(32)).decode()},
+        derived_master_keys={1: base64.b64encode(os.urandom(32)).decode()},
+        revocation_path=directory / "revocations.bin",
+        **{"vault_coalesce_reads": False, "vault_secret_cache_size": 0, **kwargs},
+    )
+
+
+async def add_secret(
+    store: SecretStore, *, envelopes: Optional[Mapping[str, bytes]] = None
+) -> tuple[str, bytes]:
+    """Create and store a new secret like the API does, returning its ID and value"""
+    secret_id, secret = await store.new_secret()
+    if secret_id is None:
+        secret_id = await store.store_secret(secret=secret, envelopes=envelopes)
+    return secret_id, secret
+
+
+@pytest_asyncio.fixture(params=BACKENDS)
+async def secret_store(
+    request, tmp_path: Path
+) -> AsyncGenerator[tuple[SecretStoreConfig, SecretStore], None]:
+    """Each secret store backend along with its config"""
+    with VaultStub() as stub:
+        config = backend_config(request.param, stub=stub, directory=tmp_path)
+        store = create_vault(config)
+        yield config, store
+        await store.close()
@@ -22,8 +22,8 @@ import hvac
 import pytest
 from testcontainers.general import DockerContainer
 
-from ekss.adapters.inbound.fastapi_.deps import VaultConfig
 from ekss.adapters.outbound.vault.client import VaultAdapter
+from ekss.config import SecretStoreConfig
 
 VAULT_URL = "http://0.0.0.0:8200"
 VAULT_NAMESPACE = "vault"
@@ -36,7 +36,7 @@ class VaultFixture:
     """Contains initialized vault client"""
 
     adapter: VaultAdapter
-    config: VaultConfig
+    config: SecretStoreConfig
 
 
 @pytest.fixture
@@ -52,7 +52,7 @@ def vault_fixture() -> Generator[VaultFixture, None, None]:
         host = vault_container.get_container_host_ip()
         port = vault_container.get_exposed_port(VAULT_PORT)
         role_id, secret_id = configure_vault(host=host, port=int(port))
-        config = VaultConfig(
+        config = SecretStoreConfig(
             vault_url=f"http://{host}:{port}",
             vault_role_id=role_id,
             vault_secret_id=secret_id,
@@ -82,7 +82,7 @@ def configure_vault(*, host: str, port: int):
         capabilities = ["read", "create"]
     }
     path "secret/metadata/ekss/*" {
-        capabilities = ["delete"]
+        capabilities = ["read", "delete"]
     }
     """
 
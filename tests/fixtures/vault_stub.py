@@ -0,0 +1,266 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+In-process stand-in for the parts of the HashiCorp Vault HTTP API used by the EKSS.
+
+Used by tests and benchmarks that need to count round trips and connections or that
+should run without a Vault container.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Generator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import urlparse
+from uuid import uuid4
+
+import pytest
+from pydantic import SecretStr
+
+from ekss.config import SecretStoreConfig
+
+
+class VaultStub:
+    """
+    Threaded HTTP server emulating AppRole/Kubernetes auth, a KV v2 engine and the
+    encrypt and decrypt endpoints of a Transit engine. Paths of other mounts than
+    `kv1_mount` are treated as KV v2 paths, those of `kv1_mount` as KV v1 paths.
+    """
+
+    kv1_mount = "kv"
+
+    def __init__(self, *, token_ttl: int = 3600, latency: float = 0.0):
+        """Configure token lifetime and artificial latency per request in seconds"""
+        self.token_ttl = token_ttl
+        self.latency = latency
+        self.failing_logins = 0
+        self.secrets: dict[str, dict[str, Any]] = {}
+        self.ciphertexts: dict[str, str] = {}
+        self.tokens: dict[str, float] = {}
+        self.requests: Counter[str] = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _VaultStubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self  # type: ignore [attr-defined]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running stub"""
+        port = self._server.server_address[1]
+        return f"http://127.0.0.1:{port}"
+
+    @property
+    def round_trips(self) -> int:
+        """Total number of requests handled so far"""
+        return sum(self.requests.values())
+
+    def config(self, **kwargs) -> SecretStoreConfig:
+        """Create a config pointing at this stub"""
+        return SecretStoreConfig(
+            vault_url=self.url,
+            vault_role_id=SecretStr("stub-role"),
+            vault_secret_id=SecretStr("stub-secret"),
+            vault_path="ekss",
+            **kwargs,
+        )
+
+    def reset_counters(self):
+        """Reset request and connection counters"""
+        with self._lock:
+            self.requests.clear()
+            self.connections = 0
+
+    def revoke_tokens(self):
+        """Invalidate all tokens issued so far"""
+        with self._lock:
+            self.tokens.clear()
+
+    def start(self):
+        """Start serving in a background thread"""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        """Start the stub on entering the context"""
+        return self.start()
+
+    def __exit__(self, *_):
+        """Stop the stub on leaving the context"""
+        self.stop()
+
+    def issue_token(self, token: Optional[str] = None) -> dict[str, Any]:
+        """Create or extend a token and return the auth block of a login response"""
+        token = token or f"hvs.{uuid4().hex}"
+        with self._lock:
+            self.tokens[token] = time.monotonic() + self.token_ttl
+        return {
+            "client_token": token,
+            "lease_duration": self.token_ttl,
+            "renewable": True,
+        }
+
+    def token_valid(self, token: Optional[str]) -> bool:
+        """Check whether the given token was issued and has not expired"""
+        with self._lock:
+            expiry = self.tokens.get(token or "")
+        return expiry is not None and expiry > time.monotonic()
+
+    def count(self, operation: str):
+        """Record a handled request"""
+        with self._lock:
+            self.requests[operation] += 1
+
+    def count_connection(self):
+        """Record a new client connection"""
+        with self._lock:
+            self.connections += 1
+
+
+class _VaultStubHandler(BaseHTTPRequestHandler):
+    """Dispatches Vault API calls to the state of the VaultStub serving them"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def stub(self) -> VaultStub:
+        """The stub owning the server"""
+        return self.server.stub  # type: ignore [attr-defined]
+
+    def setup(self):
+        """Count every new client connection"""
+        super().setup()
+        self.stub.count_connection()
+
+    def log_message(self, format, *args):
+        """Keep test output clean"""
+
+    def _reply(self, status: int, body: Optional[dict[str, Any]] = None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _dispatch(self):
+        body = self._body()
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        path = urlparse(self.path).path.removeprefix("/v1/")
+        token = self.headers.get("X-Vault-Token")
+        if path in ("auth/approle/login", "auth/kubernetes/login"):
+            self.stub.count("login")
+            if self.stub.failing_logins > 0:
+                self.stub.failing_logins -= 1
+                return self._reply(503, {"errors": ["vault is sealed"]})
+            return self._reply(200, {"auth": self.stub.issue_token()})
+        if not self.stub.token_valid(token):
+            self.stub.count("forbidden")
+            return self._reply(403, {"errors": ["permission denied"]})
+        if path == "auth/token/lookup-self":
+            self.stub.count("lookup")
+            return self._reply(200, {"data": {"ttl": self.stub.token_ttl}})
+        if path == "auth/token/renew-self":
+            self.stub.count("renew")
+            return self._reply(200, {"auth": self.stub.issue_token(token)})
+        mount, kind, secret_path = path.split("/", 2)
+        if mount == self.stub.kv1_mount:
+            return self._kv1(path=path, body=body)
+        if kind in ("encrypt", "decrypt"):
+            return self._transit(kind=kind, body=body)
+        return self._kv2(kind=kind, path=f"{mount}/{secret_path}", body=body)
+
+    def _kv1(self, *, path: str, body: dict[str, Any]):
+        self.stub.count(f"{self.command.lower()} kv1")
+        secrets = self.stub.secrets
+        if self.command in ("POST", "PUT"):
+            secrets[path] = body
+            return self._reply(204)
+        if self.command == "DELETE":
+            # like Vault, deleting succeeds even if nothing is stored
+            secrets.pop(path, None)
+            return self._reply(204)
+        if path not in secrets:
+            return self._reply(404, {"errors": []})
+        return self._reply(200, {"data": secrets[path]})
+
+    def _kv2(self, *, kind: str, path: str, body: dict[str, Any]):
+        self.stub.count(f"{self.command.lower()} {kind}")
+        secrets = self.stub.secrets
+        if kind == "data" and self.command in ("POST", "PUT"):
+            if body.get("options", {}).get("cas") == 0 and path in secrets:
+                return self._reply(400, {"errors": ["check-and-set mismatch"]})
+            secrets[path] = body["data"]
+            return self._reply(200, {"data": {"version": 1}})
+        if kind == "metadata" and self.command == "DELETE":
+            # like Vault, deleting metadata succeeds even if nothing is stored
+            secrets.pop(path, None)
+            return self._reply(204)
+        if path not in secrets:
+            return self._reply(404, {"errors": []})
+        if kind == "data" and self.command == "GET":
+            return self._reply(200, {"data": {"data": secrets[path]}})
+        if kind == "metadata" and self.command == "GET":
+            return self._reply(200, {"data": {"current_version": 1}})
+        return self._reply(405, {"errors": ["unsupported"]})
+
+    def _transit(self, *, kind: str, body: dict[str, Any]):
+        self.stub.count(f"{kind} transit")
+        ciphertexts = self.stub.ciphertexts
+        if kind == "encrypt":
+            ciphertext = "vault:v1:" + base64.b64encode(os.urandom(28)).decode()
+            with self.stub._lock:
+                ciphertexts[ciphertext] = body["plaintext"]
+            return self._reply(200, {"data": {"ciphertext": ciphertext}})
+        results: list[dict[str, str]] = []
+        for item in body.get("batch_input") or [body]:
+            plaintext = ciphertexts.get(item["ciphertext"])
+            if plaintext is None:
+                results.append({"error": "cipher: message authentication failed"})
+            else:
+                results.append({"plaintext": plaintext})
+        failed = any("error" in result for result in results)
+        if "batch_input" not in body:
+            if failed:
+                return self._reply(400, {"errors": [results[0]["error"]]})
+            return self._reply(200, {"data": results[0]})
+        status = body.get("partial_failure_response_code", 400) if failed else 200
+        return self._reply(status, {"data": {"batch_results": results}})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch  # noqa: N815
+
+
+@pytest.fixture
+def vault_stub() -> Generator[VaultStub, None, None]:
+    """Run a VaultStub for the duration of a test"""
+    with VaultStub() as stub:
+        yield stub
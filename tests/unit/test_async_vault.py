@@ -0,0 +1,76 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the non-blocking vault adapter"""
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.adapters.outbound.vault import AsyncVaultAdapter, SecretRetrievalError
+from ekss.config import CONFIG
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.asyncio
+async def test_connection(vault_stub: VaultStub):  # noqa: F811
+    """Test storage, retrieval and deletion of secrets"""
+    adapter = AsyncVaultAdapter(config=vault_stub.config())
+    secret = os.urandom(32)
+    secret2 = os.urandom(32)
+    secret_id = await adapter.store_secret(secret=secret)
+    secret2_id = await adapter.store_secret(secret=secret2)
+
+    assert await adapter.get_secret(key=secret_id) == secret
+
+    await adapter.delete_secret(key=secret_id)
+    with pytest.raises(SecretRetrievalError):
+        await adapter.get_secret(key=secret_id)
+    with pytest.raises(SecretRetrievalError):
+        await adapter.delete_secret(key=secret_id)
+
+    assert await adapter.get_secret(key=secret2_id) == secret2
+    await adapter.close()
+
+    assert vault_stub.requests["login"] == 1
+    assert vault_stub.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_reauthenticate_on_forbidden(vault_stub: VaultStub):  # noqa: F811
+    """Test that a rejected token leads to exactly one new login and a retry"""
+    adapter = AsyncVaultAdapter(config=vault_stub.config())
+    secret = os.urandom(32)
+    secret_id = await adapter.store_secret(secret=secret)
+    vault_stub.revoke_tokens()
+
+    assert await adapter.get_secret(key=secret_id) == secret
+    await adapter.close()
+
+    assert vault_stub.requests["login"] == 2
+
+
+def test_selected_in_config(vault_stub: VaultStub):  # noqa: F811
+    """Test that the app uses the async adapter if configured"""
+    app = setup_app(CONFIG)
+    config = vault_stub.config(vault_client="async", vault_coalesce_reads=False)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.delete("/secrets/missing")
+        assert response.status_code == 404
+        assert isinstance(app.state.vault, AsyncVaultAdapter)
@@ -0,0 +1,154 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the batch envelope endpoint"""
+
+import asyncio
+import base64
+import io
+import os
+import socket
+
+import crypt4gh.header
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_vault
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.core import envelope_encryption
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_batch_envelopes(vault_stub: VaultStub):  # noqa: F811
+    """Test that envelopes are returned per item, including errors"""
+    config = vault_stub.config(vault_batch_concurrency=4)
+    vault = create_vault(config)
+    secrets = [os.urandom(32) for _ in range(10)]
+    secret_ids = [asyncio.run(vault.store_secret(secret=secret)) for secret in secrets]
+    client_sk = PrivateKey.generate()
+    app = setup_app(CONFIG)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/envelopes",
+            json={
+                "secret_ids": [*secret_ids, "missing"],
+                "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+            },
+        )
+
+    assert response.status_code == 200
+    *envelopes, missing = response.json()["envelopes"]
+    assert missing == {
+        "secret_id": "missing",
+        "content": None,
+        "error": "secretNotFoundError",
+    }
+    for secret_id, secret, envelope in zip(secret_ids, secrets, envelopes):
+        assert envelope["secret_id"] == secret_id
+        session_keys, _ = crypt4gh.header.deconstruct(
+            infile=io.BytesIO(base64.b64decode(envelope["content"])),
+            keys=[(0, bytes(client_sk), None)],
+            sender_pubkey=base64.b64decode(CONFIG.server_public_key),
+        )
+        assert session_keys == [secret]
+
+
+def test_sealing_off_event_loop(
+    vault_stub: VaultStub,  # noqa: F811
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that all envelopes are sealed in one call off the event loop"""
+    calls: list[tuple[int, bool]] = []
+    seal_batch = envelope_encryption.seal_batch
+
+    def recording_seal_batch(**kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop = True
+        except RuntimeError:
+            on_event_loop = False
+        calls.append((len(kwargs["file_secrets"]), on_event_loop))
+        return seal_batch(**kwargs)
+
+    monkeypatch.setattr(envelope_encryption, "seal_batch", recording_seal_batch)
+    config = vault_stub.config()
+    vault = create_vault(config)
+    secret_ids = [
+        asyncio.run(vault.store_secret(secret=os.urandom(32))) for _ in range(5)
+    ]
+    app = setup_app(CONFIG)
+    assert CONFIG.crypto_executor == "inline"
+    app.dependency_overrides[config_injector] = lambda: config
+    client_sk = PrivateKey.generate()
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/envelopes",
+            json={
+                "secret_ids": [*secret_ids, "missing"],
+                "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+            },
+        )
+
+    assert response.status_code == 200
+    assert calls == [(5, False)]
+
+
+def test_invalid_public_key(vault_stub: VaultStub):  # noqa: F811
+    """Test that an invalid public key fails the whole batch"""
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/envelopes",
+            json={"secret_ids": ["some_id"], "public_key": "dG9vIHNob3J0"},
+        )
+
+    assert response.status_code == 400
+    assert response.json()["exception_id"] == "invalidPublicKeyError"
+    assert vault_stub.requests["get data"] == 0
+
+
+@pytest.mark.parametrize("vault_client", ["hvac", "async"])
+def test_vault_unreachable(vault_client: str, vault_stub: VaultStub):  # noqa: F811
+    """Test that an unreachable vault is reported per item by both clients"""
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    app = setup_app(CONFIG)
+    config = vault_stub.config(
+        vault_client=vault_client, vault_login_attempts=1
+    ).model_copy(update={"vault_url": f"http://127.0.0.1:{port}"})
+    app.dependency_overrides[config_injector] = lambda: config
+    client_sk = PrivateKey.generate()
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/envelopes",
+            json={
+                "secret_ids": ["first", "second"],
+                "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+            },
+        )
+
+    assert response.status_code == 200
+    assert [item["error"] for item in response.json()["envelopes"]] == [
+        "vaultConnectionError"
+    ] * 2
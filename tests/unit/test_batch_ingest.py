@@ -0,0 +1,115 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the batch variant of POST /secrets"""
+
+import asyncio
+import base64
+import os
+
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+from pytest import MonkeyPatch
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.core import envelope_decryption
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_batch_ingest(vault_stub: VaultStub):  # noqa: F811
+    """Test that envelopes are processed per item, including errors"""
+    client_sk = PrivateKey.generate()
+    public_key = base64.b64encode(bytes(client_sk.public_key)).decode()
+    session_keys = [os.urandom(32) for _ in range(10)]
+    items = [
+        {
+            "file_part": base64.b64encode(
+                make_first_part(
+                    client_private_key=bytes(client_sk),
+                    session_key=session_key,
+                    body=b"content",
+                )
+            ).decode(),
+            "public_key": public_key,
+        }
+        for session_key in session_keys
+    ]
+    malformed = {
+        "file_part": base64.b64encode(b"no header").decode(),
+        "public_key": public_key,
+    }
+    app = setup_app(CONFIG)
+    config = vault_stub.config(vault_batch_concurrency=4)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post("/secrets/batch", json={"items": [*items, malformed]})
+
+    assert response.status_code == 200
+    *results, error = response.json()["results"]
+    assert error["error"] == "malformedOrMissingEnvelopeError"
+    assert error["secret_id"] is None
+    assert vault_stub.requests["post data"] == len(session_keys)
+    assert len({result["secret_id"] for result in results}) == len(session_keys)
+    for session_key, result in zip(session_keys, results):
+        assert result["error"] is None
+        assert base64.b64decode(result["submitter_secret"]) == session_key
+        file_part = base64.b64decode(items[0]["file_part"])
+        assert result["offset"] == len(file_part) - len(b"content")
+
+
+def test_batch_ingest_off_event_loop(
+    vault_stub: VaultStub,  # noqa: F811
+    monkeypatch: MonkeyPatch,
+):
+    """Test that batches decrypt envelopes off the event loop with inline crypto"""
+    on_event_loop = []
+    decrypt_envelope = envelope_decryption.decrypt_envelope
+
+    def recording_decrypt_envelope(**kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        return decrypt_envelope(**kwargs)
+
+    monkeypatch.setattr(
+        envelope_decryption, "decrypt_envelope", recording_decrypt_envelope
+    )
+    client_sk = PrivateKey.generate()
+    item = {
+        "file_part": base64.b64encode(
+            make_first_part(
+                client_private_key=bytes(client_sk),
+                session_key=os.urandom(32),
+                body=b"content",
+            )
+        ).decode(),
+        "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+    }
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    assert CONFIG.crypto_executor == "inline"
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post("/secrets/batch", json={"items": [item] * 5})
+
+    assert response.status_code == 200
+    assert all(result["error"] is None for result in response.json()["results"])
+    assert on_event_loop == [False] * 5
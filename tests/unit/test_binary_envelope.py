@@ -0,0 +1,59 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the raw binary variant of the envelope endpoint"""
+
+import asyncio
+import base64
+import io
+import os
+
+import crypt4gh.header
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_vault
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_binary_envelope(vault_stub: VaultStub):  # noqa: F811
+    """Test that the envelope is returned as raw bytes if requested"""
+    config = vault_stub.config()
+    vault = create_vault(config)
+    secret = os.urandom(32)
+    secret_id = asyncio.run(vault.store_secret(secret=secret))
+    asyncio.run(vault.close())
+    client_sk = PrivateKey.generate()
+    client_pk = base64.urlsafe_b64encode(bytes(client_sk.public_key)).decode()
+    app = setup_app(CONFIG)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        url = f"/secrets/{secret_id}/envelopes/{client_pk}"
+        response = client.get(url, headers={"Accept": "application/octet-stream"})
+        json_response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/octet-stream"
+    session_keys, _ = crypt4gh.header.deconstruct(
+        infile=io.BytesIO(response.content),
+        keys=[(0, bytes(client_sk), None)],
+        sender_pubkey=base64.b64decode(CONFIG.server_public_key),
+    )
+    assert session_keys == [secret]
+    assert len(base64.b64decode(json_response.json()["content"])) == len(
+        response.content
+    )
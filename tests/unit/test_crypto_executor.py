@@ -0,0 +1,101 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the configurable executor for envelope cryptography"""
+
+import asyncio
+import base64
+import io
+import os
+import time
+
+import crypt4gh.header
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_crypto
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.core.envelope_decryption import extract_envelope_content
+from ekss.core.envelope_encryption import create_envelope
+from ekss.offload import ExecutorSaturatedError
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+async def test_envelope_round_trip(mode: str):
+    """Test that envelopes are decrypted and encrypted in every mode"""
+    crypto = create_crypto(CONFIG.model_copy(update={"crypto_executor": mode}))
+    client_sk = PrivateKey.generate()
+    session_key = os.urandom(32)
+    file_part = make_first_part(
+        client_private_key=bytes(client_sk), session_key=session_key
+    )
+
+    submitter_secret, offset = await extract_envelope_content(
+        file_part=file_part, client_pubkey=bytes(client_sk.public_key), crypto=crypto
+    )
+    envelope = await create_envelope(
+        file_secret=submitter_secret,
+        client_pubkey=bytes(client_sk.public_key),
+        crypto=crypto,
+    )
+    metrics = crypto.metrics()["crypto_executor"]
+    crypto.shutdown()
+
+    assert submitter_secret == session_key
+    assert offset == len(file_part)
+    session_keys, _ = crypt4gh.header.deconstruct(
+        infile=io.BytesIO(envelope),
+        keys=[(0, bytes(client_sk), None)],
+        sender_pubkey=base64.b64decode(CONFIG.server_public_key),
+    )
+    assert session_keys == [session_key]
+    assert metrics["completed"] == 2
+    assert metrics["execution_seconds_avg"] > 0
+
+
+@pytest.mark.asyncio
+async def test_fail_fast_when_saturated():
+    """Test that operations beyond pool and queue capacity are rejected"""
+    config = CONFIG.model_copy(
+        update={"crypto_executor": "thread", "crypto_workers": 1, "crypto_max_queue": 1}
+    )
+    crypto = create_crypto(config)
+
+    results = await asyncio.gather(
+        *(crypto.run(time.sleep, 0.1) for _ in range(3)), return_exceptions=True
+    )
+    metrics = crypto.metrics()["crypto_executor"]
+    crypto.shutdown()
+
+    assert isinstance(results[-1], ExecutorSaturatedError)
+    assert metrics["rejected"] == 1
+    assert metrics["queue_wait_seconds_max"] > 0.05
+
+
+def test_metrics_endpoint(vault_stub: VaultStub):  # noqa: F811
+    """Test that the executor configured for the app reports its metrics"""
+    app = setup_app(CONFIG.model_copy(update={"crypto_executor": "thread"}))
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.json()["crypto_executor"]["workers"] == os.cpu_count()
@@ -0,0 +1,120 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test secrets derived from a master key and their ID"""
+
+import base64
+import os
+
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.adapters.outbound.derived import DerivedSecretStore
+from ekss.adapters.outbound.derived.store import hkdf_expand
+from ekss.config import CONFIG
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def master_key() -> str:
+    """A new base64 encoded master key"""
+    return base64.b64encode(os.urandom(32)).decode()
+
+
+def test_hkdf_expand():
+    """Test HKDF-Expand against test case 1 of RFC 5869"""
+    prk = bytes.fromhex(
+        "077709362c2e32df0ddc3f0dc47bba6390b6c73bb50f9c3122ec844ad7c2b3e5"
+    )
+    okm = bytes.fromhex(
+        "3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf"
+        "34007208d5b887185865"
+    )
+
+    assert hkdf_expand(prk, bytes(range(0xF0, 0xFA)), 42) == okm
+
+
+def test_key_rotation(vault_stub: VaultStub, tmp_path):  # noqa: F811
+    """Test that secrets can be derived again until their master key is removed"""
+    old_key, new_key = master_key(), master_key()
+    config = vault_stub.config(
+        storage_backend="derived",
+        derived_master_keys={1: old_key},
+        revocation_path=tmp_path / "revocations.bin",
+    )
+    secret_id, secret = DerivedSecretStore(config).new_secret()
+    assert secret_id is not None
+
+    rotated = DerivedSecretStore(
+        vault_stub.config(
+            storage_backend="derived",
+            derived_master_keys={1: old_key, 2: new_key},
+            derived_master_key_version=2,
+            revocation_path=tmp_path / "revocations.bin",
+        )
+    )
+    new_id, new_secret = rotated.new_secret()
+    retired = DerivedSecretStore(
+        vault_stub.config(
+            storage_backend="derived",
+            derived_master_keys={2: new_key},
+            derived_master_key_version=2,
+            revocation_path=tmp_path / "revocations.bin",
+        )
+    )
+    forged_id = base64.urlsafe_b64encode(b"\x02" + os.urandom(32)).decode()
+
+    assert rotated.get_secret(key=secret_id) == secret
+    assert new_id is not None
+    assert retired.get_secret(key=new_id) == new_secret
+    assert not retired.secret_exists(key=secret_id)
+    assert not retired.secret_exists(key=forged_id.rstrip("="))
+
+
+def test_ingest_without_storage(vault_stub: VaultStub, tmp_path):  # noqa: F811
+    """Test that ingesting and deleting a secret does not touch the vault"""
+    client_sk = PrivateKey.generate()
+    query = {
+        "file_part": base64.b64encode(
+            make_first_part(
+                client_private_key=bytes(client_sk), session_key=os.urandom(32)
+            )
+        ).decode(),
+        "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+    }
+    app = setup_app(CONFIG)
+    config = vault_stub.config(
+        storage_backend="derived",
+        derived_master_keys={1: master_key()},
+        revocation_path=tmp_path / "revocations.bin",
+    )
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        ingested = client.post("/secrets", json=query)
+        secret_id = ingested.json()["secret_id"]
+        url = f"/secrets/{secret_id}/envelopes/"
+        client_pk = base64.urlsafe_b64encode(bytes(client_sk.public_key)).decode()
+        envelope = client.get(url + client_pk)
+        deleted = client.delete(f"/secrets/{secret_id}")
+        after_delete = client.get(url + client_pk)
+
+    assert ingested.status_code == envelope.status_code == 200
+    assert deleted.status_code == 204
+    assert after_delete.status_code == 404
+    assert vault_stub.round_trips == 0
+    assert (tmp_path / "revocations.bin").stat().st_size == 16
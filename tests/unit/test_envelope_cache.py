@@ -0,0 +1,94 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the cache of envelopes by secret ID and client public key"""
+
+import asyncio
+import base64
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_vault
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.core.envelope_cache import EnvelopeCache
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_repeated_requests(vault_stub: VaultStub):  # noqa: F811
+    """Test that repeated requests are served from the cache until deletion"""
+    config = vault_stub.config(vault_secret_cache_size=0)
+    vault = create_vault(config)
+    secret_id = asyncio.run(vault.store_secret(secret=os.urandom(32)))
+    asyncio.run(vault.close())
+    client_pk = base64.urlsafe_b64encode(bytes(PrivateKey.generate().public_key))
+    app = setup_app(CONFIG.model_copy(update={"crypto_envelope_cache_size": 64}))
+    app.dependency_overrides[config_injector] = lambda: config
+    url = f"/secrets/{secret_id}/envelopes/{client_pk.decode()}"
+
+    with TestClient(app=app) as client:
+        first, second = client.get(url), client.get(url)
+        metrics = client.get("/metrics").json()["envelope_cache"]
+        deleted = client.delete(f"/secrets/{secret_id}")
+        after_deletion = client.get(url)
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert vault_stub.requests["get data"] == 2
+    assert metrics["hits"] == 1
+    assert metrics["hit_ratio"] == 0.5
+    assert deleted.status_code == 204
+    assert after_deletion.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_deletion_during_creation():
+    """Test that an envelope is not cached if its secret was deleted meanwhile"""
+    cache = EnvelopeCache(max_entries=8, ttl=60)
+    created = asyncio.Event()
+
+    async def create() -> bytes:
+        await created.wait()
+        return b"envelope"
+
+    request = asyncio.create_task(
+        cache.get_or_create(secret_id="id", client_pubkey=b"pk", create=create)
+    )
+    await asyncio.sleep(0)
+    cache.invalidate_secret("id")
+    created.set()
+
+    assert await request == b"envelope"
+    assert cache.stats.entries == 0
+
+
+@pytest.mark.asyncio
+async def test_eviction_updates_index():
+    """Test that evicted envelopes do not linger in the index by secret"""
+    cache = EnvelopeCache(max_entries=2, ttl=60)
+
+    async def create() -> bytes:
+        return b"envelope"
+
+    for secret_id in ("a", "b", "c"):
+        await cache.get_or_create(
+            secret_id=secret_id, client_pubkey=b"pk", create=create
+        )
+
+    assert cache.stats.evictions == 1
+    assert sorted(cache._keys_by_secret) == ["b", "c"]
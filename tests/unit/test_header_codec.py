@@ -0,0 +1,142 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cross-check the libsodium envelope codec against the crypt4gh implementation"""
+
+import os
+from typing import Union
+
+import crypt4gh.header
+import pytest
+from nacl.public import PrivateKey
+
+from ekss.core import crypto
+from ekss.core.envelope_decryption import decrypt_envelope
+from ekss.core.envelope_encryption import seal_envelope
+from ekss.core.keyring import KeyRing, SharedKeyCache
+
+SERVER_SK = PrivateKey.generate()
+SERVER_PK = bytes(SERVER_SK.public_key)
+CLIENT_SK = PrivateKey.generate()
+CLIENT_PK = bytes(CLIENT_SK.public_key)
+OTHER_SK = PrivateKey.generate()
+SECRET = os.urandom(32)
+CODECS = ["libsodium", "crypt4gh"]
+
+
+def data_enc(secret: bytes = SECRET, method: int = 0) -> bytes:
+    """Plain data encryption packet"""
+    return crypt4gh.header.PACKET_TYPE_DATA_ENC + method.to_bytes(4, "little") + secret
+
+
+def edit_list(*lengths: int, count: int = -1) -> bytes:
+    """Plain edit list packet"""
+    count = len(lengths) if count < 0 else count
+    return (
+        crypt4gh.header.PACKET_TYPE_EDIT_LIST
+        + count.to_bytes(4, "little")
+        + b"".join(length.to_bytes(8, "little") for length in lengths)
+    )
+
+
+def sealed(packet: bytes, sender: PrivateKey = CLIENT_SK, recipient: bytes = SERVER_PK):
+    """Encrypted header packet"""
+    return next(crypt4gh.header.encrypt(packet, [(0, bytes(sender), recipient)]))
+
+
+def header(*packets: bytes) -> bytes:
+    """Header consisting of the given encrypted packets"""
+    return crypt4gh.header.serialize(packets)
+
+
+PREAMBLE = header(sealed(data_enc()))[:12]
+
+HEADERS = {
+    "single packet": header(sealed(data_enc())),
+    "followed by content": header(sealed(data_enc())) + os.urandom(100),
+    "other recipient first": header(
+        sealed(data_enc(os.urandom(32)), recipient=bytes(OTHER_SK.public_key)),
+        sealed(data_enc()),
+    ),
+    "with edit list": header(sealed(edit_list(5, 10)), sealed(data_enc())),
+    "several secrets": header(sealed(data_enc()), sealed(data_enc(os.urandom(32)))),
+    "other sender": header(sealed(data_enc(), sender=OTHER_SK)),
+    "unknown header method": header((1).to_bytes(4, "little") + sealed(data_enc())[4:]),
+    "short packet": header(b"\0" * 10, sealed(data_enc())),
+    "tampered packet": header(sealed(data_enc())[:-1] + b"\0"),
+    "empty": b"",
+    "truncated preamble": PREAMBLE,
+    "wrong magic number": b"crypt5gh" + PREAMBLE[8:] + bytes(4),
+    "wrong version": PREAMBLE[:8] + (2).to_bytes(4, "little") + bytes(4),
+    "no packets": PREAMBLE + bytes(4),
+    "missing packet": PREAMBLE + (1).to_bytes(4, "little"),
+    "invalid packet length": PREAMBLE + (1).to_bytes(4, "little") + b"\2\0\0\0",
+    "truncated packet": header(sealed(data_enc()))[:-1],
+    "invalid packet type": header(sealed(b"\7\0\0\0" + SECRET)),
+    "unsupported bulk method": header(sealed(data_enc(method=1))),
+    "several edit lists": header(
+        sealed(edit_list(1)), sealed(edit_list(2)), sealed(data_enc())
+    ),
+    "invalid edit list": header(sealed(edit_list(1, count=3)), sealed(data_enc())),
+    "only edit list": header(sealed(edit_list(1))),
+}
+
+
+@pytest.fixture(autouse=True)
+def server_keys(monkeypatch: pytest.MonkeyPatch):
+    """Use fixed server keys and a fresh shared key cache"""
+    monkeypatch.setattr(crypto, "_keyring", KeyRing(private_keys=[bytes(SERVER_SK)]))
+    monkeypatch.setattr(crypto, "_shared_keys", SharedKeyCache(max_entries=8, ttl=60))
+
+
+def decrypt_with(
+    codec: str, file_part: bytes, monkeypatch: pytest.MonkeyPatch
+) -> Union[tuple[bytes, int], str]:
+    """The decrypted secret and offset or the error message"""
+    monkeypatch.setattr(crypto, "_envelope_codec", codec)
+    try:
+        return decrypt_envelope(file_part=file_part, client_pubkey=CLIENT_PK)
+    except ValueError as error:
+        return str(error)
+
+
+@pytest.mark.parametrize("case", HEADERS)
+def test_decryption_conformance(case: str, monkeypatch: pytest.MonkeyPatch):
+    """Test that both codecs decrypt alike and fail with the same messages"""
+    file_part = HEADERS[case]
+
+    results = {codec: decrypt_with(codec, file_part, monkeypatch) for codec in CODECS}
+
+    assert results["libsodium"] == results["crypt4gh"]
+    if isinstance(results["crypt4gh"], tuple):
+        secret, offset = results["crypt4gh"]
+        assert secret == SECRET
+        assert offset == len(file_part) - (100 if case == "followed by content" else 0)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_encryption_conformance(codec: str, monkeypatch: pytest.MonkeyPatch):
+    """Test that envelopes are byte-identical to those built by crypt4gh"""
+    monkeypatch.setattr(crypto, "_envelope_codec", codec)
+    nonce = os.urandom(12)
+    monkeypatch.setattr(os, "urandom", lambda size: nonce[:size])
+    expected = header(sealed(data_enc(), sender=SERVER_SK, recipient=CLIENT_PK))
+
+    envelope = seal_envelope(file_secret=SECRET, client_pubkey=CLIENT_PK)
+
+    assert envelope == expected
+    assert (
+        decrypt_with(codec, envelope, monkeypatch) == "No supported encryption method"
+    )
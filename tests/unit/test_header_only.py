@@ -0,0 +1,79 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test ingest of the Crypt4GH header only"""
+
+import base64
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.core.envelope_decryption import get_header_length
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+CLIENT_SK = PrivateKey.generate()
+SESSION_KEY = os.urandom(32)
+FILE_PART = make_first_part(
+    client_private_key=bytes(CLIENT_SK), session_key=SESSION_KEY, body=os.urandom(1024)
+)
+HEADER = FILE_PART[:-1024]
+
+
+def test_header_length():
+    """Test that growing prefixes lead to the exact header length"""
+    prefix = b""
+    while (length := get_header_length(prefix)) > len(prefix):
+        prefix = FILE_PART[:length]
+
+    assert length == len(HEADER)
+    assert get_header_length(FILE_PART) == len(HEADER)
+
+
+def test_header_length_invalid():
+    """Test that files not starting with a Crypt4GH header are rejected"""
+    with pytest.raises(ValueError):
+        get_header_length(b"not a crypt4gh file")
+
+
+def test_ingest_header_only(vault_stub: VaultStub):  # noqa: F811
+    """Test that the header determined via the API is enough for POST /secrets"""
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/header-length",
+            json={"file_start": base64.b64encode(FILE_PART[:256]).decode()},
+        )
+        assert response.json() == {"length": len(HEADER), "complete": True}
+
+        response = client.post(
+            "/secrets",
+            json={
+                "file_part": base64.b64encode(HEADER).decode(),
+                "public_key": base64.b64encode(bytes(CLIENT_SK.public_key)).decode(),
+            },
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert base64.b64decode(body["submitter_secret"]) == SESSION_KEY
+    assert body["offset"] == len(HEADER)
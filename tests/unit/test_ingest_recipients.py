@@ -0,0 +1,78 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test envelopes for extra recipients returned by POST /secrets"""
+
+import base64
+import io
+import os
+
+import crypt4gh.header
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_ingest_with_recipients(vault_stub: VaultStub):  # noqa: F811
+    """Test that envelopes of the new secret are returned without reading it back"""
+    client_sk = PrivateKey.generate()
+    recipient_sks = [PrivateKey.generate() for _ in range(2)]
+    recipient_pks = [
+        base64.b64encode(bytes(recipient_sk.public_key)).decode()
+        for recipient_sk in recipient_sks
+    ]
+    query = {
+        "file_part": base64.b64encode(
+            make_first_part(
+                client_private_key=bytes(client_sk), session_key=os.urandom(32)
+            )
+        ).decode(),
+        "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+    }
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets", json={**query, "recipient_public_keys": recipient_pks}
+        )
+        plain = client.post("/secrets", json=query)
+        invalid = client.post(
+            "/secrets", json={**query, "recipient_public_keys": ["AAAA"]}
+        )
+
+    assert response.status_code == plain.status_code == 200
+    assert plain.json()["envelopes"] == []
+    assert invalid.status_code == 400
+    assert invalid.json()["exception_id"] == "invalidPublicKeyError"
+    assert vault_stub.requests["post data"] == 2
+    assert vault_stub.requests["get data"] == 0
+
+    new_secret = base64.b64decode(response.json()["new_secret"])
+    envelopes = response.json()["envelopes"]
+    assert [item["public_key"] for item in envelopes] == recipient_pks
+    for recipient_sk, item in zip(recipient_sks, envelopes):
+        session_keys, _ = crypt4gh.header.deconstruct(
+            infile=io.BytesIO(base64.b64decode(item["content"])),
+            keys=[(0, bytes(recipient_sk), None)],
+            sender_pubkey=base64.b64decode(CONFIG.server_public_key),
+        )
+        assert session_keys == [new_secret]
@@ -0,0 +1,118 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test envelopes precomputed on ingest for internal recipients"""
+
+import base64
+import io
+import os
+from pathlib import Path
+
+import crypt4gh.header
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.file import make_first_part
+from tests.fixtures.secret_stores import backend_config
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_precomputed_envelopes(vault_stub: VaultStub):  # noqa: F811
+    """Test that envelopes for internal recipients are served without crypto work"""
+    client_sk, archive_sk, other_sk = (PrivateKey.generate() for _ in range(3))
+    archive_pk = bytes(archive_sk.public_key)
+    internal_recipients = [base64.b64encode(archive_pk).decode()]
+    query = {
+        "file_part": base64.b64encode(
+            make_first_part(
+                client_private_key=bytes(client_sk), session_key=os.urandom(32)
+            )
+        ).decode(),
+        "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+    }
+    app = setup_app(
+        CONFIG.model_copy(
+            update={"internal_recipient_public_keys": internal_recipients}
+        )
+    )
+    config = vault_stub.config(vault_secret_cache_size=0)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        ingested = client.post("/secrets", json=query).json()
+        url = f"/secrets/{ingested['secret_id']}/envelopes/"
+        completed = client.get("/metrics").json()["crypto_executor"]["completed"]
+        archive = client.get(url + base64.urlsafe_b64encode(archive_pk).decode())
+        after_archive = client.get("/metrics").json()["crypto_executor"]["completed"]
+        other = client.get(
+            url + base64.urlsafe_b64encode(bytes(other_sk.public_key)).decode()
+        )
+        after_other = client.get("/metrics").json()["crypto_executor"]["completed"]
+
+    assert archive.status_code == other.status_code == 200
+    assert after_archive == completed
+    assert after_other == completed + 1
+    assert vault_stub.requests["post data"] == 1
+    for recipient_sk, response in ((archive_sk, archive), (other_sk, other)):
+        session_keys, _ = crypt4gh.header.deconstruct(
+            infile=io.BytesIO(base64.b64decode(response.json()["content"])),
+            keys=[(0, bytes(recipient_sk), None)],
+            sender_pubkey=base64.b64decode(CONFIG.server_public_key),
+        )
+        assert session_keys == [base64.b64decode(ingested["new_secret"])]
+
+
+def test_stores_without_envelopes(vault_stub: VaultStub, tmp_path: Path):  # noqa: F811
+    """Test that internal recipients cost one read with stores that drop envelopes"""
+    client_sk, archive_sk = (PrivateKey.generate() for _ in range(2))
+    archive_pk = bytes(archive_sk.public_key)
+    query = {
+        "file_part": base64.b64encode(
+            make_first_part(
+                client_private_key=bytes(client_sk), session_key=os.urandom(32)
+            )
+        ).decode(),
+        "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+    }
+    app = setup_app(
+        CONFIG.model_copy(
+            update={
+                "internal_recipient_public_keys": [
+                    base64.b64encode(archive_pk).decode()
+                ]
+            }
+        )
+    )
+    config = backend_config("transit", stub=vault_stub, directory=tmp_path)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        ingested = client.post("/secrets", json=query).json()
+        archive = client.get(
+            f"/secrets/{ingested['secret_id']}/envelopes/"
+            + base64.urlsafe_b64encode(archive_pk).decode()
+        )
+
+    assert archive.status_code == 200
+    assert vault_stub.requests["decrypt transit"] == 1
+    session_keys, _ = crypt4gh.header.deconstruct(
+        infile=io.BytesIO(base64.b64decode(archive.json()["content"])),
+        keys=[(0, bytes(archive_sk), None)],
+        sender_pubkey=base64.b64decode(CONFIG.server_public_key),
+    )
+    assert session_keys == [base64.b64decode(ingested["new_secret"])]
@@ -0,0 +1,106 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the server key ring"""
+
+import base64
+import io
+import os
+import time
+from pathlib import Path
+
+import crypt4gh.header
+import pytest
+from nacl.public import PrivateKey
+
+from ekss.config import CONFIG
+from ekss.core import crypto
+from ekss.core.envelope_decryption import decrypt_envelope
+from ekss.core.envelope_encryption import seal_envelope
+from ekss.core.keyring import KeyRing
+from tests.fixtures.file import make_first_part
+
+CLIENT_SK = PrivateKey.generate()
+
+
+def decrypt_with(envelope: bytes, server_pubkey: bytes) -> bytes:
+    """Decrypt an envelope created by the server with the given public key"""
+    session_keys, _ = crypt4gh.header.deconstruct(
+        infile=io.BytesIO(envelope),
+        keys=[(0, bytes(CLIENT_SK), None)],
+        sender_pubkey=server_pubkey,
+    )
+    return session_keys[0]
+
+
+def test_retired_keys_decrypt(monkeypatch: pytest.MonkeyPatch):
+    """Test that envelopes for retired keys are decrypted, trying likely keys first"""
+    current, retired = PrivateKey.generate(), PrivateKey.generate()
+    keyring = KeyRing(private_keys=[bytes(current), bytes(retired)])
+    monkeypatch.setattr(crypto, "_keyring", keyring)
+    session_key = os.urandom(32)
+    file_part = make_first_part(
+        client_private_key=bytes(CLIENT_SK),
+        session_key=session_key,
+        server_pubkey=bytes(retired.public_key),
+    )
+
+    submitter_secret, _ = decrypt_envelope(
+        file_part=file_part, client_pubkey=bytes(CLIENT_SK.public_key)
+    )
+    envelope = seal_envelope(
+        file_secret=session_key, client_pubkey=bytes(CLIENT_SK.public_key)
+    )
+
+    assert submitter_secret == session_key
+    assert keyring.decryption_order()[0].public_key == bytes(retired.public_key)
+    assert keyring.current.public_key == bytes(current.public_key)
+    assert decrypt_with(envelope, bytes(current.public_key)) == session_key
+    assert keyring.get(keyring.current.fingerprint) == keyring.current
+
+
+def test_rotation_without_restart(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    """Test that a changed key file takes effect after the reload interval"""
+    old, new = PrivateKey.generate(), PrivateKey.generate()
+    path = tmp_path / "keyring"
+    path.write_text(base64.b64encode(bytes(old)).decode() + "\n")
+    keyring = KeyRing(private_keys=[os.urandom(32)], path=path, reload_interval=0.1)
+    monkeypatch.setattr(crypto, "_keyring", keyring)
+    assert keyring.current.public_key == bytes(old.public_key)
+
+    path.write_text(
+        "\n".join(base64.b64encode(bytes(key)).decode() for key in (new, old))
+    )
+    os.utime(path, (time.time() + 1, time.time() + 1))
+    time.sleep(0.2)
+    envelope = seal_envelope(
+        file_secret=bytes(32), client_pubkey=bytes(CLIENT_SK.public_key)
+    )
+
+    assert decrypt_with(envelope, bytes(new.public_key)) == bytes(32)
+    assert len(keyring.decryption_order()) == 2
+
+    path.write_text("not a key")
+    os.utime(path, (time.time() + 2, time.time() + 2))
+    time.sleep(0.2)
+    assert keyring.current.public_key == bytes(new.public_key)
+
+
+def test_mismatching_public_key():
+    """Test that a configured public key not matching the private key is rejected"""
+    config = CONFIG.model_copy(
+        update={"server_public_key": base64.b64encode(bytes(32)).decode()}
+    )
+    with pytest.raises(ValueError):
+        KeyRing.from_config(config)
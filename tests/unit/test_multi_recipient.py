@@ -0,0 +1,106 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test envelopes of one secret for several public keys"""
+
+import asyncio
+import base64
+import io
+import os
+
+import crypt4gh.header
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_vault
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+SERVER_PK = base64.b64decode(CONFIG.server_public_key)
+
+
+def decrypt_with(envelope: bytes, client_sk: PrivateKey) -> list[bytes]:
+    """The file secrets a client can decrypt from the envelope"""
+    session_keys, _ = crypt4gh.header.deconstruct(
+        infile=io.BytesIO(envelope),
+        keys=[(0, bytes(client_sk), None)],
+        sender_pubkey=SERVER_PK,
+    )
+    return session_keys
+
+
+@pytest.mark.parametrize("codec", ["libsodium", "crypt4gh"])
+def test_envelopes_for_recipients(
+    vault_stub: VaultStub,  # noqa: F811
+    codec: str,
+):
+    """Test combined and separate envelopes from a single vault read each"""
+    config = vault_stub.config(vault_secret_cache_size=0)
+    vault = create_vault(config)
+    secret = os.urandom(32)
+    secret_id = asyncio.run(vault.store_secret(secret=secret))
+    asyncio.run(vault.close())
+    client_sks = [PrivateKey.generate() for _ in range(3)]
+    client_pks = [
+        base64.urlsafe_b64encode(bytes(client_sk.public_key)).decode()
+        for client_sk in client_sks
+    ]
+    app = setup_app(CONFIG.model_copy(update={"crypto_envelope_codec": codec}))
+    app.dependency_overrides[config_injector] = lambda: config
+    url = f"/secrets/{secret_id}/envelopes"
+    vault_stub.reset_counters()
+
+    with TestClient(app=app) as client:
+        combined = client.get(url, params={"client_pk": client_pks})
+        raw = client.get(
+            url,
+            params={"client_pk": client_pks},
+            headers={"Accept": "application/octet-stream"},
+        )
+        separate = client.get(url, params={"client_pk": client_pks, "combined": False})
+
+    assert vault_stub.requests["get data"] == 3
+    assert combined.status_code == raw.status_code == separate.status_code == 200
+    envelope = base64.b64decode(combined.json()["content"])
+    envelopes = separate.json()["envelopes"]
+    assert [item["public_key"] for item in envelopes] == client_pks
+    for client_sk, item in zip(client_sks, envelopes):
+        assert decrypt_with(envelope, client_sk) == [secret]
+        assert decrypt_with(raw.content, client_sk) == [secret]
+        assert decrypt_with(base64.b64decode(item["content"]), client_sk) == [secret]
+
+
+def test_invalid_recipients(vault_stub: VaultStub):  # noqa: F811
+    """Test that invalid or too many public keys are rejected"""
+    config = vault_stub.config()
+    vault = create_vault(config)
+    secret_id = asyncio.run(vault.store_secret(secret=os.urandom(32)))
+    asyncio.run(vault.close())
+    client_pk = base64.urlsafe_b64encode(bytes(PrivateKey.generate().public_key))
+    app = setup_app(CONFIG)
+    app.dependency_overrides[config_injector] = lambda: config
+    url = f"/secrets/{secret_id}/envelopes"
+
+    with TestClient(app=app) as client:
+        invalid = client.get(url, params={"client_pk": [client_pk.decode(), "AAAA"]})
+        too_many = client.get(url, params={"client_pk": [client_pk.decode()] * 101})
+        missing = client.get(url)
+
+    for response in (invalid, missing):
+        assert response.status_code == 400
+        assert response.json()["exception_id"] == "invalidPublicKeyError"
+    assert too_many.status_code == 422
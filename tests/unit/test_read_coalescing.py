@@ -0,0 +1,64 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test coalescing of concurrent reads of the same secret"""
+
+import asyncio
+import os
+
+import pytest
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.adapters.outbound.vault import SecretRetrievalError
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("vault_client", ["hvac", "async"])
+async def test_concurrent_reads_share_request(
+    vault_client: str,
+    vault_stub: VaultStub,  # noqa: F811
+):
+    """Test that concurrent reads of one secret result in a single vault read"""
+    config = vault_stub.config(vault_client=vault_client, vault_offload_threads=4)
+    vault = create_vault(config)
+    secret = os.urandom(32)
+    secret_id = await vault.store_secret(secret=secret)
+    vault_stub.latency = 0.1
+
+    results = await asyncio.gather(
+        *(vault.get_secret(key=secret_id) for _ in range(20))
+    )
+    metrics = vault.metrics()["vault_read_coalescing"]
+    await vault.close()
+
+    assert results == [secret] * 20
+    assert vault_stub.requests["get data"] == 1
+    assert metrics["coalesced"] == 19
+    assert metrics["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_shared(vault_stub: VaultStub):  # noqa: F811
+    """Test that all callers waiting for a failing read receive its error"""
+    vault = create_vault(vault_stub.config(vault_client="async"))
+    vault_stub.latency = 0.1
+
+    results = await asyncio.gather(
+        *(vault.get_secret(key="missing") for _ in range(5)), return_exceptions=True
+    )
+    await vault.close()
+
+    assert all(isinstance(result, SecretRetrievalError) for result in results)
+    assert vault_stub.requests["get data"] == 1
@@ -0,0 +1,71 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the errors reported by the routes for single secrets"""
+
+import asyncio
+import base64
+import os
+import socket
+
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_vault
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.parametrize("vault_client", ["hvac", "async"])
+def test_vault_unreachable(vault_client: str, vault_stub: VaultStub):  # noqa: F811
+    """Test that an unreachable vault is reported as a gateway timeout"""
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    app = setup_app(CONFIG)
+    config = vault_stub.config(
+        vault_client=vault_client, vault_login_attempts=1
+    ).model_copy(update={"vault_url": f"http://127.0.0.1:{port}"})
+    app.dependency_overrides[config_injector] = lambda: config
+    client_pk = base64.urlsafe_b64encode(bytes(PrivateKey.generate().public_key))
+
+    with TestClient(app=app) as client:
+        responses = [
+            client.get(f"/secrets/some_id/envelopes/{client_pk.decode()}"),
+            client.get("/secrets/some_id/envelopes", params={"client_pk": client_pk}),
+            client.delete("/secrets/some_id"),
+        ]
+
+    for response in responses:
+        assert response.status_code == 504
+        assert response.json()["exception_id"] == "vaultConnectionError"
+
+
+@pytest.mark.parametrize("client_pk", ["dG9vIHNob3J0", "not base64"])
+def test_invalid_public_key(client_pk: str, vault_stub: VaultStub):  # noqa: F811
+    """Test that an invalid public key is rejected when requesting an envelope"""
+    config = vault_stub.config()
+    vault = create_vault(config)
+    secret_id = asyncio.run(vault.store_secret(secret=os.urandom(32)))
+    asyncio.run(vault.close())
+    app = setup_app(CONFIG)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.get(f"/secrets/{secret_id}/envelopes/{client_pk}")
+
+    assert response.status_code == 400
+    assert response.json()["exception_id"] == "invalidPublicKeyError"
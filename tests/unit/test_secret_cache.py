@@ -0,0 +1,108 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the encrypted in-process secret cache"""
+
+import asyncio
+import os
+
+import pytest
+from pytest import MonkeyPatch
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.adapters.outbound.secret_store import CachingSecretStore
+from ekss.adapters.outbound.vault import SecretRetrievalError
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.asyncio
+async def test_repeated_reads_cached(vault_stub: VaultStub):  # noqa: F811
+    """Test that repeated reads are served from the cache in encrypted form"""
+    vault = create_vault(vault_stub.config(vault_secret_cache_size=10))
+    assert isinstance(vault, CachingSecretStore)
+    secret = os.urandom(32)
+    secret_id = await vault.store_secret(secret=secret)
+
+    for _ in range(5):
+        assert await vault.get_secret(key=secret_id) == secret
+    metrics = vault.metrics()["secret_cache"]
+    cached = [value for _, value in vault._cache._entries.values()]
+    await vault.close()
+
+    assert vault_stub.requests["get data"] == 1
+    assert metrics["hits"] == 4
+    assert metrics["misses"] == 1
+    assert all(secret not in value for value in cached)
+
+
+@pytest.mark.asyncio
+async def test_deletion_invalidates(vault_stub: VaultStub):  # noqa: F811
+    """Test that deleted secrets are no longer served from the cache"""
+    vault = create_vault(vault_stub.config(vault_secret_cache_size=10))
+    secret_id = await vault.store_secret(secret=os.urandom(32))
+    await vault.get_secret(key=secret_id)
+
+    await vault.delete_secret(key=secret_id)
+    with pytest.raises(SecretRetrievalError):
+        await vault.get_secret(key=secret_id)
+    await vault.close()
+
+
+@pytest.mark.asyncio
+async def test_deletion_during_read(
+    vault_stub: VaultStub,  # noqa: F811
+    monkeypatch: MonkeyPatch,
+):
+    """Test that a read finishing after a deletion does not cache the secret again"""
+    vault = create_vault(vault_stub.config(vault_secret_cache_size=10))
+    assert isinstance(vault, CachingSecretStore)
+    secret_id = await vault.store_secret(secret=os.urandom(32))
+    read = vault._store.get_secret
+    started, deleted = asyncio.Event(), asyncio.Event()
+
+    async def slow_read(*, key: str) -> bytes:
+        secret = await read(key=key)
+        started.set()
+        await deleted.wait()
+        return secret
+
+    monkeypatch.setattr(vault._store, "get_secret", slow_read)
+    reading = asyncio.create_task(vault.get_secret(key=secret_id))
+    await started.wait()
+    await vault.delete_secret(key=secret_id)
+    deleted.set()
+    await reading
+
+    with pytest.raises(SecretRetrievalError):
+        await vault.get_secret(key=secret_id)
+    await vault.close()
+
+
+@pytest.mark.asyncio
+async def test_size_and_ttl_limits(vault_stub: VaultStub):  # noqa: F811
+    """Test eviction of least recently used and expired entries"""
+    config = vault_stub.config(vault_secret_cache_size=2, vault_secret_cache_ttl=0.2)
+    vault = create_vault(config)
+    secret_ids = [await vault.store_secret(secret=os.urandom(32)) for _ in range(3)]
+    for secret_id in secret_ids:
+        await vault.get_secret(key=secret_id)
+    await asyncio.sleep(0.3)
+    await vault.get_secret(key=secret_ids[-1])
+    metrics = vault.metrics()["secret_cache"]
+    await vault.close()
+
+    # caching the re-read secret also purges the other expired one
+    assert metrics["evictions"] == 1
+    assert metrics["expirations"] == 2
+    assert metrics["entries"] == 1
@@ -0,0 +1,44 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test that deleting a secret does not read the secret itself"""
+
+import os
+
+import pytest
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.adapters.outbound.vault import SecretRetrievalError
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("vault_client", ["hvac", "async"])
+async def test_delete_reads_metadata_only(
+    vault_client: str,
+    vault_stub: VaultStub,  # noqa: F811
+):
+    """Test deletion of existing and missing secrets on metadata level"""
+    vault = create_vault(vault_stub.config(vault_client=vault_client))
+    secret_id = await vault.store_secret(secret=os.urandom(32))
+    vault_stub.reset_counters()
+
+    await vault.delete_secret(key=secret_id)
+    with pytest.raises(SecretRetrievalError):
+        await vault.delete_secret(key=secret_id)
+    await vault.close()
+
+    assert vault_stub.requests["get data"] == 0
+    assert vault_stub.requests["get metadata"] == 2
+    assert vault_stub.requests["delete metadata"] == 1
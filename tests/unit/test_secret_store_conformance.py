@@ -0,0 +1,189 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test that every secret store backend behaves the same"""
+
+import base64
+import os
+import sqlite3
+
+import pytest
+from nacl.exceptions import CryptoError
+from pydantic import SecretStr
+
+from ekss.adapters.inbound.fastapi_.deps import create_vault
+from ekss.adapters.outbound.sqlite import SQLiteSecretStore
+from ekss.adapters.outbound.vault import SecretRetrievalError
+from ekss.adapters.outbound.wrapped import WrappedSecretStore
+from ekss.config import SecretStoreConfig
+from ekss.ports.outbound.secret_store import SecretStore
+from tests.fixtures.secret_stores import (  # noqa: F401
+    add_secret,
+    backend_config,
+    secret_store,
+)
+from tests.fixtures.vault_stub import VaultStub
+
+
+@pytest.mark.asyncio
+async def test_round_trip(
+    secret_store: tuple[SecretStoreConfig, SecretStore],  # noqa: F811
+):
+    """Test storing, reading, checking and deleting secrets and their envelopes"""
+    config, store = secret_store
+    assert store.stores_envelopes == (
+        config.storage_backend not in ("wrapped", "transit", "derived")
+    )
+    stored_envelope = b"header" if store.stores_envelopes else None
+
+    secret_id, secret = await add_secret(store, envelopes={"env": b"header"})
+    other_id, _ = await add_secret(store)
+
+    assert secret_id != other_id
+    assert await store.get_secret(key=secret_id) == secret
+    assert await store.get_envelope(key=secret_id, envelope_id="env") == stored_envelope
+    assert await store.get_envelope(key=secret_id, envelope_id="other") is None
+    assert await store.get_envelope(key=other_id, envelope_id="env") is None
+    assert await store.secret_exists(key=secret_id)
+
+    await store.delete_secret(key=secret_id)
+
+    assert not await store.secret_exists(key=secret_id)
+    assert await store.secret_exists(key=other_id)
+    with pytest.raises(SecretRetrievalError):
+        await store.get_secret(key=secret_id)
+    with pytest.raises(SecretRetrievalError):
+        await store.get_envelope(key=secret_id, envelope_id="env")
+    with pytest.raises(SecretRetrievalError):
+        await store.delete_secret(key=secret_id)
+
+
+@pytest.mark.asyncio
+async def test_missing_secret(
+    secret_store: tuple[SecretStoreConfig, SecretStore],  # noqa: F811
+):
+    """Test that unknown IDs are reported alike"""
+    _, store = secret_store
+
+    assert not await store.secret_exists(key="unknown")
+    with pytest.raises(SecretRetrievalError):
+        await store.get_secret(key="unknown")
+
+
+@pytest.mark.asyncio
+async def test_batch_read(
+    secret_store: tuple[SecretStoreConfig, SecretStore],  # noqa: F811
+):
+    """Test that batch reads return secrets and errors in the order of the IDs"""
+    _, store = secret_store
+    secret_ids, secrets = zip(*[await add_secret(store) for _ in range(5)])
+    await store.delete_secret(key=secret_ids[1])
+
+    results = await store.get_secrets(
+        keys=[*secret_ids, "unknown", secret_ids[0]], concurrency=2
+    )
+
+    assert results[0] == results[-1] == secrets[0]
+    assert results[2:5] == list(secrets[2:])
+    assert isinstance(results[1], SecretRetrievalError)
+    assert isinstance(results[5], SecretRetrievalError)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_encryption_at_rest(tmp_path):
+    """Test that the SQLite store only writes encrypted secrets"""
+    with VaultStub() as stub:
+        config = backend_config("sqlite", stub=stub, directory=tmp_path)
+    store = create_vault(config)
+    secret = os.urandom(32)
+    secret_id = await store.store_secret(secret=secret)
+    await store.close()
+
+    with sqlite3.connect(config.sqlite_path) as connection:
+        (stored,) = connection.execute("SELECT secret FROM secrets").fetchone()
+    other_kek = SecretStr(base64.b64encode(os.urandom(32)).decode())
+    wrong_key_store = SQLiteSecretStore(
+        config.model_copy(update={"sqlite_key_encryption_key": other_kek})
+    )
+
+    assert secret not in stored
+    with pytest.raises(CryptoError):
+        wrong_key_store.get_secret(key=secret_id)
+    wrong_key_store.close()
+
+
+def test_revocation_and_rotation(tmp_path):
+    """Test that wrapped IDs survive key rotation and deletion across instances"""
+    old_key, new_key = (
+        SecretStr(base64.b64encode(os.urandom(32)).decode()) for _ in range(2)
+    )
+    config = SecretStoreConfig(
+        vault_url="http://vault",
+        vault_path="ekss",
+        vault_verify=True,
+        storage_backend="wrapped",
+        wrapped_key_encryption_keys={1: old_key},
+        revocation_path=tmp_path / "revocations.bin",
+        revocation_reload_interval=0,
+    )
+    store = WrappedSecretStore(config)
+    secret = os.urandom(32)
+    old_id = store.store_secret(secret=secret)
+    deleted_id = store.store_secret(secret=secret)
+
+    rotated = config.model_copy(
+        update={
+            "wrapped_key_encryption_keys": {1: old_key, 2: new_key},
+            "wrapped_key_version": 2,
+        }
+    )
+    other_instance = WrappedSecretStore(rotated)
+    new_id = other_instance.store_secret(secret=secret)
+    store.delete_secret(key=deleted_id)
+
+    assert other_instance.get_secret(key=old_id) == secret
+    assert not other_instance.secret_exists(key=deleted_id)
+    # the same wrapped secret with padding is still revoked
+    assert not other_instance.secret_exists(
+        key=deleted_id + "=" * (-len(deleted_id) % 4)
+    )
+    assert not store.secret_exists(key=new_id)
+    assert not store.secret_exists(key=old_id[:-2] + "AA")
+    with pytest.raises(SecretRetrievalError):
+        other_instance.delete_secret(key=deleted_id)
+
+    retired = rotated.model_copy(update={"wrapped_key_encryption_keys": {2: new_key}})
+    assert not WrappedSecretStore(retired).secret_exists(key=old_id)
+
+
+@pytest.mark.asyncio
+async def test_transit_batch_round_trips(tmp_path):
+    """Test that the transit store decrypts a batch of secrets with few requests"""
+    with VaultStub() as stub:
+        config = backend_config(
+            "transit", stub=stub, directory=tmp_path, vault_transit_batch_size=10
+        )
+        store = create_vault(config)
+        secret_ids = [
+            await store.store_secret(secret=os.urandom(32)) for _ in range(25)
+        ]
+        stub.reset_counters()
+
+        results = await store.get_secrets(keys=secret_ids, concurrency=4)
+        await store.close()
+
+    assert all(isinstance(result, bytes) for result in results)
+    assert stub.requests["decrypt transit"] == 3
+    assert not stub.secrets
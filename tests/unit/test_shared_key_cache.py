@@ -0,0 +1,122 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the cache of keys shared with clients"""
+
+import os
+import time
+
+import crypt4gh.header
+import pytest
+from nacl.public import PrivateKey
+
+from ekss.core import crypto
+from ekss.core.envelope_encryption import seal_envelope
+from ekss.core.keyring import KeyRing, ServerKey, SharedKeyCache
+
+SERVER_SK = PrivateKey.generate()
+NONCE = bytes(range(12))
+
+
+@pytest.fixture
+def shared_keys(monkeypatch: pytest.MonkeyPatch) -> SharedKeyCache:
+    """Use a fresh key ring and a small shared key cache"""
+    monkeypatch.setattr(crypto, "_keyring", KeyRing(private_keys=[bytes(SERVER_SK)]))
+    cache = SharedKeyCache(max_entries=2, ttl=60)
+    monkeypatch.setattr(crypto, "_shared_keys", cache)
+    return cache
+
+
+def test_cached_envelopes_match_crypt4gh(
+    shared_keys: SharedKeyCache, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that envelopes are byte-identical to crypt4gh's, with and without hits"""
+    client_pubkey = bytes(PrivateKey.generate().public_key)
+    monkeypatch.setattr(os, "urandom", lambda size: NONCE[:size])
+    file_secret = bytes(range(32))
+    expected = crypt4gh.header.serialize(
+        list(
+            crypt4gh.header.encrypt(
+                crypt4gh.header.make_packet_data_enc(0, file_secret),
+                [(0, bytes(SERVER_SK), client_pubkey)],
+            )
+        )
+    )
+
+    envelopes = [
+        seal_envelope(file_secret=file_secret, client_pubkey=client_pubkey)
+        for _ in range(3)
+    ]
+
+    assert envelopes == [expected] * 3
+    assert shared_keys.stats.misses == 1
+    assert shared_keys.stats.hits == 2
+
+
+def test_eviction_and_expiry_wipe_keys(monkeypatch: pytest.MonkeyPatch):
+    """Test that keys leaving the cache are overwritten with zeros"""
+    wiped: list[bytearray] = []
+    cache = SharedKeyCache(max_entries=1, ttl=60)
+    on_discard = cache._cache._on_discard
+    assert on_discard is not None
+
+    def record_wipe(key: bytearray):
+        on_discard(key)
+        wiped.append(key)
+
+    cache._cache._on_discard = record_wipe
+    server_key = ServerKey.from_private_key(bytes(SERVER_SK))
+    first, second = (bytes(PrivateKey.generate().public_key) for _ in range(2))
+
+    shared_key = cache.get(server_key, first)
+    cache.get(server_key, second)
+    assert len(wiped) == 1
+    assert wiped[0] == bytes(len(shared_key))
+    assert cache.get(server_key, first) == shared_key
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert cache.get(server_key, first) == shared_key
+    assert cache.stats.expirations == 1
+    assert len(wiped) == 3 and not any(wiped[2])
+
+
+def test_expired_keys_wiped_when_caching(monkeypatch: pytest.MonkeyPatch):
+    """Test that expired keys are wiped when other keys are cached"""
+    cache = SharedKeyCache(max_entries=8, ttl=60)
+    server_key = ServerKey.from_private_key(bytes(SERVER_SK))
+    first, second = (bytes(PrivateKey.generate().public_key) for _ in range(2))
+    cache.get(server_key, first)
+    cached = cache._cache._entries[(server_key.fingerprint, first, False)][1]
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    cache.get(server_key, second)
+
+    assert not any(cached)
+    assert cache.stats.expirations == 1
+    assert cache.stats.entries == 1
+
+
+def test_keys_are_bound_to_the_server_key():
+    """Test that a rotated server key does not reuse keys derived from the old one"""
+    cache = SharedKeyCache(max_entries=8, ttl=60)
+    client_pubkey = bytes(PrivateKey.generate().public_key)
+    old, new = (
+        ServerKey.from_private_key(bytes(PrivateKey.generate())) for _ in range(2)
+    )
+
+    assert cache.get(old, client_pubkey) != cache.get(new, client_pubkey)
+    assert cache.stats.misses == 2
@@ -0,0 +1,138 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test streaming extraction of the envelope from raw file bytes"""
+
+import base64
+import os
+from collections.abc import AsyncIterator, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.core.envelope_decryption import (
+    HeaderParser,
+    extract_envelope_content_from_stream,
+)
+from tests.fixtures.file import make_first_part
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+CLIENT_SK = PrivateKey.generate()
+SESSION_KEY = os.urandom(32)
+HEADER = make_first_part(client_private_key=bytes(CLIENT_SK), session_key=SESSION_KEY)
+CHUNK_SIZE = 64 * 1024
+
+
+def test_parser_byte_by_byte():
+    """Test that the header is found regardless of how the input is chunked"""
+    parser = HeaderParser()
+    data = HEADER + b"content"
+    fed = 0
+    while not parser.feed(data[fed : fed + 1]):
+        fed += 1
+
+    assert fed + 1 == len(HEADER)
+    assert parser.header == HEADER
+    assert parser.needed == len(HEADER)
+
+
+@pytest.mark.parametrize(
+    "prefix",
+    [b"crypt3", b"crypt4gh\x02\x00\x00\x00", HEADER[:16] + b"\x01\x00\x00\x00"],
+    ids=["magic", "version", "packet_length"],
+)
+def test_parser_rejects_early(prefix: bytes):
+    """Test that invalid input is rejected as soon as the offending bytes arrive"""
+    with pytest.raises(ValueError):
+        HeaderParser().feed(prefix)
+
+
+def test_parser_limits_header_size():
+    """Test that headers exceeding the limit are rejected before being buffered"""
+    oversized = HEADER[:16] + (1024**2).to_bytes(4, "little")
+    with pytest.raises(ValueError):
+        HeaderParser().feed(oversized)
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_after_header():
+    """Test that a stream is only read up to the end of the header"""
+    chunks_read = 0
+
+    async def file_content() -> AsyncIterator[bytes]:
+        nonlocal chunks_read
+        data = HEADER + bytes(CHUNK_SIZE)
+        for start in range(0, len(data), 32):
+            chunks_read += 1
+            yield data[start : start + 32]
+
+    submitter_secret, offset = await extract_envelope_content_from_stream(
+        chunks=file_content(), client_pubkey=bytes(CLIENT_SK.public_key)
+    )
+
+    assert submitter_secret == SESSION_KEY
+    assert offset == len(HEADER)
+    assert chunks_read == -(-len(HEADER) // 32)
+
+
+def test_stream_ingest(vault_stub: VaultStub):  # noqa: F811
+    """Test ingest from the raw bytes of a file"""
+
+    def file_content() -> Iterator[bytes]:
+        yield HEADER
+        for _ in range(16):
+            yield bytes(CHUNK_SIZE)
+
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/stream",
+            content=file_content(),
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Client-Public-Key": base64.b64encode(
+                    bytes(CLIENT_SK.public_key)
+                ).decode(),
+            },
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert base64.b64decode(body["submitter_secret"]) == SESSION_KEY
+    assert body["offset"] == len(HEADER)
+    assert vault_stub.requests["post data"] == 1
+
+
+def test_stream_ingest_malformed(vault_stub: VaultStub):  # noqa: F811
+    """Test that a body not starting with a Crypt4GH header is rejected"""
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        response = client.post(
+            "/secrets/stream",
+            content=bytes(CHUNK_SIZE),
+            headers={"Client-Public-Key": base64.b64encode(bytes(32)).decode()},
+        )
+
+    assert response.status_code == 400
+    assert response.json()["exception_id"] == "malformedOrMissingEnvelopeError"
@@ -0,0 +1,62 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test that secret IDs of the transit store can be used in API paths"""
+
+import base64
+import os
+
+from fastapi.testclient import TestClient
+from nacl.public import PrivateKey
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from tests.fixtures.file import make_first_part
+from tests.fixtures.secret_stores import backend_config
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_envelopes_and_deletion(vault_stub: VaultStub, tmp_path):  # noqa: F811
+    """Test getting envelopes for and deleting many transit secrets via the API"""
+    client_sk = PrivateKey.generate()
+    client_pk = base64.urlsafe_b64encode(bytes(client_sk.public_key)).decode()
+    query = {
+        "file_part": base64.b64encode(
+            make_first_part(
+                client_private_key=bytes(client_sk), session_key=os.urandom(32)
+            )
+        ).decode(),
+        "public_key": base64.b64encode(bytes(client_sk.public_key)).decode(),
+    }
+    app = setup_app(CONFIG)
+    config = backend_config("transit", stub=vault_stub, directory=tmp_path)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        secret_ids = [
+            client.post("/secrets", json=query).json()["secret_id"] for _ in range(20)
+        ]
+        envelopes = [
+            client.get(f"/secrets/{secret_id}/envelopes/{client_pk}")
+            for secret_id in secret_ids
+        ]
+        deletions = [client.delete(f"/secrets/{secret_id}") for secret_id in secret_ids]
+        after_deletion = client.get(f"/secrets/{secret_ids[0]}/envelopes/{client_pk}")
+
+    assert all("/" not in secret_id for secret_id in secret_ids)
+    assert [response.status_code for response in envelopes] == [200] * 20
+    assert [response.status_code for response in deletions] == [204] * 20
+    assert after_deletion.status_code == 404
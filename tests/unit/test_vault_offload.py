@@ -0,0 +1,87 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test offloading of hvac calls to a bounded thread pool"""
+
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector, create_vault
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.config import CONFIG
+from ekss.ports.outbound.secret_store import StoreOverloadedError
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+@pytest.mark.asyncio
+async def test_calls_in_flight_concurrently(vault_stub: VaultStub):  # noqa: F811
+    """Test that offloaded calls wait for the vault in parallel"""
+    vault = create_vault(
+        vault_stub.config(vault_offload_threads=8, vault_coalesce_reads=False)
+    )
+    secret_id = await vault.store_secret(secret=os.urandom(32))
+    vault_stub.latency = 0.2
+
+    start = time.perf_counter()
+    await asyncio.gather(*(vault.get_secret(key=secret_id) for _ in range(8)))
+    elapsed = time.perf_counter() - start
+    metrics = vault.metrics()["vault_offload"]
+    await vault.close()
+
+    assert elapsed < 8 * 0.2 / 2
+    assert metrics["workers"] == 8
+    assert metrics["completed"] == 9
+
+
+@pytest.mark.asyncio
+async def test_fail_fast_when_saturated(vault_stub: VaultStub):  # noqa: F811
+    """Test that calls beyond pool and queue capacity are rejected immediately"""
+    config = vault_stub.config(
+        vault_offload_threads=1, vault_offload_max_queue=1, vault_coalesce_reads=False
+    )
+    vault = create_vault(config)
+    secret_id = await vault.store_secret(secret=os.urandom(32))
+    vault_stub.latency = 0.2
+
+    results = await asyncio.gather(
+        *(vault.get_secret(key=secret_id) for _ in range(4)), return_exceptions=True
+    )
+    metrics = vault.metrics()["vault_offload"]
+    await vault.close()
+
+    rejected = [result for result in results if isinstance(result, Exception)]
+    assert len(rejected) == 2
+    assert all(isinstance(error, StoreOverloadedError) for error in rejected)
+    assert metrics["rejected"] == 2
+    assert metrics["queue_wait_seconds_max"] > 0.1
+
+
+def test_metrics_endpoint(vault_stub: VaultStub):  # noqa: F811
+    """Test that the offload metrics are exposed by the API"""
+    app = setup_app(CONFIG)
+    config = vault_stub.config(vault_offload_threads=2)
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        assert client.delete("/secrets/missing").status_code == 404
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    metrics = response.json()["vault_offload"]
+    assert metrics["workers"] == 2
+    assert metrics["max_queue_depth"] == 64
@@ -0,0 +1,64 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test reuse of pooled vault connections"""
+
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from ekss.adapters.inbound.fastapi_.deps import config_injector
+from ekss.adapters.inbound.fastapi_.main import setup_app
+from ekss.adapters.outbound.vault import VaultAdapter
+from ekss.config import CONFIG
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_connection_reuse(vault_stub: VaultStub):  # noqa: F811
+    """Test that consecutive calls share one connection and one login"""
+    adapter = VaultAdapter(config=vault_stub.config())
+    for _ in range(5):
+        secret_id = adapter.store_secret(secret=os.urandom(32))
+        adapter.get_secret(key=secret_id)
+    adapter.close()
+
+    assert vault_stub.connections == 1
+    assert vault_stub.requests["login"] == 1
+
+
+def test_idle_timeout(vault_stub: VaultStub):  # noqa: F811
+    """Test that idle connections are dropped after the configured timeout"""
+    adapter = VaultAdapter(config=vault_stub.config(vault_pool_idle_timeout=0.1))
+    adapter.store_secret(secret=os.urandom(32))
+    time.sleep(0.2)
+    adapter.store_secret(secret=os.urandom(32))
+    adapter.close()
+
+    assert vault_stub.connections == 2
+
+
+def test_adapter_shared_between_requests(vault_stub: VaultStub):  # noqa: F811
+    """Test that the app reuses one adapter instead of creating one per request"""
+    app = setup_app(CONFIG)
+    config = vault_stub.config()
+    app.dependency_overrides[config_injector] = lambda: config
+
+    with TestClient(app=app) as client:
+        for _ in range(3):
+            response = client.delete("/secrets/missing")
+            assert response.status_code == 404
+
+    assert vault_stub.requests["login"] == 1
+    assert vault_stub.connections == 1
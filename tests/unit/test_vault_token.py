@@ -0,0 +1,85 @@
+# Copyright 2021 - 2023 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the vault token lifecycle"""
+
+import os
+import time
+
+from ekss.adapters.outbound.vault import VaultAdapter
+from ekss.adapters.outbound.vault.auth import backoff_delays
+from tests.fixtures.vault_stub import VaultStub, vault_stub  # noqa: F401
+
+
+def test_no_lookup_per_call(vault_stub: VaultStub):  # noqa: F811
+    """Test that operations do not look up the token before every call"""
+    adapter = VaultAdapter(config=vault_stub.config())
+    secret_id = adapter.store_secret(secret=os.urandom(32))
+    vault_stub.reset_counters()
+    for _ in range(5):
+        adapter.get_secret(key=secret_id)
+    adapter.close()
+
+    assert vault_stub.round_trips == 5
+    assert vault_stub.requests["lookup"] == 0
+
+
+def test_background_renewal(vault_stub: VaultStub):  # noqa: F811
+    """Test that the token is renewed ahead of expiry without a new login"""
+    vault_stub.token_ttl = 1
+    adapter = VaultAdapter(config=vault_stub.config(vault_token_renew_fraction=0.5))
+    secret_id = adapter.store_secret(secret=os.urandom(32))
+    time.sleep(1.5)
+    adapter.get_secret(key=secret_id)
+    adapter.close()
+
+    assert vault_stub.requests["login"] == 1
+    assert vault_stub.requests["renew"] >= 2
+    assert vault_stub.requests["forbidden"] == 0
+
+
+def test_reauthenticate_on_forbidden(vault_stub: VaultStub):  # noqa: F811
+    """Test that a rejected token leads to exactly one new login and a retry"""
+    adapter = VaultAdapter(config=vault_stub.config())
+    secret = os.urandom(32)
+    secret_id = adapter.store_secret(secret=secret)
+    vault_stub.revoke_tokens()
+
+    assert adapter.get_secret(key=secret_id) == secret
+    adapter.close()
+
+    assert vault_stub.requests["login"] == 2
+    assert vault_stub.requests["forbidden"] == 1
+
+
+def test_login_backoff(vault_stub: VaultStub):  # noqa: F811
+    """Test that failed logins are retried until Vault becomes available"""
+    vault_stub.failing_logins = 2
+    adapter = VaultAdapter(config=vault_stub.config(vault_login_backoff_base=0.01))
+    adapter.store_secret(secret=os.urandom(32))
+    adapter.close()
+
+    assert vault_stub.requests["login"] == 3
+
+
+def test_backoff_delays_jittered():
+    """Test that backoff delays are bounded and not identical across callers"""
+    delays = [list(backoff_delays(base=1, cap=4, attempts=5)) for _ in range(10)]
+    assert all(len(run) == 4 for run in delays)
+    assert all(
+        0 <= delay <= min(4, 2**index)
+        for run in delays
+        for index, delay in enumerate(run)
+    )
+    assert len({tuple(run) for run in delays}) > 1